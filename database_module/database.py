@@ -1,5 +1,7 @@
 import sqlite3
 
+from database_module.db_init import sql_querry_init_corpus_cache, sql_querry_init_corpus_histograms
+
 
 def take_lk_from_db(name: str) -> dict | None:
     """
@@ -404,4 +406,94 @@ def save_layout_to_db(layout_name: str, layout: dict) -> bool:
         conn.rollback()
         return False
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def take_corpus_histogram(fingerprint: str, text_type: str = "words", db_path: str = "database.db") -> tuple | None:
+    """
+    Возвращает закэшированную гистограмму символов корпуса по его отпечатку.
+    Если корпус еще не анализировался - вернет None.
+    Таблицы кэша создаются при необходимости.
+    
+    Args:
+        fingerprint: Отпечаток корпуса (см. corpus_fingerprint)
+        text_type: Тип текста ('words' или 'text')
+        db_path: Путь к файлу базы данных
+    
+    Returns:
+        tuple: (гистограмма {символ: количество}, количество слов)
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(sql_querry_init_corpus_cache)
+    cursor.execute(sql_querry_init_corpus_histograms)
+    
+    cursor.execute(
+        "SELECT id, total_words FROM corpus_cache WHERE fingerprint = ? AND text_type = ?",
+        (fingerprint, text_type)
+    )
+    row = cursor.fetchone()
+    
+    if row is None:
+        conn.close()
+        return None
+    
+    corpus_id, total_words = row
+    cursor.execute("SELECT letter, count FROM corpus_histograms WHERE corpus_id = ?", (corpus_id,))
+    histogram = {letter: count for letter, count in cursor.fetchall()}
+    conn.close()
+    
+    return histogram, total_words
+
+
+def save_corpus_histogram(fingerprint: str, file_path: str, text_type: str,
+                          histogram: dict, total_words: int, db_path: str = "database.db") -> int:
+    """
+    Сохраняет гистограмму символов корпуса в кэш.
+    Предыдущая запись с тем же отпечатком и типом текста заменяется.
+    Таблицы кэша создаются при необходимости.
+    
+    Args:
+        fingerprint: Отпечаток корпуса (см. corpus_fingerprint)
+        file_path: Путь к файлу корпуса
+        text_type: Тип текста ('words' или 'text')
+        histogram: Гистограмма символов {символ: количество}
+        total_words: Количество слов в корпусе
+        db_path: Путь к файлу базы данных
+    
+    Returns:
+        int: ID созданной записи
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(sql_querry_init_corpus_cache)
+        cursor.execute(sql_querry_init_corpus_histograms)
+        cursor.execute(
+            "SELECT id FROM corpus_cache WHERE fingerprint = ? AND text_type = ?",
+            (fingerprint, text_type)
+        )
+        for (old_id,) in cursor.fetchall():
+            cursor.execute("DELETE FROM corpus_histograms WHERE corpus_id = ?", (old_id,))
+            cursor.execute("DELETE FROM corpus_cache WHERE id = ?", (old_id,))
+        
+        cursor.execute(
+            """INSERT INTO corpus_cache (fingerprint, file_path, text_type, total_words, total_characters)
+               VALUES (?, ?, ?, ?, ?)""",
+            (fingerprint, file_path, text_type, total_words, sum(histogram.values()))
+        )
+        corpus_id = cursor.lastrowid
+        
+        cursor.executemany(
+            "INSERT INTO corpus_histograms (corpus_id, letter, count) VALUES (?, ?, ?)",
+            [(corpus_id, letter, count) for letter, count in histogram.items()]
+        )
+        
+        conn.commit()
+        return corpus_id
+        
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
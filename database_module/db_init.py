@@ -55,12 +55,51 @@ sql_querry_init_finger_stats = """
     )
 """
 
+sql_querry_init_corpus_cache = """
+    CREATE TABLE IF NOT EXISTS corpus_cache (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fingerprint TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        text_type TEXT NOT NULL,
+        total_words INTEGER NOT NULL,
+        total_characters INTEGER NOT NULL,
+        UNIQUE (fingerprint, text_type)
+    )
+"""
+
+sql_querry_init_corpus_histograms = """
+    CREATE TABLE IF NOT EXISTS corpus_histograms (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        corpus_id INTEGER NOT NULL,
+        letter TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        FOREIGN KEY (corpus_id) REFERENCES corpus_cache (id) ON DELETE CASCADE
+    )
+"""
+
+sql_querry_init_checkpoints = """
+    CREATE TABLE IF NOT EXISTS processing_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_key TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        file_size INTEGER DEFAULT NULL,
+        file_mtime_ns INTEGER DEFAULT NULL,
+        name_lk TEXT NOT NULL,
+        text_type TEXT NOT NULL,
+        encoding TEXT NOT NULL,
+        range_start INTEGER NOT NULL,
+        range_end INTEGER NOT NULL,
+        state TEXT DEFAULT NULL
+    )
+"""
+
 import sqlite3
 
 def init_tables():
     """
     Если таблицы не созданы, то он создаст три таблички - одну для хранения результатов рассчетов, 
-    вторую для хранения раскладок и третью для статистики по пальцам.
+    вторую для хранения раскладок и третью для статистики по пальцам,
+    а также таблицы кэша гистограмм символов корпусов и контрольных точек анализа.
     """
 
     conn = sqlite3.connect("database.db")
@@ -70,6 +109,9 @@ def init_tables():
     cursor.execute(f"{sql_querry_init_db}")
     cursor.execute(f"{sql_querry_init_finger_stats}")
     cursor.execute(f"{sql_querry_init_db_to_grafics}")
+    cursor.execute(f"{sql_querry_init_corpus_cache}")
+    cursor.execute(f"{sql_querry_init_corpus_histograms}")
+    cursor.execute(f"{sql_querry_init_checkpoints}")
 
     conn.commit()
     conn.close()
@@ -115,6 +157,18 @@ def migrate_database():
         # Создаем таблицу finger_statistics если её нет
         cursor.execute(sql_querry_init_finger_stats)
         
+        # Создаем таблицы кэша гистограмм корпусов если их нет
+        cursor.execute(sql_querry_init_corpus_cache)
+        cursor.execute(sql_querry_init_corpus_histograms)
+        
+        # Таблица контрольных точек: колонки размера и времени изменения файла
+        cursor.execute(sql_querry_init_checkpoints)
+        cursor.execute("PRAGMA table_info(processing_checkpoints)")
+        columns = [column[1] for column in cursor.fetchall()]
+        for column in ('file_size', 'file_mtime_ns'):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE processing_checkpoints ADD COLUMN {column} INTEGER DEFAULT NULL")
+        
         conn.commit()
         print("✅ Миграция базы данных завершена")
         
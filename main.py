@@ -29,6 +29,9 @@ from processing_module.calculate_data import (
     make_processing_stream,
     make_text_processing,
     make_text_processing_stream,
+    make_file_processing,
+    default_engine,
+    list_checkpoints,
     validate_rules
 )
 from data_module.make_export_file import create_csv_report, export_unknown_characters_csv
@@ -95,14 +98,17 @@ class MenuSystem:
         self.display_menu_header("ГЛАВНОЕ МЕНЮ")
         print(rat_img_msg)
         print("1) Выбрать раскладку для тестирования")
+        print("2) Сравнить несколько раскладок за один проход по файлу")
         print("0) Выход из программы")
         
-        choice = self.get_user_choice(max_val=1)
+        choice = self.get_user_choice(max_val=2)
         
         if choice == 0:
             return MenuAction.EXIT
         elif choice == 1:
             return self.layout_selection_menu()
+        elif choice == 2:
+            self.compare_layouts_single_pass()
         
         return MenuAction.CONTINUE
     
@@ -163,9 +169,11 @@ class MenuSystem:
         print("5) Создать графики сравнения")
         print("6) Загрузить раскладку из файла")
         print("7) Сменить раскладку")
+        print("8) Продолжить прерванный анализ")
+        print("9) Обработать частотный список (слово и частота в строке)")
         print("0) Назад в главное меню")
         
-        choice = self.get_user_choice(max_val=7)
+        choice = self.get_user_choice(max_val=9)
         
         if choice == 0:
             return MenuAction.CONTINUE
@@ -185,6 +193,10 @@ class MenuSystem:
             self.current_layout = None
             self.current_layout_name = None
             return self.layout_selection_menu()
+        elif choice == 8:
+            self.resume_analysis()
+        elif choice == 9:
+            self.process_weighted_file()
         
         return MenuAction.CONTINUE
     
@@ -206,10 +218,7 @@ class MenuSystem:
                     print("❌ Обработка отменена")
                     return
             
-            if file_size > 10:
-                self._process_large_file(file_path, file_size)
-            else:
-                self._process_small_file(file_path)
+            self._process_file(file_path, text_type='words')
                 
         except FileNotFoundError:
             print(f"❌ Файл не найден: {file_path}")
@@ -218,44 +227,83 @@ class MenuSystem:
         
         input("\nНажмите Enter для продолжения...")
     
-    def _process_large_file(self, file_path: str, file_size: float):
-        """Обработка большого файла потоково"""
-        print(f"🔄 Большой файл ({file_size:.1f}MB). Используем потоковую обработку...")
+    def process_weighted_file(self):
+        """Обработка частотного списка слов ("слово частота" в каждой строке)"""
+        print("\n📊 Обработка частотного списка слов")
+        file_path = input("Введите полный путь к файлу: ").strip()
         
-        print("📊 Подсчитываем количество слов...")
-        total_words = count_lines_in_file(file_path)
-        print(f"📝 Найдено {total_words:,} слов")
+        if not file_path:
+            print("❌ Путь к файлу не может быть пустым")
+            return
         
-        if total_words > 1000000:
-            if not self.confirm_action(f"⚠️  Файл содержит {total_words:,} слов. Обработка может занять много времени. Продолжить?"):
-                print("❌ Обработка отменена")
-                return
+        try:
+            file_size = get_file_size_mb(file_path)
+            print(f"📊 Размер файла: {file_size:.1f} MB")
+            
+            self._process_file(file_path, text_type='weighted')
+                
+        except FileNotFoundError:
+            print(f"❌ Файл не найден: {file_path}")
+        except Exception as e:
+            print(f"❌ Ошибка обработки файла: {e}")
         
+        input("\nНажмите Enter для продолжения...")
+    
+    def _process_file(self, file_path: str, text_type: str):
+        """Потоковая обработка файла любого размера единым движком"""
         try:
-            word_generator = get_words_from_file_stream(file_path, batch_size=5000)
-            result = make_processing_stream(
-    word_generator, 
-    self.current_layout, 
-    total_words, 
-    layout_name=self.current_layout_name  # ← ДОБАВИТЬ ЭТУ СТРОКУ
-)
+            print("🔄 Потоковая обработка файла...")
+            result = make_file_processing(
+                file_path,
+                self.current_layout,
+                text_type=text_type,
+                layout_name=self.current_layout_name,
+                engine=default_engine(),
+                checkpoint_db="database.db",
+                use_cache=True
+            )
             self._display_detailed_results(result, file_path)
-             
+            
         except KeyboardInterrupt:
             print("\n❌ Обработка прервана пользователем")
+            print("💾 Прогресс сохранен. Продолжить: меню обработки → 'Продолжить прерванный анализ'")
     
-    def _process_small_file(self, file_path: str):
-        """Обработка небольшого файла"""
-        print("📥 Загружаем файл в память...")
-        words = get_words_from_file(file_path)
-        print(f"📝 Загружено {len(words):,} слов")
-        
-        result = make_processing(
-    words, 
-    self.current_layout, 
-    layout_name=self.current_layout_name  # ← ДОБАВИТЬ ЭТУ СТРОКУ
-)
-        self._display_detailed_results(result, file_path)
+    def resume_analysis(self):
+        """Продолжение прерванного анализа с последней контрольной точки"""
+        checkpoints = list_checkpoints()
+        if not checkpoints:
+            print("📭 Нет прерванных анализов")
+            input("\nНажмите Enter для продолжения...")
+            return
+        
+        print("\n💾 Прерванные анализы:")
+        for i, checkpoint in enumerate(checkpoints, 1):
+            progress = checkpoint['done_bytes'] / checkpoint['total_bytes'] * 100 if checkpoint['total_bytes'] else 0
+            print(f"   {i}) {checkpoint['file_path']} | {checkpoint['layout_name']} | "
+                  f"{checkpoint['text_type']} | {progress:.1f}%")
+        print("0) Назад")
+        
+        choice = self.get_user_choice(max_val=len(checkpoints))
+        if choice == 0:
+            return
+        
+        checkpoint = checkpoints[choice - 1]
+        layout = take_lk_from_db(checkpoint['layout_name'])
+        if not layout:
+            print(f"❌ Раскладка '{checkpoint['layout_name']}' не найдена в базе данных")
+            input("\nНажмите Enter для продолжения...")
+            return
+        
+        self.current_layout = layout
+        self.current_layout_name = checkpoint['layout_name']
+        try:
+            self._process_file(checkpoint['file_path'], text_type=checkpoint['text_type'])
+        except FileNotFoundError:
+            print(f"❌ Файл не найден: {checkpoint['file_path']}")
+        except Exception as e:
+            print(f"❌ Ошибка обработки файла: {e}")
+        
+        input("\nНажмите Enter для продолжения...")
     
     def _display_detailed_results(self, result: dict, file_path: str):
         """Отображение детальных результатов обработки"""
@@ -338,10 +386,7 @@ class MenuSystem:
                     print("❌ Обработка отменена")
                     return
             
-            if file_size > 10:
-                self._process_large_text_file(file_path, file_size)
-            else:
-                self._process_small_text_file(file_path)
+            self._process_file(file_path, text_type='text')
                 
         except FileNotFoundError:
             print(f"❌ Файл не найден: {file_path}")
@@ -350,44 +395,114 @@ class MenuSystem:
         
         input("\nНажмите Enter для продолжения...")
     
-    def _process_large_text_file(self, file_path: str, file_size: float):
-        """Обработка большого текстового файла потоково"""
-        print(f"🔄 Большой текстовый файл ({file_size:.1f}MB). Используем потоковую обработку...")
+    def compare_layouts_single_pass(self):
+        """Сравнение нескольких раскладок за одно чтение файла"""
+        self.display_menu_header("СРАВНЕНИЕ РАСКЛАДОК ЗА ОДИН ПРОХОД")
+        
+        layouts = take_lk_names_from_lk()
+        if not layouts:
+            print("❌ В базе данных нет доступных раскладок")
+            input("Нажмите Enter для продолжения...")
+            return
+        
+        print("📊 Доступные раскладки:")
+        for i, layout in enumerate(layouts, 1):
+            print(f"   {i}) {layout[0]}")
         
-        print("📊 Подсчитываем количество символов...")
-        total_chars = count_characters_in_file(file_path)
-        print(f"📝 Найдено {total_chars:,} символов")
+        print("\nВыберите раскладки для сравнения (введите номера через пробел):")
+        print("Например: 1 2 3")
+        selection = input("--> ").strip().split()
         
-        if total_chars > 10000000:  # 10 миллионов символов
-            if not self.confirm_action(f"⚠️  Файл содержит {total_chars:,} символов. Обработка может занять много времени. Продолжить?"):
-                print("❌ Обработка отменена")
-                return
+        selected_layouts = {}
+        for sel in selection:
+            try:
+                idx = int(sel) - 1
+                if not 0 <= idx < len(layouts):
+                    print(f"❌ Неверный номер: {sel}")
+                    continue
+                layout_name = layouts[idx][0]
+                rules = take_lk_from_db(layout_name)
+                if rules is None:
+                    print(f"❌ Ошибка загрузки раскладки '{layout_name}' из БД")
+                    continue
+                validate_rules(rules)
+                selected_layouts[layout_name] = rules
+            except ValueError as e:
+                print(f"❌ Пропускаем '{sel}': {e}")
+        
+        if not selected_layouts:
+            print("❌ Не выбрано ни одной раскладки")
+            input("Нажмите Enter для продолжения...")
+            return
+        
+        print("\nТип файла:")
+        print("1) Файл со словами (построчно)")
+        print("2) Текстовый файл (сплошной текст)")
+        file_choice = self.get_user_choice(min_val=1, max_val=2)
+        text_type = 'words' if file_choice == 1 else 'text'
+        
+        file_path = input("Введите полный путь к файлу: ").strip()
+        if not file_path:
+            print("❌ Путь к файлу не может быть пустым")
+            input("Нажмите Enter для продолжения...")
+            return
         
         try:
-            text_generator = get_text_from_file_stream(file_path, chunk_size=16384)
-            result = make_text_processing_stream(
-    text_generator, 
-    self.current_layout, 
-    total_chars, 
-    layout_name=self.current_layout_name
-)
-            self._display_detailed_results(result, file_path)
+            file_size = get_file_size_mb(file_path)
+            print(f"📊 Размер файла: {file_size:.1f} MB")
+            
+            # Первая раскладка читает файл (параллельно по диапазонам для больших файлов)
+            # и сохраняет гистограмму символов корпуса в кэш; остальные раскладки
+            # считаются по гистограмме из кэша без чтения файла
+            all_results = {
+                layout_name: make_file_processing(
+                    file_path,
+                    rules,
+                    text_type=text_type,
+                    layout_name=layout_name,
+                    engine=default_engine(),
+                    use_cache=True
+                )
+                for layout_name, rules in selected_layouts.items()
+            }
+            self._display_layouts_comparison(all_results, file_path)
             
+            if self.confirm_action("Сохранить результаты всех раскладок в базу данных?"):
+                for layout_name, result in all_results.items():
+                    record_id = save_analysis_result(layout_name, result, file_path, text_type)
+                    print(f"✅ '{layout_name}' сохранена в БД (ID: {record_id})")
+        
+        except FileNotFoundError:
+            print(f"❌ Файл не найден: {file_path}")
         except KeyboardInterrupt:
             print("\n❌ Обработка прервана пользователем")
+        except Exception as e:
+            print(f"❌ Ошибка обработки файла: {e}")
+        
+        input("\nНажмите Enter для продолжения...")
     
-    def _process_small_text_file(self, file_path: str):
-        """Обработка небольшого текстового файла"""
-        print("📥 Загружаем текст в память...")
-        text = get_text_from_file(file_path)
-        print(f"📝 Загружено {len(text):,} символов")
-        
-        result = make_text_processing(
-    text, 
-    self.current_layout, 
-    layout_name=self.current_layout_name
-)
-        self._display_detailed_results(result, file_path)
+    def _display_layouts_comparison(self, all_results: dict, file_path: str):
+        """Отображение сравнительной таблицы результатов нескольких раскладок"""
+        print(f"\n{'='*70}")
+        print(f"🎯 СРАВНЕНИЕ РАСКЛАДОК")
+        print(f"{'='*70}")
+        print(f"📁 Файл: {file_path}")
+        
+        any_result = next(iter(all_results.values()))
+        print(f"📝 Обработано слов: {any_result['total_words']:,}")
+        print(f"🔤 Всего символов: {any_result['total_characters']:,}")
+        print(f"{'='*70}")
+        
+        print(f"{'Раскладка':<25} {'Ошибки':<14} {'ср/слово':<10} {'ср/симв':<10} {'Покрытие'}")
+        print("-" * 70)
+        
+        sorted_results = sorted(all_results.items(), key=lambda x: x[1]['avg_errors_per_char'])
+        for layout_name, result in sorted_results:
+            coverage = (result['processed_characters'] / result['total_characters'] * 100) if result['total_characters'] else 0
+            print(f"{layout_name[:24]:<25} {result['total_errors']:<14,} "
+                  f"{result['avg_errors_per_word']:<10.2f} {result['avg_errors_per_char']:<10.4f} {coverage:.1f}%")
+        
+        print(f"{'='*70}")
     
     def _offer_save_and_export(self, result: dict, file_path: str):
         """Предлагает сохранить результаты и экспортировать"""
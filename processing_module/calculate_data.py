@@ -1,7 +1,46 @@
 from tqdm import tqdm
 from typing import Generator, List, Dict, Union, Tuple
-from collections import defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import multiprocessing
+import os
 import sqlite3
+from statistics import NormalDist
+
+from scan_module.read_files import MappedCorpus, split_file_into_ranges, choose_chunk_size, corpus_fingerprint, parse_weighted_line
+from database_module.database import take_corpus_histogram, save_corpus_histogram
+from database_module.db_init import sql_querry_init_checkpoints
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для движка 'numpy'
+    np = None
+
+
+# Доступные движки подсчета:
+# 'python'    - посимвольный проход по тексту
+# 'histogram' - сначала гистограмма символов чанка (Counter на C),
+#               затем проход только по алфавиту чанка
+# 'numpy'     - чанк кодируется в массив кодов символов, штрафы и пальцы
+#               берутся из плотных таблиц, счетчики - через np.bincount
+ENGINES = ('python', 'histogram', 'numpy')
+
+# Размеры порций для оберток над потоковыми функциями
+WORD_BATCH_SIZE = 5000
+TEXT_CHUNK_SIZE = 1024 * 1024
+
+# Файлы меньше этого размера быстрее обработать в одном процессе
+PARALLEL_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+# При включенных контрольных точках диапазон файла не больше этого размера:
+# прогресс сохраняется после каждого обработанного диапазона
+CHECKPOINT_RANGE_BYTES = 64 * 1024 * 1024
+
+# Ранняя остановка: минимальное число батчей (чанков) до проверки сходимости,
+# чтобы оценка разброса по батчам была устойчивой
+CONVERGENCE_MIN_BATCHES = 20
 
 
 def save_to_database(results: dict, db_path: str = "database.db"):
@@ -102,111 +141,425 @@ def save_to_database(results: dict, db_path: str = "database.db"):
     print(f"Данные для раскладки '{layout_name}' успешно сохранены в базу")
 
 
-def make_processing(wordlist: list, rules: dict, layout_name: str = "unknown", save_to_db: bool = True) -> dict:
+class CompiledRules:
     """
-    Считает количество ошибок по словарю правил и списку слов.
-    ВНИМАНИЕ: Используйте только для небольших списков!
+    Скомпилированная таблица правил раскладки.
     
-    Returns:
-        dict: Словарь с результатами анализа
+    Строится один раз из словаря правил (take_lk_from_db / read_kl) и
+    отображает каждый символ сразу в пару (штраф, индекс пальца).
+    Для старого формата (только штраф) индекс пальца равен -1.
+    Символы с некорректным форматом правила в таблицу не попадают
+    и считаются неизвестными.
     """
-    if len(wordlist) > 10000:
-        raise ValueError(f"Список слишком большой ({len(wordlist)} слов). Используйте make_processing_stream()")
     
-    mistakes = 0
-    total_characters = 0
-    processed_characters = 0
-    unknown_characters = set()
+    def __init__(self, rules: Dict[str, Union[int, float, List]]):
+        if not isinstance(rules, dict):
+            raise TypeError(f"Правила должны быть словарем, получено: {type(rules)}")
+        
+        self.fingers: List[str] = []  # Индекс -> название пальца
+        self.table: Dict[str, Tuple[Union[int, float], int]] = {}
+        self._dense_tables = None  # Плотные таблицы для движка 'numpy'
+        
+        finger_index = {}
+        for char, rule_data in rules.items():
+            if isinstance(rule_data, (int, float)):
+                # Старый формат: только штраф
+                self.table[char] = (rule_data, -1)
+            elif isinstance(rule_data, list) and len(rule_data) >= 2:
+                # Новый формат: [штраф, палец]
+                penalty, finger = rule_data[0], rule_data[1]
+                if finger not in finger_index:
+                    finger_index[finger] = len(self.fingers)
+                    self.fingers.append(finger)
+                self.table[char] = (penalty, finger_index[finger])
     
-    # Расширенная статистика по пальцам
-    finger_stats = defaultdict(int)  # Общее количество нажатий каждого пальца
-    finger_errors = defaultdict(float)  # Количество ошибок на каждый палец
-    finger_data = {}  # Детальная информация по каждому пальцу
+    def __getstate__(self):
+        # Плотные таблицы не передаем между процессами, они строятся заново по требованию
+        state = self.__dict__.copy()
+        state['_dense_tables'] = None
+        return state
     
-    print(f"Обрабатываем {len(wordlist)} слов...")
+    def score_text(self, text: str, stats: 'ProcessingStats') -> Union[int, float]:
+        """
+        Начисляет штрафы за все символы текста в накопитель stats.
+        
+        Returns:
+            Сумма штрафов за переданный текст
+        """
+        get_rule = self.table.get
+        presses = stats.finger_presses
+        errors = stats.finger_errors
+        unknown = stats.unknown_characters
+        mistakes = 0
+        processed = 0
+        
+        for char in text:
+            entry = get_rule(char)
+            if entry is None:
+                unknown.add(char)
+                continue
+            penalty, finger = entry
+            mistakes += penalty
+            processed += 1
+            if finger >= 0:
+                presses[finger] += 1
+                errors[finger] += penalty
+        
+        stats.mistakes += mistakes
+        stats.processed_characters += processed
+        stats.total_characters += len(text)
+        return mistakes
     
-    for word in tqdm(wordlist, desc="Обработка слов"):
-        for letter in word:
-            total_characters += 1
-            if letter in rules:
-                rule_data = rules[letter]
-                
-                # Поддерживаем оба формата: старый (число) и новый (список)
-                if isinstance(rule_data, (int, float)):
-                    # Старый формат: только штраф
-                    mistakes += rule_data
-                    processed_characters += 1
-                elif isinstance(rule_data, list) and len(rule_data) >= 2:
-                    # Новый формат: [штраф, палец]
-                    penalty, finger = rule_data[0], rule_data[1]
-                    mistakes += penalty
-                    processed_characters += 1
-                    
-                    # Собираем расширенную статистику по пальцам
-                    finger_stats[finger] += 1
-                    finger_errors[finger] += penalty
-                    
-                    # Сохраняем детальную информацию о пальце
-                    if finger not in finger_data:
-                        finger_data[finger] = {
-                            'total_presses': 0,
-                            'total_errors': 0.0,
-                            'error_rate': 0.0
-                        }
-                    finger_data[finger]['total_presses'] += 1
-                    finger_data[finger]['total_errors'] += penalty
-                    
-                else:
-                    # Неверный формат данных
-                    unknown_characters.add(letter)
-            else:
-                unknown_characters.add(letter)
-    
-    # Рассчитываем процент ошибок для каждого пальца
-    for finger in finger_data:
-        total_presses = finger_data[finger]['total_presses']
-        total_errors = finger_data[finger]['total_errors']
-        finger_data[finger]['error_rate'] = total_errors / total_presses if total_presses > 0 else 0
-    
-    results = {
-        'total_errors': mistakes,
-        'total_words': len(wordlist),
-        'total_characters': total_characters,
-        'processed_characters': processed_characters,
-        'unknown_characters': unknown_characters,
-        'finger_statistics': dict(finger_stats),
-        'finger_errors': dict(finger_errors),
-        'finger_detailed_data': finger_data,
-        'layout_name': layout_name,
-        'avg_errors_per_word': mistakes / len(wordlist) if wordlist else 0,
-        'avg_errors_per_char': mistakes / processed_characters if processed_characters else 0
-    }
+    def score_counts(self, counts: Dict[str, int], stats: 'ProcessingStats') -> Union[int, float]:
+        """
+        Начисляет штрафы по гистограмме символов {символ: количество}.
+        Стоимость определяется размером алфавита, а не длиной текста.
+        
+        Returns:
+            Сумма штрафов за все символы гистограммы
+        """
+        get_rule = self.table.get
+        presses = stats.finger_presses
+        errors = stats.finger_errors
+        unknown = stats.unknown_characters
+        mistakes = 0
+        processed = 0
+        total = 0
+        
+        for char, count in counts.items():
+            total += count
+            entry = get_rule(char)
+            if entry is None:
+                unknown.add(char)
+                continue
+            penalty, finger = entry
+            mistakes += penalty * count
+            processed += count
+            if finger >= 0:
+                presses[finger] += count
+                errors[finger] += penalty * count
+        
+        stats.mistakes += mistakes
+        stats.processed_characters += processed
+        stats.total_characters += total
+        return mistakes
     
-    # Сохраняем в базу данных если требуется
-    if save_to_db:
-        save_to_database(results)
+    def _build_dense_tables(self):
+        """
+        Строит плотные таблицы по кодам символов: признак наличия правила,
+        штраф и индекс пальца. Правилам без пальца соответствует индекс
+        len(self.fingers), чтобы np.bincount не получал отрицательных значений.
+        """
+        size = max((ord(char) for char in self.table if len(char) == 1), default=-1) + 1
+        integer_penalties = all(isinstance(penalty, int) for penalty, _ in self.table.values())
+        
+        known = np.zeros(size, dtype=bool)
+        penalties = np.zeros(size, dtype=np.int64 if integer_penalties else np.float64)
+        fingers = np.full(size, len(self.fingers), dtype=np.intp)
+        
+        for char, (penalty, finger) in self.table.items():
+            if len(char) != 1:
+                continue  # Многосимвольные ключи никогда не совпадут с символом текста
+            code = ord(char)
+            known[code] = True
+            penalties[code] = penalty
+            if finger >= 0:
+                fingers[code] = finger
+        
+        self._dense_tables = (known, penalties, fingers, integer_penalties)
     
-    return results
+    def score_array(self, text: str, stats: 'ProcessingStats') -> Union[int, float]:
+        """
+        Начисляет штрафы векторно: текст кодируется в массив кодов символов,
+        нажатия и ошибки по пальцам считаются через np.bincount.
+        
+        Returns:
+            Сумма штрафов за переданный текст
+        """
+        if np is None:
+            raise ImportError("Для движка 'numpy' требуется модуль numpy")
+        if self._dense_tables is None:
+            self._build_dense_tables()
+        known, penalties, fingers, integer_penalties = self._dense_tables
+        
+        codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        in_table = codes < known.size
+        in_table[in_table] = known[codes[in_table]]
+        known_codes = codes[in_table]
+        
+        unknown_codes = np.unique(codes[~in_table])
+        stats.unknown_characters.update(chr(code) for code in unknown_codes.tolist())
+        
+        chunk_penalties = penalties[known_codes]
+        chunk_fingers = fingers[known_codes]
+        finger_count = len(self.fingers)
+        presses = np.bincount(chunk_fingers, minlength=finger_count + 1)
+        errors = np.bincount(chunk_fingers, weights=chunk_penalties, minlength=finger_count + 1)
+        
+        for index in np.flatnonzero(presses[:finger_count]).tolist():
+            stats.finger_presses[index] += int(presses[index])
+            stats.finger_errors[index] += float(errors[index])
+        
+        total_penalty = chunk_penalties.sum()
+        mistakes = int(total_penalty) if integer_penalties else float(total_penalty)
+        
+        stats.mistakes += mistakes
+        stats.processed_characters += int(known_codes.size)
+        stats.total_characters += len(text)
+        return mistakes
+    
+    def score(self, text: str, stats: 'ProcessingStats', engine: str = 'python') -> Union[int, float]:
+        """Начисляет штрафы за текст выбранным движком"""
+        if engine == 'histogram':
+            return self.score_counts(Counter(text), stats)
+        if engine == 'numpy':
+            return self.score_array(text, stats)
+        return self.score_text(text, stats)
+
+
+def check_engine(engine: str):
+    """Проверяет название движка подсчета"""
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок '{engine}'. Доступные: {', '.join(ENGINES)}")
+    if engine == 'numpy' and np is None:
+        raise ImportError("Для движка 'numpy' требуется модуль numpy")
+
+
+def default_engine() -> str:
+    """Возвращает самый быстрый доступный движок подсчета"""
+    return 'numpy' if np is not None else 'histogram'
+
+
+def compile_rules(rules: Union[Dict[str, Union[int, float, List]], CompiledRules]) -> CompiledRules:
+    """Возвращает скомпилированные правила, не компилируя их повторно"""
+    if isinstance(rules, CompiledRules):
+        return rules
+    return CompiledRules(rules)
+
+
+class ProcessingStats:
+    """
+    Накопитель результатов анализа одной раскладки.
+    Счетчики по пальцам хранятся в массивах фиксированного размера,
+    индексы совпадают с CompiledRules.fingers.
+    """
+    
+    def __init__(self, compiled: CompiledRules):
+        self.compiled = compiled
+        self.mistakes = 0
+        self.total_words = 0
+        self.total_characters = 0
+        self.processed_characters = 0
+        self.unknown_characters = set()
+        self.finger_presses = [0] * len(compiled.fingers)
+        self.finger_errors = [0.0] * len(compiled.fingers)
+        self.histogram = None  # Гистограмма символов (Counter), если ее нужно собрать
+        self._in_word = False  # Закончился ли предыдущий чанк внутри слова
+    
+    def count_words(self, chunk: str):
+        """
+        Добавляет количество слов в чанке сплошного текста.
+        Слово, разрезанное границей чанков, считается один раз.
+        """
+        words = len(chunk.split())
+        if words and self._in_word and not chunk[0].isspace():
+            words -= 1
+        if chunk:
+            self._in_word = not chunk[-1].isspace()
+        self.total_words += words
+    
+    def merge(self, other: 'ProcessingStats'):
+        """
+        Добавляет частичные результаты другого накопителя той же раскладки
+        (например, результат обработки соседнего фрагмента файла).
+        """
+        self.mistakes += other.mistakes
+        self.total_words += other.total_words
+        self.total_characters += other.total_characters
+        self.processed_characters += other.processed_characters
+        self.unknown_characters |= other.unknown_characters
+        for index, presses in enumerate(other.finger_presses):
+            self.finger_presses[index] += presses
+            self.finger_errors[index] += other.finger_errors[index]
+        if other.histogram is not None:
+            if self.histogram is None:
+                self.histogram = Counter()
+            self.histogram.update(other.histogram)
+    
+    def to_state(self) -> dict:
+        """Сериализуемое (JSON) состояние счетчиков для контрольной точки"""
+        return {
+            'mistakes': self.mistakes,
+            'total_words': self.total_words,
+            'total_characters': self.total_characters,
+            'processed_characters': self.processed_characters,
+            'unknown_characters': sorted(self.unknown_characters),
+            'finger_presses': self.finger_presses,
+            'finger_errors': self.finger_errors,
+            'histogram': None if self.histogram is None else dict(self.histogram),
+        }
+    
+    @classmethod
+    def from_state(cls, compiled: CompiledRules, state: dict) -> 'ProcessingStats':
+        """Восстанавливает накопитель из состояния, сохраненного to_state()"""
+        stats = cls(compiled)
+        stats.mistakes = state['mistakes']
+        stats.total_words = state['total_words']
+        stats.total_characters = state['total_characters']
+        stats.processed_characters = state['processed_characters']
+        stats.unknown_characters = set(state['unknown_characters'])
+        stats.finger_presses = list(state['finger_presses'])
+        stats.finger_errors = list(state['finger_errors'])
+        if state.get('histogram') is not None:
+            stats.histogram = Counter(state['histogram'])
+        return stats
+    
+    def to_results(self, layout_name: str = "unknown", text_type: str = None) -> dict:
+        """Формирует словарь результатов в формате функций make_processing*"""
+        finger_stats = {}
+        finger_errors = {}
+        finger_data = {}
+        
+        for index, finger in enumerate(self.compiled.fingers):
+            total_presses = self.finger_presses[index]
+            if not total_presses:
+                continue
+            total_errors = self.finger_errors[index]
+            finger_stats[finger] = total_presses
+            finger_errors[finger] = total_errors
+            finger_data[finger] = {
+                'total_presses': total_presses,
+                'total_errors': total_errors,
+                'error_rate': total_errors / total_presses
+            }
+        
+        results = {
+            'total_errors': self.mistakes,
+            'total_words': self.total_words,
+            'total_characters': self.total_characters,
+            'processed_characters': self.processed_characters,
+            'unknown_characters': self.unknown_characters,
+            'finger_statistics': finger_stats,
+            'finger_errors': finger_errors,
+            'finger_detailed_data': finger_data,
+            'layout_name': layout_name,
+            'avg_errors_per_word': self.mistakes / self.total_words if self.total_words else 0,
+            'avg_errors_per_char': self.mistakes / self.processed_characters if self.processed_characters else 0
+        }
+        
+        if text_type:
+            results['text_type'] = text_type
+        
+        return results
+
+
+class ConvergenceMonitor:
+    """
+    Доверительные интервалы долей по ходу потока.
+    
+    Каждый батч (чанк) - одно наблюдение: знаменатель x (символы,
+    последовательности) и числители y по ключам (штрафы, число
+    последовательностей типа удобства). Доля - отношение сумм по батчам,
+    ее интервал - нормальный, по разбросу остатков батчей (оценка
+    отношения для кластерной выборки: соседние окна текста не независимы,
+    батчи - почти). Оценка честная, если порядок текста в файле не связан
+    с его содержимым (корпус не отсортирован).
+    
+    Общий для calculate_data (средний штраф на символ) и new_processing
+    (проценты удобства, scale=100).
+    """
+    
+    def __init__(self, tolerance: float, confidence: float = 0.95,
+                 min_batches: int = CONVERGENCE_MIN_BATCHES, scale: float = 1.0):
+        if tolerance <= 0:
+            raise ValueError(f"Допуск должен быть положительным: {tolerance}")
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.min_batches = min_batches
+        self.scale = scale
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.batches = 0
+        self.sum_x = 0
+        self.sum_xx = 0
+        self.sums = {}  # ключ -> [сумма y, сумма y*y, сумма x*y]
+        self._last = (0, {})
+    
+    def observe(self, total: Union[int, float], counts: Dict[str, Union[int, float]]):
+        """Учитывает батч по накопленным итогам (разность с прошлым вызовом)"""
+        last_total, last_counts = self._last
+        x = total - last_total
+        self.batches += 1
+        self.sum_x += x
+        self.sum_xx += x * x
+        for key, count in counts.items():
+            y = count - last_counts.get(key, 0)
+            sums = self.sums.setdefault(key, [0, 0, 0])
+            sums[0] += y
+            sums[1] += y * y
+            sums[2] += x * y
+        self._last = (total, dict(counts))
+    
+    def intervals(self) -> Dict[str, List[float]]:
+        """{ключ: [нижняя, верхняя]} в единицах scale; пусто, пока данных мало"""
+        if self.batches < 2 or not self.sum_x:
+            return {}
+        mean_x = self.sum_x / self.batches
+        result = {}
+        for key, (sum_y, sum_yy, sum_xy) in self.sums.items():
+            ratio = sum_y / self.sum_x
+            residuals = max(0.0, sum_yy - 2 * ratio * sum_xy + ratio * ratio * self.sum_xx)
+            error = (residuals / (self.batches - 1) / self.batches) ** 0.5 / mean_x
+            result[key] = [(ratio - self.z * error) * self.scale, (ratio + self.z * error) * self.scale]
+        return result
+    
+    def converged(self) -> bool:
+        """Все интервалы уже допуска (в единицах scale) после min_batches батчей"""
+        if self.batches < self.min_batches:
+            return False
+        intervals = self.intervals()
+        return bool(intervals) and all(high - low < self.tolerance for low, high in intervals.values())
+    
+    def summary(self) -> dict:
+        """Итог для результатов: допуск, число батчей, интервалы и была ли остановка"""
+        return {
+            'tolerance': self.tolerance,
+            'confidence': self.confidence,
+            'batches': self.batches,
+            'converged': self.converged(),
+            'intervals': self.intervals()
+        }
+
+
+def make_processing(wordlist: list, rules: Union[dict, CompiledRules], layout_name: str = "unknown", save_to_db: bool = True) -> dict:
+    """
+    Считает количество ошибок по словарю правил и списку слов.
+    Тонкая обертка над make_processing_stream: список обрабатывается батчами,
+    поэтому ограничения на размер списка нет.
+    
+    Returns:
+        dict: Словарь с результатами анализа
+    """
+    print(f"Обрабатываем {len(wordlist)} слов...")
+    
+    batches = (wordlist[i:i + WORD_BATCH_SIZE] for i in range(0, len(wordlist), WORD_BATCH_SIZE))
+    return make_processing_stream(batches, rules, len(wordlist), layout_name, save_to_db)
 
 
 def make_processing_stream(wordlist_generator: Generator[List[str], None, None], 
-                          rules: Dict[str, Union[int, float, List]], 
+                          rules: Union[Dict[str, Union[int, float, List]], CompiledRules], 
                           total_words: int = None,
                           layout_name: str = "unknown",
-                          save_to_db: bool = True) -> dict:
+                          save_to_db: bool = True,
+                          engine: str = 'python') -> dict:
     """
     Обрабатывает большие файлы батчами с прогресс-баром.
-    """
-    mistakes = 0
-    processed_words = 0
-    total_characters = 0
-    processed_characters = 0
-    unknown_characters = set()
     
-    # Расширенная статистика по пальцам
-    finger_stats = defaultdict(int)  # Общее количество нажатий каждого пальца
-    finger_errors = defaultdict(float)  # Количество ошибок на каждый палец
-    finger_data = {}  # Детальная информация по каждому пальцу
+    Args:
+        engine: Движок подсчета ('python', 'histogram' или 'numpy'), см. ENGINES
+    """
+    check_engine(engine)
+    compiled = compile_rules(rules)
+    stats = ProcessingStats(compiled)
     
     # Создаем прогресс-бар
     if total_words:
@@ -216,77 +569,21 @@ def make_processing_stream(wordlist_generator: Generator[List[str], None, None],
     
     try:
         for batch in wordlist_generator:
-            batch_mistakes = 0
-            batch_chars = 0
-            batch_processed_chars = 0
-            
-            for word in batch:
-                for letter in word:
-                    total_characters += 1
-                    batch_chars += 1
-                    if letter in rules:
-                        rule_data = rules[letter]
-                        
-                        if isinstance(rule_data, (int, float)):
-                            batch_mistakes += rule_data
-                            processed_characters += 1
-                            batch_processed_chars += 1
-                        elif isinstance(rule_data, list) and len(rule_data) >= 2:
-                            penalty, finger = rule_data[0], rule_data[1]
-                            batch_mistakes += penalty
-                            processed_characters += 1
-                            batch_processed_chars += 1
-                            
-                            finger_stats[finger] += 1
-                            finger_errors[finger] += penalty
-                            
-                            if finger not in finger_data:
-                                finger_data[finger] = {
-                                    'total_presses': 0,
-                                    'total_errors': 0.0,
-                                    'error_rate': 0.0
-                                }
-                            finger_data[finger]['total_presses'] += 1
-                            finger_data[finger]['total_errors'] += penalty
-                            
-                        else:
-                            unknown_characters.add(letter)
-                    else:
-                        unknown_characters.add(letter)
-            
-            mistakes += batch_mistakes
-            processed_words += len(batch)
+            compiled.score(''.join(batch), stats, engine)
+            stats.total_words += len(batch)
             pbar.update(len(batch))
             
-            avg_per_word = mistakes / processed_words if processed_words else 0
+            avg_per_word = stats.mistakes / stats.total_words if stats.total_words else 0
             pbar.set_postfix({
-                'ошибки': mistakes, 
-                'слов': processed_words,
+                'ошибки': stats.mistakes, 
+                'слов': stats.total_words,
                 'ср/слово': f'{avg_per_word:.1f}'
             })
     
     finally:
         pbar.close()
     
-    # Рассчитываем процент ошибок для каждого пальца
-    for finger in finger_data:
-        total_presses = finger_data[finger]['total_presses']
-        total_errors = finger_data[finger]['total_errors']
-        finger_data[finger]['error_rate'] = total_errors / total_presses if total_presses > 0 else 0
-    
-    results = {
-        'total_errors': mistakes,
-        'total_words': processed_words,
-        'total_characters': total_characters,
-        'processed_characters': processed_characters,
-        'unknown_characters': unknown_characters,
-        'finger_statistics': dict(finger_stats),
-        'finger_errors': dict(finger_errors),
-        'finger_detailed_data': finger_data,
-        'layout_name': layout_name,
-        'avg_errors_per_word': mistakes / processed_words if processed_words else 0,
-        'avg_errors_per_char': mistakes / processed_characters if processed_characters else 0
-    }
+    results = stats.to_results(layout_name)
     
     # Сохраняем в базу данных если требуется
     if save_to_db:
@@ -295,77 +592,46 @@ def make_processing_stream(wordlist_generator: Generator[List[str], None, None],
     return results
 
 
-def make_text_processing(text: str, rules: dict, layout_name: str = "unknown", save_to_db: bool = True) -> dict:
+def weighted_histogram(weighted_words: List[Tuple[str, int]]) -> Counter:
     """
-    Считает количество ошибок по словарю правил для сплошного текста.
-    ВНИМАНИЕ: Используйте только для небольших текстов!
+    Гистограмма символов батча пар (слово, частота): каждое слово
+    учитывается столько раз, сколько указано в его частоте.
     """
-    if len(text) > 100000:
-        raise ValueError(f"Текст слишком большой ({len(text)} символов). Используйте make_text_processing_stream()")
+    histogram = Counter()
+    for word, count in weighted_words:
+        for char in word:
+            histogram[char] += count
+    return histogram
+
+
+def make_weighted_processing_stream(weighted_generator: Generator[List[Tuple[str, int]], None, None],
+                                    rules: Union[Dict[str, Union[int, float, List]], CompiledRules],
+                                    total_lines: int = None,
+                                    layout_name: str = "unknown",
+                                    save_to_db: bool = True) -> dict:
+    """
+    Обрабатывает частотный список слов (батчи пар (слово, частота)).
+    Результат совпадает с make_processing_stream по списку, в котором каждое
+    слово повторено столько раз, сколько указано в его частоте, но сам
+    список не разворачивается.
     
-    mistakes = 0
-    total_characters = len(text)
-    processed_characters = 0
-    unknown_characters = set()
+    Args:
+        weighted_generator: Генератор батчей пар (слово, частота)
+        rules: Правила раскладки или CompiledRules
+        total_lines: Количество строк частотного списка (для прогресс-бара)
+        layout_name: Название раскладки
+        save_to_db: Сохранять ли результаты в базу данных
+    """
+    compiled = compile_rules(rules)
+    stats = ProcessingStats(compiled)
     
-    # Расширенная статистика по пальцам
-    finger_stats = defaultdict(int)
-    finger_errors = defaultdict(float)
-    finger_data = {}
+    with tqdm(total=total_lines, desc="Обработка частотного списка") as pbar:
+        for batch in weighted_generator:
+            compiled.score_counts(weighted_histogram(batch), stats)
+            stats.total_words += sum(count for _, count in batch)
+            pbar.update(len(batch))
     
-    print(f"Обрабатываем текст из {total_characters:,} символов...")
-    
-    for char in tqdm(text, desc="Обработка символов"):
-        if char in rules:
-            rule_data = rules[char]
-            
-            if isinstance(rule_data, (int, float)):
-                mistakes += rule_data
-                processed_characters += 1
-            elif isinstance(rule_data, list) and len(rule_data) >= 2:
-                penalty, finger = rule_data[0], rule_data[1]
-                mistakes += penalty
-                processed_characters += 1
-                
-                finger_stats[finger] += 1
-                finger_errors[finger] += penalty
-                
-                if finger not in finger_data:
-                    finger_data[finger] = {
-                        'total_presses': 0,
-                        'total_errors': 0.0,
-                        'error_rate': 0.0
-                    }
-                finger_data[finger]['total_presses'] += 1
-                finger_data[finger]['total_errors'] += penalty
-                
-            else:
-                unknown_characters.add(char)
-        else:
-            unknown_characters.add(char)
-    
-    words = text.split()
-    word_count = len(words)
-    
-    for finger in finger_data:
-        total_presses = finger_data[finger]['total_presses']
-        total_errors = finger_data[finger]['total_errors']
-        finger_data[finger]['error_rate'] = total_errors / total_presses if total_presses > 0 else 0
-    
-    results = {
-        'total_errors': mistakes,
-        'total_words': word_count,
-        'total_characters': total_characters,
-        'processed_characters': processed_characters,
-        'unknown_characters': unknown_characters,
-        'finger_statistics': dict(finger_stats),
-        'finger_errors': dict(finger_errors),
-        'finger_detailed_data': finger_data,
-        'layout_name': layout_name,
-        'avg_errors_per_word': mistakes / word_count if word_count else 0,
-        'avg_errors_per_char': mistakes / processed_characters if processed_characters else 0,
-        'text_type': 'continuous'
-    }
+    results = stats.to_results(layout_name)
     
     if save_to_db:
         save_to_database(results)
@@ -373,23 +639,41 @@ def make_text_processing(text: str, rules: dict, layout_name: str = "unknown", s
     return results
 
 
+def make_text_processing(text: str, rules: Union[dict, CompiledRules], layout_name: str = "unknown", save_to_db: bool = True) -> dict:
+    """
+    Считает количество ошибок по словарю правил для сплошного текста.
+    Тонкая обертка над make_text_processing_stream: текст обрабатывается чанками,
+    поэтому ограничения на размер текста нет.
+    """
+    print(f"Обрабатываем текст из {len(text):,} символов...")
+    
+    chunks = (text[i:i + TEXT_CHUNK_SIZE] for i in range(0, len(text), TEXT_CHUNK_SIZE))
+    return make_text_processing_stream(chunks, rules, len(text), layout_name, save_to_db)
+
+
 def make_text_processing_stream(text_generator: Generator[str, None, None], 
-                               rules: Dict[str, Union[int, float, List]], 
+                               rules: Union[Dict[str, Union[int, float, List]], CompiledRules], 
                                total_chars: int = None,
                                layout_name: str = "unknown",
-                               save_to_db: bool = True) -> dict:
+                               save_to_db: bool = True,
+                               engine: str = 'python',
+                               tolerance: float = None,
+                               confidence: float = 0.95) -> dict:
     """
     Обрабатывает большие текстовые файлы чанками с прогресс-баром.
-    """
-    mistakes = 0
-    processed_characters = 0
-    total_characters = 0
-    unknown_characters = set()
     
-    finger_stats = defaultdict(int)
-    finger_errors = defaultdict(float)
-    finger_data = {}
-    word_count = 0
+    Args:
+        engine: Движок подсчета ('python', 'histogram' или 'numpy'), см. ENGINES
+        tolerance: Ранняя остановка: чтение прекращается, как только доверительный
+                   интервал среднего штрафа на символ уже tolerance (см. ConvergenceMonitor).
+                   В результат добавляется 'early_stop' с интервалом и долей
+                   прочитанного текста (если известен total_chars). None - читать все
+        confidence: Уровень доверия интервала для tolerance
+    """
+    check_engine(engine)
+    compiled = compile_rules(rules)
+    stats = ProcessingStats(compiled)
+    monitor = ConvergenceMonitor(tolerance, confidence) if tolerance is not None else None
     
     if total_chars:
         pbar = tqdm(total=total_chars, desc="Обработка текста", unit="символ")
@@ -398,75 +682,32 @@ def make_text_processing_stream(text_generator: Generator[str, None, None],
     
     try:
         for chunk in text_generator:
-            chunk_mistakes = 0
-            chunk_processed = 0
-            
-            word_count += len(chunk.split())
-            
-            for char in chunk:
-                total_characters += 1
-                if char in rules:
-                    rule_data = rules[char]
-                    
-                    if isinstance(rule_data, (int, float)):
-                        chunk_mistakes += rule_data
-                        processed_characters += 1
-                        chunk_processed += 1
-                    elif isinstance(rule_data, list) and len(rule_data) >= 2:
-                        penalty, finger = rule_data[0], rule_data[1]
-                        chunk_mistakes += penalty
-                        processed_characters += 1
-                        chunk_processed += 1
-                        
-                        finger_stats[finger] += 1
-                        finger_errors[finger] += penalty
-                        
-                        if finger not in finger_data:
-                            finger_data[finger] = {
-                                'total_presses': 0,
-                                'total_errors': 0.0,
-                                'error_rate': 0.0
-                            }
-                        finger_data[finger]['total_presses'] += 1
-                        finger_data[finger]['total_errors'] += penalty
-                        
-                    else:
-                        unknown_characters.add(char)
-                else:
-                    unknown_characters.add(char)
-            
-            mistakes += chunk_mistakes
+            stats.count_words(chunk)
+            compiled.score(chunk, stats, engine)
             pbar.update(len(chunk))
             
-            avg_per_char = mistakes / processed_characters if processed_characters else 0
+            avg_per_char = stats.mistakes / stats.processed_characters if stats.processed_characters else 0
             pbar.set_postfix({
-                'ошибки': mistakes,
-                'символы': total_characters,
+                'ошибки': stats.mistakes,
+                'символы': stats.total_characters,
                 'ср/симв': f'{avg_per_char:.3f}'
             })
+            
+            if monitor is not None:
+                monitor.observe(stats.processed_characters, {'avg_errors_per_char': stats.mistakes})
+                if monitor.converged():
+                    break
     
     finally:
         pbar.close()
     
-    for finger in finger_data:
-        total_presses = finger_data[finger]['total_presses']
-        total_errors = finger_data[finger]['total_errors']
-        finger_data[finger]['error_rate'] = total_errors / total_presses if total_presses > 0 else 0
-    
-    results = {
-        'total_errors': mistakes,
-        'total_words': word_count,
-        'total_characters': total_characters,
-        'processed_characters': processed_characters,
-        'unknown_characters': unknown_characters,
-        'finger_statistics': dict(finger_stats),
-        'finger_errors': dict(finger_errors),
-        'finger_detailed_data': finger_data,
-        'layout_name': layout_name,
-        'avg_errors_per_word': mistakes / word_count if word_count else 0,
-        'avg_errors_per_char': mistakes / processed_characters if processed_characters else 0,
-        'text_type': 'continuous'
-    }
+    results = stats.to_results(layout_name, text_type='continuous')
+    
+    if monitor is not None:
+        early_stop = monitor.summary()
+        early_stop['consumed_characters'] = stats.total_characters
+        early_stop['consumed_fraction'] = min(1.0, stats.total_characters / total_chars) if total_chars else None
+        results['early_stop'] = early_stop
     
     if save_to_db:
         save_to_database(results)
@@ -474,6 +715,478 @@ def make_text_processing_stream(text_generator: Generator[str, None, None],
     return results
 
 
+def make_histogram_processing(histogram: Dict[str, int],
+                              rules: Union[Dict[str, Union[int, float, List]], CompiledRules],
+                              total_words: int,
+                              layout_name: str = "unknown",
+                              text_type: str = 'words',
+                              save_to_db: bool = True) -> dict:
+    """
+    Считает результаты анализа раскладки по готовой гистограмме символов корпуса.
+    
+    Args:
+        histogram: Гистограмма символов {символ: количество}
+        rules: Правила раскладки или CompiledRules
+        total_words: Количество слов в корпусе
+        layout_name: Название раскладки
+        text_type: 'words' (список слов), 'text' (сплошной текст) или 'weighted' (частотный список)
+        save_to_db: Сохранять ли результаты в базу данных
+    
+    Returns:
+        dict: Результаты в формате функций make_processing*
+    """
+    if text_type not in ('words', 'text', 'weighted'):
+        raise ValueError(f"Неизвестный тип текста '{text_type}'. Доступные: words, text, weighted")
+    
+    compiled = compile_rules(rules)
+    stats = ProcessingStats(compiled)
+    compiled.score_counts(histogram, stats)
+    stats.total_words = total_words
+    
+    results = stats.to_results(layout_name, text_type='continuous' if text_type == 'text' else None)
+    
+    if save_to_db:
+        save_to_database(results)
+    
+    return results
+
+
+def make_multi_layout_processing_stream(chunk_generator: Generator[Union[str, List[str]], None, None],
+                                        layouts: Dict[str, Union[Dict[str, Union[int, float, List]], CompiledRules]],
+                                        total: int = None,
+                                        text_type: str = 'words',
+                                        save_to_db: bool = True) -> Dict[str, dict]:
+    """
+    Оценивает несколько раскладок за один проход по корпусу.
+    Корпус читается один раз: строится общая гистограмма символов,
+    по которой затем считаются результаты каждой раскладки.
+    
+    Args:
+        chunk_generator: Батчи слов (text_type='words') или чанки текста (text_type='text')
+        layouts: Словарь {название раскладки: правила}
+        total: Количество слов/символов для прогресс-бара
+        text_type: 'words' (список слов) или 'text' (сплошной текст)
+        save_to_db: Сохранять ли результаты в базу данных
+    
+    Returns:
+        dict: {название раскладки: результаты в формате make_processing*}
+    """
+    if text_type not in ('words', 'text'):
+        raise ValueError(f"Неизвестный тип текста '{text_type}'. Доступные: words, text")
+    
+    compiled_layouts = {name: compile_rules(rules) for name, rules in layouts.items()}
+    histogram = Counter()
+    total_words = 0
+    # Слова сплошного текста считаются с учетом границ чанков, как в make_text_processing_stream
+    word_counter = ProcessingStats(CompiledRules({}))
+    
+    unit = "слово" if text_type == 'words' else "символ"
+    if total:
+        pbar = tqdm(total=total, desc=f"Сбор гистограммы ({len(layouts)} раскладок)", unit=unit)
+    else:
+        pbar = tqdm(desc=f"Сбор гистограммы ({len(layouts)} раскладок)", unit=unit)
+    
+    try:
+        for chunk in chunk_generator:
+            if text_type == 'words':
+                histogram.update(''.join(chunk))
+                total_words += len(chunk)
+                pbar.update(len(chunk))
+            else:
+                histogram.update(chunk)
+                word_counter.count_words(chunk)
+                pbar.update(len(chunk))
+    
+    finally:
+        pbar.close()
+    
+    if text_type == 'text':
+        total_words = word_counter.total_words
+    
+    all_results = {}
+    for layout_name, compiled in compiled_layouts.items():
+        all_results[layout_name] = make_histogram_processing(
+            histogram, compiled, total_words, layout_name, text_type, save_to_db
+        )
+    
+    return all_results
+
+
+def _score_file_range(corpus: MappedCorpus, start: int, end: int,
+                      rules: Union[Dict[str, Union[int, float, List]], CompiledRules],
+                      text_type: str, engine: str, chunk_size: int,
+                      collect_histogram: bool = False) -> ProcessingStats:
+    """
+    Обрабатывает один байтовый диапазон корпуса (выполняется в процессе-воркере).
+    Корпус передается как путь и заново отображается через mmap в воркере.
+    При collect_histogram в результате сохраняется и гистограмма символов.
+    """
+    compiled = compile_rules(rules)
+    stats = ProcessingStats(compiled)
+    if collect_histogram:
+        stats.histogram = Counter()
+    
+    def score(text: str):
+        if stats.histogram is None:
+            compiled.score(text, stats, engine)
+        else:
+            counts = Counter(text)
+            stats.histogram.update(counts)
+            compiled.score_counts(counts, stats)
+    
+    if text_type == 'words':
+        for batch in corpus.iter_word_batches(start, end, slice_size=chunk_size):
+            score(''.join(batch))
+            stats.total_words += len(batch)
+    elif text_type == 'weighted':
+        for batch in corpus.iter_word_batches(start, end, slice_size=chunk_size):
+            weighted_words = [pair for pair in map(parse_weighted_line, batch) if pair[1] > 0]
+            counts = weighted_histogram(weighted_words)
+            if stats.histogram is not None:
+                stats.histogram.update(counts)
+            compiled.score_counts(counts, stats)
+            stats.total_words += sum(count for _, count in weighted_words)
+    elif corpus.single_byte and (engine != 'python' or collect_histogram):
+        # Однобайтовая кодировка: считаем символы и слова прямо по байтам
+        counts = corpus.char_histogram(start, end, slice_size=chunk_size)
+        if stats.histogram is not None:
+            stats.histogram.update(counts)
+        compiled.score_counts(counts, stats)
+        stats.total_words += corpus.count_words(start, end, slice_size=chunk_size)
+    else:
+        for chunk in corpus.iter_text(start, end, slice_size=chunk_size):
+            stats.count_words(chunk)
+            score(chunk)
+    
+    return stats
+
+
+def make_file_processing(filename: str,
+                         rules: Union[Dict[str, Union[int, float, List]], CompiledRules],
+                         text_type: str = 'words',
+                         layout_name: str = "unknown",
+                         save_to_db: bool = True,
+                         engine: str = None,
+                         workers: int = None,
+                         shards_per_worker: int = 4,
+                         encoding: str = None,
+                         checkpoint_db: str = None,
+                         use_cache: bool = False,
+                         cache_db: str = "database.db") -> dict:
+    """
+    Единый потоковый движок анализа файла любого размера.
+    
+    Файл никогда не загружается целиком: он отображается в память через mmap
+    (MappedCorpus) и делится на байтовые диапазоны, выровненные по строкам
+    (для списка слов) или по пробельным символам (для сплошного текста).
+    Количество процессов и размер чанка подбираются по размеру файла:
+    небольшие файлы обрабатываются в текущем процессе, большие - в
+    ProcessPoolExecutor, после чего частичные результаты объединяются.
+    
+    Если задан checkpoint_db, результат каждого обработанного диапазона
+    сохраняется в таблицу processing_checkpoints. При повторном запуске с
+    тем же файлом, правилами и типом текста обработка продолжается с
+    необработанных диапазонов; после завершения контрольная точка удаляется.
+    
+    Если задан use_cache, гистограмма символов корпуса сохраняется в кэш
+    (таблицы corpus_cache / corpus_histograms базы cache_db) по отпечатку файла, и
+    повторный анализ того же корпуса любой раскладкой считается по ней,
+    без чтения файла.
+    
+    Args:
+        filename: Путь к файлу
+        rules: Правила раскладки или CompiledRules
+        text_type: 'words' (список слов), 'text' (сплошной текст) или
+                   'weighted' (частотный список "слово частота", см. parse_weighted_line)
+        layout_name: Название раскладки
+        save_to_db: Сохранять ли результаты в базу данных
+        engine: Движок подсчета, см. ENGINES (по умолчанию - default_engine())
+        workers: Количество процессов (по умолчанию - по размеру файла, 1 - без пула)
+        shards_per_worker: Сколько диапазонов приходится на один процесс
+        encoding: Кодировка файла (по умолчанию utf-8 с откатом на latin-1)
+        checkpoint_db: База данных для контрольных точек (None - без них)
+        use_cache: Использовать кэш гистограмм корпусов
+        cache_db: База данных кэша гистограмм корпусов
+    
+    Returns:
+        dict: Результаты в формате make_processing_stream / make_text_processing_stream
+    """
+    if text_type not in ('words', 'text', 'weighted'):
+        raise ValueError(f"Неизвестный тип текста '{text_type}'. Доступные: words, text, weighted")
+    engine = engine or default_engine()
+    check_engine(engine)
+    
+    compiled = compile_rules(rules)
+    
+    fingerprint = None
+    if use_cache:
+        fingerprint = corpus_fingerprint(filename)
+        cached = take_corpus_histogram(fingerprint, text_type, db_path=cache_db)
+        if cached:
+            histogram, total_words = cached
+            return make_histogram_processing(histogram, compiled, total_words, layout_name, text_type, save_to_db)
+    
+    file_size = os.path.getsize(filename) if os.path.exists(filename) else 0
+    if not workers:
+        workers = (os.cpu_count() or 1) if file_size >= PARALLEL_THRESHOLD_BYTES else 1
+    parts = workers * shards_per_worker
+    if checkpoint_db:
+        parts = max(parts, -(-file_size // CHECKPOINT_RANGE_BYTES))
+    
+    checkpoint_key = None
+    saved = None
+    if checkpoint_db:
+        _init_checkpoint_table(checkpoint_db)
+        checkpoint_key = _checkpoint_key(filename, compiled, text_type, use_cache)
+        saved = _load_checkpoint(checkpoint_db, checkpoint_key, compiled)
+        if saved and encoding and saved['encoding'] != encoding:
+            _delete_checkpoint(checkpoint_db, checkpoint_key)
+            saved = None
+    
+    if saved:
+        ranges = saved['ranges']
+        encodings = [saved['encoding']]
+        done = saved['done']
+    else:
+        ranges = split_file_into_ranges(filename, parts, by_lines=(text_type != 'text'))
+        encodings = [encoding] if encoding else ['utf-8', 'latin-1']
+        done = {}
+    chunk_size = choose_chunk_size(file_size, len(ranges))
+    
+    for attempt, current_encoding in enumerate(encodings):
+        on_range_done = None
+        if checkpoint_db:
+            if not saved:
+                _create_checkpoint(checkpoint_db, checkpoint_key, filename, layout_name,
+                                   text_type, current_encoding, ranges)
+            
+            def on_range_done(index: int, partial: ProcessingStats):
+                start, end = ranges[index]
+                _save_checkpoint_range(checkpoint_db, checkpoint_key, start, end, partial)
+        try:
+            partials = _score_ranges(filename, ranges, compiled, text_type, current_encoding,
+                                     engine, workers, chunk_size, done, on_range_done, use_cache)
+            break
+        except UnicodeDecodeError:
+            if attempt == len(encodings) - 1:
+                raise
+            # Пробуем другую кодировку, начиная заново
+            if checkpoint_db:
+                _delete_checkpoint(checkpoint_db, checkpoint_key)
+            done = {}
+    
+    if checkpoint_db:
+        _delete_checkpoint(checkpoint_db, checkpoint_key)
+    
+    stats = ProcessingStats(compiled)
+    for partial in partials:
+        stats.merge(partial)
+    
+    if use_cache:
+        save_corpus_histogram(fingerprint, os.path.abspath(filename), text_type,
+                              dict(stats.histogram or {}), stats.total_words, db_path=cache_db)
+    
+    results = stats.to_results(layout_name, text_type='continuous' if text_type == 'text' else None)
+    
+    if save_to_db:
+        save_to_database(results)
+    
+    return results
+
+
+def _score_ranges(filename: str, ranges: List[Tuple[int, int]], compiled: CompiledRules,
+                  text_type: str, encoding: str, engine: str, workers: int,
+                  chunk_size: int, done: Dict[int, ProcessingStats] = None,
+                  on_range_done=None, collect_histogram: bool = False) -> List[ProcessingStats]:
+    """
+    Обрабатывает диапазоны в текущем процессе (workers=1) или в пуле процессов.
+    Диапазоны из done (индекс -> результат) уже обработаны и пропускаются,
+    on_range_done(index, stats) вызывается после каждого нового диапазона.
+    Результаты возвращаются в порядке диапазонов.
+    """
+    done = done or {}
+    partials = [done.get(index) for index in range(len(ranges))]
+    pending = [index for index in range(len(ranges)) if index not in done]
+    total_bytes = sum(end - start for start, end in ranges)
+    done_bytes = sum(ranges[index][1] - ranges[index][0] for index in done)
+    
+    def finish(index: int, partial: ProcessingStats):
+        partials[index] = partial
+        if on_range_done:
+            on_range_done(index, partial)
+        start, end = ranges[index]
+        pbar.update(end - start)
+    
+    with MappedCorpus(filename, encoding) as corpus, \
+         tqdm(total=total_bytes, initial=done_bytes, desc=f"Обработка файла ({workers} проц.)",
+              unit="B", unit_scale=True) as pbar:
+        if workers == 1:
+            for index in pending:
+                start, end = ranges[index]
+                finish(index, _score_file_range(corpus, start, end, compiled, text_type, engine, chunk_size,
+                                                collect_histogram))
+            return partials
+        
+        # spawn: fork многопоточного процесса (tqdm держит свой поток) небезопасен
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                executor.submit(_score_file_range, corpus, *ranges[index], compiled, text_type, engine,
+                                chunk_size, collect_histogram): index
+                for index in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    finish(futures[future], future.result())
+            except BaseException:
+                # Не ждем оставшиеся диапазоны: прогресс уже в контрольной точке
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    
+    return partials
+
+
+def _init_checkpoint_table(db_path: str):
+    """Создает таблицу контрольных точек (см. db_init.init_tables) в базе db_path, если ее нет"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(sql_querry_init_checkpoints)
+    conn.commit()
+    conn.close()
+
+
+def _checkpoint_key(filename: str, compiled: CompiledRules, text_type: str,
+                    collect_histogram: bool = False) -> str:
+    """
+    Ключ контрольной точки: файл (путь, размер, время изменения),
+    правила раскладки, тип текста и сбор гистограммы. Изменение любого
+    из них делает старую контрольную точку недействительной.
+    """
+    info = os.stat(filename)
+    source = repr((os.path.abspath(filename), info.st_size, info.st_mtime_ns, text_type,
+                   collect_histogram, compiled.fingers, sorted(compiled.table.items())))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def _create_checkpoint(db_path: str, key: str, filename: str, layout_name: str,
+                       text_type: str, encoding: str, ranges: List[Tuple[int, int]]):
+    """
+    Создает контрольную точку со списком еще не обработанных диапазонов.
+    Размер и время изменения файла сохраняются, чтобы list_checkpoints
+    мог отбросить точки изменившихся файлов.
+    """
+    info = os.stat(filename)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM processing_checkpoints WHERE job_key = ?", (key,))
+    cursor.executemany(
+        """INSERT INTO processing_checkpoints
+           (job_key, file_path, file_size, file_mtime_ns, name_lk, text_type, encoding, range_start, range_end)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        [(key, os.path.abspath(filename), info.st_size, info.st_mtime_ns, layout_name, text_type, encoding, start, end)
+         for start, end in ranges]
+    )
+    conn.commit()
+    conn.close()
+
+
+def _save_checkpoint_range(db_path: str, key: str, start: int, end: int, stats: ProcessingStats):
+    """Сохраняет результат обработанного диапазона"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE processing_checkpoints SET state = ? WHERE job_key = ? AND range_start = ? AND range_end = ?",
+        (json.dumps(stats.to_state()), key, start, end)
+    )
+    conn.commit()
+    conn.close()
+
+
+def _load_checkpoint(db_path: str, key: str, compiled: CompiledRules) -> Union[dict, None]:
+    """
+    Загружает контрольную точку: диапазоны, кодировку и результаты
+    уже обработанных диапазонов. Если точки нет - возвращает None.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        """SELECT range_start, range_end, encoding, state FROM processing_checkpoints
+           WHERE job_key = ? ORDER BY range_start""",
+        (key,)
+    )
+    data = cursor.fetchall()
+    conn.close()
+    
+    if not data:
+        return None
+    
+    done = {}
+    for index, (start, end, encoding, state) in enumerate(data):
+        if state is not None:
+            done[index] = ProcessingStats.from_state(compiled, json.loads(state))
+    
+    return {
+        'ranges': [(start, end) for start, end, _, _ in data],
+        'encoding': data[0][2],
+        'done': done,
+    }
+
+
+def _delete_checkpoint(db_path: str, key: str):
+    """Удаляет контрольную точку"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM processing_checkpoints WHERE job_key = ?", (key,))
+    conn.commit()
+    conn.close()
+
+
+def list_checkpoints(db_path: str = "database.db") -> List[dict]:
+    """
+    Возвращает список прерванных анализов, которые можно продолжить.
+    Контрольные точки файлов, которые удалены или изменились (размер или
+    время изменения) после начала анализа, продолжить нельзя - они удаляются.
+    
+    Returns:
+        List[dict]: file_path, layout_name, text_type, done_bytes, total_bytes
+    """
+    _init_checkpoint_table(db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT job_key, file_path, file_size, file_mtime_ns, name_lk, text_type,
+               SUM(CASE WHEN state IS NULL THEN 0 ELSE range_end - range_start END),
+               SUM(range_end - range_start)
+        FROM processing_checkpoints
+        GROUP BY job_key
+        ORDER BY MIN(id)
+    """)
+    data = cursor.fetchall()
+    
+    checkpoints = []
+    for key, file_path, file_size, file_mtime_ns, layout_name, text_type, done_bytes, total_bytes in data:
+        try:
+            info = os.stat(file_path)
+            stale = file_size is not None and (info.st_size, info.st_mtime_ns) != (file_size, file_mtime_ns)
+        except OSError:
+            stale = True
+        
+        if stale:
+            cursor.execute("DELETE FROM processing_checkpoints WHERE job_key = ?", (key,))
+            continue
+        
+        checkpoints.append({
+            'file_path': file_path,
+            'layout_name': layout_name,
+            'text_type': text_type,
+            'done_bytes': done_bytes,
+            'total_bytes': total_bytes,
+        })
+    
+    conn.commit()
+    conn.close()
+    
+    return checkpoints
+
+
 # Функция validate_rules остается без изменений
 def validate_rules(rules: Dict[str, Union[int, float, List]]) -> bool:
     """
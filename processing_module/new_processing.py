@@ -1,16 +1,299 @@
-from typing import Dict, List, Tuple, Set, Any, Generator, Optional, Union
+from typing import Dict, List, Tuple, Set, Any, Generator, Iterable, Optional, Union
+import gzip
+import heapq
 import json
-from collections import defaultdict, Counter
+from array import array
+from collections import defaultdict, deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import math
+import multiprocessing
 import os
+from queue import Empty, Full
+import random
+import re
+import traceback
 from tqdm import tqdm
 
+from scan_module.read_files import parse_weighted_line
+from processing_module.calculate_data import ConvergenceMonitor, CONVERGENCE_MIN_BATCHES
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для движка 'numpy' и бутстрэп-интервалов
+    np = None
+
+# Движки классификации окон:
+# 'python' - слово за словом, итоги повторяющихся слов берутся из кэша
+# 'numpy'  - батч слов кодируется в один массив, окна всех длин
+#            классифицируются векторно, без вызовов на каждое окно
+COMFORT_ENGINES = ('python', 'numpy')
+
+# Сколько различных слов движок 'numpy' классифицирует за один раз
+ARRAY_BATCH_WORDS = 50000
+
+# Сколько последних различных слов помнит кэш анализа слов LayoutAnalyzer
+WORD_CACHE_SIZE = 50000
+
+# Сколько примеров последовательностей каждого типа удобства попадает в отчет
+EXAMPLES_PER_TYPE = 10
+
+# Длины последовательностей, по которым оценивается удобство (по умолчанию)
+NGRAM_LENGTHS = (2, 3, 4, 5)
+
+# Страты выборки по длине слова: слова длиннее попадают в одну страту
+STRATUM_MAX_LENGTH = 12
+
+# Число бутстрэп-выборок для доверительных интервалов по умолчанию
+BOOTSTRAP_RESAMPLES = 200
+
+# Сколько различных слов (или слов потока) уходит в одну задачу
+# параллельного анализа одной раскладки
+PARALLEL_BATCH_WORDS = 20000
+
+# Сколько батчей (чанков) корпуса может ждать в очереди каждого процесса
+# потокового сравнения раскладок: память не зависит от размера корпуса
+SHARED_STREAM_QUEUE = 8
+
+# Пробельные символы сплошного текста: любой их ряд - одно нажатие пробела
+WHITESPACE_RUN = re.compile(r'\s+')
+
+# Порядковый номер пальца для определения направления движения
+# Мизинец = 1, Безымянный = 2, Средний = 3, Указательный = 4
+FINGER_ORDER = {
+    "L1": 1,  # Мизинец левый
+    "L2": 2,  # Безымянный левый
+    "L3": 3,  # Средний левый
+    "L4": 4,  # Указательный левый
+    "R1": 4,  # Указательный правый
+    "R2": 3,  # Средний правый
+    "R3": 2,  # Безымянный правый
+    "R4": 1,  # Мизинец правый
+}
+
+def normalize_lengths(lengths) -> Tuple[int, ...]:
+    """Длины последовательностей по возрастанию без повторов; длины меньше 2 недопустимы"""
+    lengths = tuple(sorted(set(int(length) for length in lengths)))
+    if not lengths or lengths[0] < 2:
+        raise ValueError(f"Длины последовательностей должны быть не меньше 2: {lengths}")
+    return lengths
+
+def length_label(length: int) -> str:
+    """Подпись длины для отчетов и графиков: '2 символа', '5 символов', '21 символ'"""
+    if length % 10 == 1 and length % 100 != 11:
+        return f"{length} символ"
+    if length % 10 in (2, 3, 4) and length % 100 not in (12, 13, 14):
+        return f"{length} символа"
+    return f"{length} символов"
+
+class EncodedLayout:
+    """
+    Компактное представление раскладки: символы пронумерованы, а признаки
+    клавиш хранятся в параллельных массивах array с индексом символа.
+    Руки и пальцы закодированы номерами в hand_names / finger_names
+    (код 0 - рука или палец не указаны). Объект легко передается в
+    процессы-воркеры.
+    """
+    
+    def __init__(self, entries: List[Tuple[str, str, str, int, int, List[Any]]]):
+        """
+        Args:
+            entries: Клавиши раскладки (символ, рука, палец, ряд, колонка, модификаторы)
+        """
+        self.chars = []
+        self.index = {}
+        self.hand_names = ['']
+        self.finger_names = ['']
+        self.hand = array('b')
+        self.finger = array('b')
+        self.finger_order = array('b')
+        self.row = array('i')
+        self.column = array('i')
+        self.shift_count = array('b')     # Сколько раз в модификаторах указан shift
+        self.alt_count = array('b')       # Сколько раз в модификаторах указан alt
+        self.modifier_count = array('b')  # Длина списка модификаторов
+        self.hand_mask = array('i')       # Руки всех нажатий символа (битовая маска кодов рук)
+        
+        for char, hand, finger, row, column, modifiers in entries:
+            self.index[char] = len(self.chars)
+            self.chars.append(char)
+            self.hand.append(self._code(self.hand_names, hand))
+            self.finger.append(self._code(self.finger_names, finger))
+            self.finger_order.append(FINGER_ORDER.get(finger, 0))
+            self.row.append(int(row))
+            self.column.append(int(column))
+            self.shift_count.append(sum(1 for mod in modifiers if isinstance(mod, str) and mod == "shift"))
+            self.alt_count.append(sum(1 for mod in modifiers if isinstance(mod, str) and mod == "alt"))
+            self.modifier_count.append(len(modifiers))
+        
+        # Shift нажимается той же рукой, что и символ, Alt - всегда правой
+        right = self._code(self.hand_names, 'right') if any(self.alt_count) else 0
+        for index in range(len(self.chars)):
+            mask = self.hand_bit(self.hand[index])
+            if self.alt_count[index]:
+                mask |= self.hand_bit(right)
+            self.hand_mask.append(mask)
+    
+    @staticmethod
+    def _code(names: List[str], name: str) -> int:
+        """Номер имени в таблице имен (новое имя добавляется в конец)"""
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+    
+    @staticmethod
+    def hand_bit(hand_code: int) -> int:
+        """Бит руки в маске hand_mask (рука не указана - 0)"""
+        return 1 << (hand_code - 1) if hand_code else 0
+    
+    def __len__(self) -> int:
+        return len(self.chars)
+    
+    def uniform_hand(self, index: int) -> bool:
+        """Все нажатия символа (с модификаторами) указаны одной и той же рукой"""
+        return self.alt_count[index] == 0 or self.hand_names[self.hand[index]] == 'right'
+    
+    def has_modifiers(self, index: int) -> bool:
+        """Символ набирается с Shift или Alt"""
+        return self.shift_count[index] + self.alt_count[index] > 0
+    
+    def encode(self, text: str) -> List[int]:
+        """Индексы символов текста, которые есть в раскладке"""
+        index = self.index
+        return [index[char] for char in text if char in index]
+
+class ExampleReservoir:
+    """
+    Примеры последовательностей для отчета: первые size различных
+    последовательностей каждого типа удобства. Уникальность проверяется
+    по множеству, а словарь результата строится только для принятых примеров.
+    """
+    
+    COMFORT_TYPES = ('comfortable', 'partial', 'uncomfortable')
+    
+    def __init__(self, size: int = EXAMPLES_PER_TYPE):
+        self.size = size
+        self.examples = {comfort_type: [] for comfort_type in self.COMFORT_TYPES}
+        self.seen = {comfort_type: set() for comfort_type in self.COMFORT_TYPES}
+    
+    def is_full(self, comfort_type: Optional[str] = None) -> bool:
+        """Заполнены ли примеры типа comfort_type (без аргумента - всех типов)"""
+        if comfort_type is None:
+            return all(self.is_full(name) for name in self.COMFORT_TYPES)
+        return len(self.examples[comfort_type]) >= self.size
+    
+    def offer(self, comfort_type: str, sequence: str, make_example) -> bool:
+        """
+        Добавляет последовательность, если для ее типа еще есть место и она
+        не встречалась. make_example() строит словарь примера.
+        """
+        if self.is_full(comfort_type) or sequence in self.seen[comfort_type]:
+            return False
+        self.seen[comfort_type].add(sequence)
+        self.examples[comfort_type].append(make_example())
+        return True
+    
+    def merge(self, other: 'ExampleReservoir'):
+        """
+        Добавляет примеры другого резервуара, как если бы его последовательности
+        предлагались после своих: слияние по порядку батчей дает те же примеры,
+        что и последовательный проход
+        """
+        for comfort_type, examples in other.examples.items():
+            for example in examples:
+                self.offer(comfort_type, example['sequence'], lambda: example)
+
+class SpaceSavingCounter:
+    """
+    Приближенные частоты самых частых ключей (алгоритм Space-Saving) в
+    памяти на capacity ключей. Когда место заканчивается, новый ключ
+    вытесняет ключ с минимальным счетчиком и наследует его значение как
+    ошибку: для каждого ключа истинная частота лежит в
+    [count - error, count], а любой ключ с частотой больше total / capacity
+    гарантированно отслеживается.
+    
+    Поддерживает update и items, как Counter; при числе различных
+    ключей не больше capacity результаты точные.
+    """
+    
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"Емкость должна быть положительной: {capacity}")
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self.evictions = 0
+        self._heap = []  # (счетчик, ключ); устаревшие записи пропускаются при вытеснении
+    
+    def _add(self, key: str, count: int):
+        counts = self.counts
+        self.total += count
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            # Вытесняем ключ с минимальным счетчиком
+            heap = self._heap
+            while True:
+                minimum, evicted = heapq.heappop(heap)
+                if counts.get(evicted) == minimum:
+                    break
+            del counts[evicted]
+            del self.errors[evicted]
+            self.evictions += 1
+            counts[key] = minimum + count
+            self.errors[key] = minimum
+        heapq.heappush(self._heap, (counts[key], key))
+        
+        # Не даем куче разрастись из-за устаревших записей
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(value, name) for name, value in counts.items()]
+            heapq.heapify(self._heap)
+    
+    def update(self, frequencies: Dict[str, int]):
+        for key, count in frequencies.items():
+            self._add(key, count)
+    
+    def items(self):
+        return self.counts.items()
+    
+    def max_error(self) -> int:
+        """Наибольшая возможная переоценка частоты любого ключа (0, пока не было вытеснений)"""
+        return min(self.counts.values()) if self.evictions else 0
+
 class LayoutAnalyzer:
-    def __init__(self, layout_config: Dict[str, Any], layout_name: str = ""):
+    def __init__(self, layout_config: Dict[str, Any], layout_name: str = "",
+                 word_cache_size: int = WORD_CACHE_SIZE,
+                 lengths: Tuple[int, ...] = NGRAM_LENGTHS,
+                 heavy_hitters: Optional[int] = None,
+                 engine: str = 'python'):
         """
         Инициализация анализатора раскладки с учетом модификаторов
+        
+        word_cache_size - размер LRU-кэша итогов анализа слов (word_aggregate)
+        по словам (0 - без кэша). Кэш свой у каждой раскладки.
+        lengths - длины анализируемых последовательностей, например range(2, 9);
+        окна всех длин классифицируются за один проход по слову (_window_classes).
+        heavy_hitters - если задано, частоты последовательностей каждого типа
+        удобства считаются приближенно (SpaceSavingCounter) в памяти на
+        heavy_hitters ключей вместо точного Counter по всем последовательностям;
+        оценки ошибки попадают в отчет рядом с top_*_sequences.
+        engine - движок классификации окон в анализе списков слов (см.
+        COMFORT_ENGINES и _add_word_counts_array); результаты движков совпадают.
         """
+        if engine not in COMFORT_ENGINES:
+            raise ValueError(f"Неизвестный движок '{engine}'. Доступные: {', '.join(COMFORT_ENGINES)}")
+        if engine == 'numpy' and np is None:
+            raise ImportError("Для движка 'numpy' требуется модуль numpy")
+        
         self.layout_name = layout_name
+        self.engine = engine
+        self._array_tables = None
+        self.lengths = normalize_lengths(lengths)
+        self.heavy_hitters = heavy_hitters
         self.layout_data = layout_config.get("layout", {})
         self.hand_map = {}
         self.finger_map = {}
@@ -19,7 +302,32 @@ class LayoutAnalyzer:
         self.row_map = {}
         self.modifiers_map = {}  # Модификаторы для каждого символа
         
+        self.word_cache_size = word_cache_size
+        
         self._parse_layout()
+        self.encoded = EncodedLayout(
+            (letter, hand, finger, row, column, self.modifiers_map[letter])
+            for letter, (hand, finger, row, column) in self.position_map.items()
+        )
+        self._build_comfort_tables()
+        self._init_word_cache()
+    
+    def _init_word_cache(self):
+        """
+        Повторяющиеся слова не анализируются заново; при переполнении
+        вытесняются давно не встречавшиеся слова
+        """
+        self.word_aggregate_cached = lru_cache(maxsize=self.word_cache_size)(self.word_aggregate)
+    
+    def __getstate__(self):
+        # Кэш слов не передается в процессы-воркеры, там он создается заново
+        state = self.__dict__.copy()
+        del state['word_aggregate_cached']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_word_cache()
     
     def _parse_layout(self):
         """Парсит конфигурацию раскладки и создает маппинги"""
@@ -52,22 +360,273 @@ class LayoutAnalyzer:
             self.row_map[letter] = row
             self.modifiers_map[letter] = modifiers
     
+    # Коды направления движения между соседними клавишами
+    DIRECTION_UNKNOWN = 0
+    DIRECTION_OUTSIDE_TO_INSIDE = 1
+    DIRECTION_INSIDE_TO_OUTSIDE = 2
+    DIRECTION_SAME_ORDER = 3
+    
+    def _build_comfort_tables(self):
+        """
+        Предвычисляет таблицы для быстрой классификации последовательностей
+        по закодированной раскладке (EncodedLayout): для каждой клавиши -
+        маску рук, палец и наличие модификаторов; для каждой пары клавиш -
+        направление движения и готовый результат для последовательности из
+        двух символов.
+        """
+        encoded = self.encoded
+        size = len(encoded)
+        self.char_index = encoded.index
+        self.key_hand_mask = encoded.hand_mask
+        self.key_finger = encoded.finger
+        self.key_uniform_hand = [encoded.uniform_hand(index) for index in range(size)]
+        self.key_has_modifiers = [encoded.has_modifiers(index) for index in range(size)]
+        
+        order = encoded.finger_order
+        self.pair_direction = [[self.DIRECTION_UNKNOWN] * size for _ in range(size)]
+        for i in range(size):
+            for j in range(size):
+                if order[i] == 0 or order[j] == 0:
+                    continue
+                if order[i] < order[j]:
+                    self.pair_direction[i][j] = self.DIRECTION_OUTSIDE_TO_INSIDE
+                elif order[i] > order[j]:
+                    self.pair_direction[i][j] = self.DIRECTION_INSIDE_TO_OUTSIDE
+                else:
+                    self.pair_direction[i][j] = self.DIRECTION_SAME_ORDER
+        
+        # Символы раскладки в сплошном тексте (класс символов регулярного выражения)
+        self.key_class = '[' + ''.join(re.escape(char) for char in encoded.chars if len(char) == 1) + ']'
+        
+        chars = encoded.chars
+        self.pair_result = [
+            [self._classify_codes((i, j), chars[i] + chars[j]) for j in range(size)]
+            for i in range(size)
+        ]
+    
+    def _classify_codes(self, codes: Tuple[int, ...], sequence: str) -> Dict[str, Any]:
+        """
+        Классифицирует последовательность клавиш раскладки по предвычисленным
+        таблицам. Результат совпадает с analyze_sequence_comfort_with_modifiers.
+        """
+        length = len(codes)
+        first = codes[0]
+        
+        if all(code == first for code in codes) and self.key_uniform_hand[first]:
+            return {
+                'comfort': 'comfortable',
+                'reason': 'same_characters',
+                'hand_type': 'single_hand',
+                'sequence': sequence,
+                'length': length,
+                'has_modifiers': self.key_has_modifiers[first]
+            }
+        
+        mask = 0
+        has_modifiers = False
+        for code in codes:
+            mask |= self.key_hand_mask[code]
+            has_modifiers = has_modifiers or self.key_has_modifiers[code]
+        
+        if not mask:
+            return {'comfort': 'unknown', 'reason': 'no_hand_info'}
+        
+        if mask & (mask - 1):
+            # Разные руки в последовательности (включая модификаторы)
+            return {
+                'comfort': 'uncomfortable',
+                'reason': 'hand_change_with_modifiers',
+                'hand_type': 'both',
+                'sequence': sequence,
+                'length': length,
+                'has_modifiers': has_modifiers
+            }
+        
+        hand_type = self.encoded.hand_names[mask.bit_length()]
+        key_finger = self.key_finger
+        
+        if length == 2:
+            second = codes[1]
+            if key_finger[first] == key_finger[second]:
+                comfort, reason = 'comfortable', 'same_finger'
+            else:
+                direction = self.pair_direction[first][second]
+                if direction == self.DIRECTION_UNKNOWN:
+                    return {'comfort': 'unknown', 'reason': 'unknown_finger'}
+                if direction == self.DIRECTION_OUTSIDE_TO_INSIDE:
+                    comfort, reason = 'comfortable', 'outside_to_inside'
+                else:
+                    comfort, reason = 'partial', 'inside_to_outside'
+        else:
+            if all(key_finger[code] == key_finger[first] for code in codes):
+                comfort, reason = 'uncomfortable', 'same_finger_multiple'
+            else:
+                pair_direction = self.pair_direction
+                directions = [pair_direction[codes[i]][codes[i + 1]] for i in range(length - 1)]
+                if self.DIRECTION_UNKNOWN in directions:
+                    return {'comfort': 'unknown', 'reason': 'unknown_direction'}
+                
+                direction_changes = sum(1 for i in range(length - 2) if directions[i] != directions[i + 1])
+                if direction_changes > 0:
+                    return {
+                        'comfort': 'uncomfortable',
+                        'reason': 'direction_changes',
+                        'hand_type': hand_type,
+                        'sequence': sequence,
+                        'length': length,
+                        'direction_changes': direction_changes,
+                        'has_modifiers': has_modifiers
+                    }
+                if directions[0] == self.DIRECTION_OUTSIDE_TO_INSIDE:
+                    comfort, reason = 'comfortable', 'all_outside_to_inside'
+                elif directions[0] == self.DIRECTION_INSIDE_TO_OUTSIDE:
+                    comfort, reason = 'partial', 'all_inside_to_outside'
+                else:
+                    comfort, reason = 'uncomfortable', 'all_same_finger'
+        
+        return {
+            'comfort': comfort,
+            'reason': reason,
+            'hand_type': hand_type,
+            'sequence': sequence,
+            'length': length,
+            'has_modifiers': has_modifiers
+        }
+    
+    def _window_classes(self, codes: List[int], text: str, lengths: List[int], first_end: int = 0):
+        """
+        Классифицирует все окна текста длины из lengths (по возрастанию длины,
+        внутри длины - слева направо) без создания словарей результатов.
+        Окна, которые заканчиваются левее позиции first_end, пропускаются.
+        Для каждого окна возвращает кортеж (длина, последовательность, удобство,
+        причина, рука, есть ли модификаторы, число смен направления);
+        классы совпадают с _classify_codes.
+        
+        Признаки переходов между соседними клавишами (совпадение клавиши и
+        пальца, направление, смена направления) и рук вычисляются за один
+        проход и накапливаются в префиксных суммах, поэтому каждое окно
+        классифицируется за O(1), а не повторным разбором всех его символов.
+        """
+        count = len(codes)
+        if count < 2:
+            return
+        
+        key_hand_mask = self.key_hand_mask
+        key_finger = self.key_finger
+        key_has_modifiers = self.key_has_modifiers
+        pair_direction = self.pair_direction
+        pair_result = self.pair_result
+        hand_names = self.encoded.hand_names
+        
+        # Префиксные суммы: число переходов k -> k+1 (k < j) с данным признаком
+        same_code = [0] * count
+        same_finger = [0] * count
+        unknown_direction = [0] * count
+        directions = []
+        for k in range(count - 1):
+            a, b = codes[k], codes[k + 1]
+            direction = pair_direction[a][b]
+            directions.append(direction)
+            same_code[k + 1] = same_code[k] + (a == b)
+            same_finger[k + 1] = same_finger[k] + (key_finger[a] == key_finger[b])
+            unknown_direction[k + 1] = unknown_direction[k] + (direction == self.DIRECTION_UNKNOWN)
+        
+        # direction_changes[k] - число смен направления между переходами до k
+        direction_changes = [0] * count
+        for k in range(count - 2):
+            direction_changes[k + 1] = direction_changes[k] + (directions[k] != directions[k + 1])
+        
+        # Модификаторы: префиксная сумма по клавишам.
+        # Руки: last_hand[j] - последняя клавиша с известной рукой не правее j,
+        # mixed_from[j] - самое правое начало окна, заканчивающегося в j,
+        # в котором встречаются разные руки (-1 - таких окон нет)
+        modifiers = [0] * (count + 1)
+        last_hand = [-1] * count
+        mixed_from = [-1] * count
+        previous_hand, previous_mixed = -1, -1
+        for j, code in enumerate(codes):
+            modifiers[j + 1] = modifiers[j] + key_has_modifiers[code]
+            mask = key_hand_mask[code]
+            if mask:
+                if mask & (mask - 1):
+                    previous_mixed = j
+                elif previous_hand >= 0 and key_hand_mask[codes[previous_hand]] != mask:
+                    previous_mixed = max(previous_mixed, previous_hand)
+                previous_hand = j
+            last_hand[j] = previous_hand
+            mixed_from[j] = previous_mixed
+        
+        for length in lengths:
+            for i in range(max(0, first_end - length + 1), count - length + 1):
+                j = i + length - 1
+                first = codes[i]
+                sequence = text[i:j + 1]
+                
+                if length == 2:
+                    pair = pair_result[first][codes[j]]
+                    yield (length, sequence, pair['comfort'], pair['reason'], pair.get('hand_type'),
+                           pair.get('has_modifiers', False), 0)
+                    continue
+                
+                if same_code[j] - same_code[i] == length - 1 and self.key_uniform_hand[first]:
+                    yield (length, sequence, 'comfortable', 'same_characters', 'single_hand',
+                           key_has_modifiers[first], 0)
+                    continue
+                
+                has_modifiers = modifiers[j + 1] > modifiers[i]
+                if last_hand[j] < i:
+                    yield length, sequence, 'unknown', 'no_hand_info', None, False, 0
+                    continue
+                if mixed_from[j] >= i:
+                    yield length, sequence, 'uncomfortable', 'hand_change_with_modifiers', 'both', has_modifiers, 0
+                    continue
+                
+                hand_type = hand_names[key_hand_mask[codes[last_hand[j]]].bit_length()]
+                if same_finger[j] - same_finger[i] == length - 1:
+                    yield length, sequence, 'uncomfortable', 'same_finger_multiple', hand_type, has_modifiers, 0
+                elif unknown_direction[j] > unknown_direction[i]:
+                    yield length, sequence, 'unknown', 'unknown_direction', None, False, 0
+                else:
+                    changes = direction_changes[j - 1] - direction_changes[i]
+                    if changes > 0:
+                        comfort, reason = 'uncomfortable', 'direction_changes'
+                    elif directions[i] == self.DIRECTION_OUTSIDE_TO_INSIDE:
+                        comfort, reason = 'comfortable', 'all_outside_to_inside'
+                    elif directions[i] == self.DIRECTION_INSIDE_TO_OUTSIDE:
+                        comfort, reason = 'partial', 'all_inside_to_outside'
+                    else:
+                        comfort, reason = 'uncomfortable', 'all_same_finger'
+                    yield length, sequence, comfort, reason, hand_type, has_modifiers, changes
+    
+    def _classify_windows(self, codes: List[int], text: str, lengths: List[int]):
+        """
+        То же, что _window_classes, но каждое окно описывается полным
+        словарем результата, как у analyze_sequence_comfort_with_modifiers
+        """
+        for length, sequence, comfort, reason, hand_type, has_modifiers, changes in \
+                self._window_classes(codes, text, lengths):
+            if comfort == 'unknown':
+                yield length, {'comfort': comfort, 'reason': reason}
+                continue
+            
+            analysis = {
+                'comfort': comfort,
+                'reason': reason,
+                'hand_type': hand_type,
+                'sequence': sequence,
+                'length': length
+            }
+            if reason == 'direction_changes':
+                analysis['direction_changes'] = changes
+            analysis['has_modifiers'] = has_modifiers
+            yield length, analysis
+    
     def get_finger_order(self, finger: str) -> int:
         """
         Возвращает порядковый номер пальца для определения направления
         Мизинец = 1, Безымянный = 2, Средний = 3, Указательный = 4
         """
-        finger_mapping = {
-            "L1": 1,  # Мизинец левый
-            "L2": 2,  # Безымянный левый
-            "L3": 3,  # Средний левый
-            "L4": 4,  # Указательный левый
-            "R1": 4,  # Указательный правый
-            "R2": 3,  # Средний правый
-            "R3": 2,  # Безымянный правый
-            "R4": 1,  # Мизинец правый
-        }
-        return finger_mapping.get(finger, 0)
+        return FINGER_ORDER.get(finger, 0)
     
     def analyze_character_with_modifiers(self, char: str) -> List[Dict[str, Any]]:
         """
@@ -128,6 +687,13 @@ class LayoutAnalyzer:
         if len(sequence) < 2:
             return {'comfort': 'unknown', 'reason': 'too_short'}
         
+        # Все символы есть в раскладке - классифицируем по предвычисленным таблицам
+        char_index = self.char_index
+        if all(char in char_index for char in sequence):
+            if len(sequence) == 2:
+                return dict(self.pair_result[char_index[sequence[0]]][char_index[sequence[1]]])
+            return self._classify_codes(tuple(char_index[char] for char in sequence), sequence)
+        
         # Для последовательности из одинаковых символов (без учета модификаторов)
         if len(set(sequence)) == 1:
             # Проверяем, есть ли модификаторы
@@ -337,15 +903,16 @@ class LayoutAnalyzer:
             'alt_percent': 0
         }
         
-        for letter, modifiers in self.modifiers_map.items():
+        encoded = self.encoded
+        for index in range(len(encoded)):
             modifier_stats['total_symbols'] += 1
             
-            if not modifiers:
+            if not encoded.modifier_count[index]:
                 modifier_stats['no_modifiers'] += 1
             else:
                 # Проверяем наличие модификаторов
-                has_shift = any(isinstance(mod, str) and mod == "shift" for mod in modifiers)
-                has_alt = any(isinstance(mod, str) and mod == "alt" for mod in modifiers)
+                has_shift = encoded.shift_count[index] > 0
+                has_alt = encoded.alt_count[index] > 0
                 
                 if has_shift and has_alt:
                     modifier_stats['with_both'] += 1
@@ -360,55 +927,64 @@ class LayoutAnalyzer:
         
         return modifier_stats
     
-    def analyze_word_sequences(self, word: str) -> Dict[str, Any]:
+    def _word_codes(self, word: str) -> Optional[Tuple[List[int], str]]:
         """
-        Анализ всех последовательностей в слове (от 2 до 5 символов)
+        Коды и строка символов слова, которые есть в раскладке.
+        None - слово не анализируется (меньше двух таких символов).
         """
-        word = word.strip()
-        
-        # Пропускаем односимвольные слова
         if len(word) < 2:
             return None
         
-        # Проверяем, что слово содержит допустимые символы
-        # Добавляем проверку наличия символов в раскладке
-        valid_chars = []
-        for char in word:
-            if char in self.position_map:
-                valid_chars.append(char)
-        
+        char_index = self.char_index
+        valid_chars = ''.join(char for char in word if char in char_index)
         if len(valid_chars) < 2:
             return None
+        return [char_index[char] for char in valid_chars], valid_chars
+    
+    def analyze_word_sequences(self, word: str, details: bool = False) -> Dict[str, Any]:
+        """
+        Анализ всех последовательностей в слове (длин из self.lengths)
+        
+        По умолчанию возвращаются только счетчики; словари результатов
+        для каждой последовательности (списки 'details') строятся
+        только при details=True.
+        """
+        word = word.strip()
+        
+        # Пропускаем односимвольные слова и слова, символов которых нет в раскладке
+        encoded_word = self._word_codes(word)
+        if encoded_word is None:
+            return None
+        codes, valid_chars = encoded_word
         
         result = {
             'word': word,
             'word_length': len(word),
             'valid_chars': len(valid_chars),
             'sequences_by_length': {
-                2: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0, 'details': []},
-                3: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0, 'details': []},
-                4: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0, 'details': []},
-                5: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0, 'details': []}
+                seq_len: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0}
+                for seq_len in self.lengths
             },
             'total_sequences': 0,
             'sequences_with_modifiers': 0
         }
         
-        # Анализируем последовательности всех длин
-        for seq_len in [2, 3, 4, 5]:
-            if len(valid_chars) >= seq_len:
-                for i in range(len(valid_chars) - seq_len + 1):
-                    sequence = ''.join(valid_chars[i:i + seq_len])
-                    analysis = self.analyze_sequence_comfort_with_modifiers(sequence)
-                    
-                    if analysis['comfort'] != 'unknown':
-                        result['sequences_by_length'][seq_len]['total'] += 1
-                        result['sequences_by_length'][seq_len][analysis['comfort']] += 1
-                        result['sequences_by_length'][seq_len]['details'].append(analysis)
-                        result['total_sequences'] += 1
-                        
-                        if analysis.get('has_modifiers', False):
-                            result['sequences_with_modifiers'] += 1
+        if details:
+            for length_stats in result['sequences_by_length'].values():
+                length_stats['details'] = []
+            for seq_len, analysis in self._classify_windows(codes, valid_chars, self.lengths):
+                if analysis['comfort'] != 'unknown':
+                    result['sequences_by_length'][seq_len]['details'].append(analysis)
+        
+        # Анализируем последовательности всех длин за один проход по слову
+        for seq_len, _, comfort, _, _, has_modifiers, _ in self._window_classes(codes, valid_chars, self.lengths):
+            if comfort != 'unknown':
+                result['sequences_by_length'][seq_len]['total'] += 1
+                result['sequences_by_length'][seq_len][comfort] += 1
+                result['total_sequences'] += 1
+                
+                if has_modifiers:
+                    result['sequences_with_modifiers'] += 1
         
         return result
     
@@ -499,69 +1075,35 @@ class LayoutAnalyzer:
             'modifier_stats': self.calculate_modifier_statistics()
         }
     
-    def calculate_comprehensive_analysis(self, wordlist: List[str]) -> Dict[str, Any]:
+    def _empty_comprehensive_stats(self, total_words: int, finger_analysis: bool = True) -> Dict[str, Any]:
         """
-        Комплексный анализ для всего списка слов
+        Пустая структура результатов комплексного анализа
+        (без finger_analysis - для частичной статистики батча)
         """
         total_stats = {
             'layout_name': self.layout_name,
             'by_length': {
-                2: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0},
-                3: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0},
-                4: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0},
-                5: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0}
+                seq_len: {'total': 0, 'comfortable': 0, 'partial': 0, 'uncomfortable': 0}
+                for seq_len in self.lengths
             },
             'total_sequences': 0,
-            'total_words': len(wordlist),
+            'total_words': total_words,
             'words_analyzed': 0,
             'sequences_with_modifiers': 0,
             'sequence_frequencies': {
-                'comfortable': Counter(),
-                'partial': Counter(),
-                'uncomfortable': Counter()
-            },
-            'comfort_examples': {
-                'comfortable': [],
-                'partial': [],
-                'uncomfortable': []
+                comfort_type: Counter() if self.heavy_hitters is None else SpaceSavingCounter(self.heavy_hitters)
+                for comfort_type in ['comfortable', 'partial', 'uncomfortable']
             },
-            'finger_analysis': self.calculate_finger_load_and_distance()
+            'comfort_examples': ExampleReservoir()
         }
-        
-        for word in tqdm(wordlist, desc=f"Анализ раскладки {self.layout_name}"):
-            analysis = self.analyze_word_sequences(word)
-            
-            if analysis is None:
-                continue
-            
-            total_stats['words_analyzed'] += 1
-            
-            # Агрегируем статистику по длинам
-            for seq_len in [2, 3, 4, 5]:
-                length_data = analysis['sequences_by_length'][seq_len]
-                for comfort_type in ['comfortable', 'partial', 'uncomfortable']:
-                    total_stats['by_length'][seq_len][comfort_type] += length_data[comfort_type]
-                    total_stats['by_length'][seq_len]['total'] += length_data[comfort_type]
-            
-            total_stats['total_sequences'] += analysis['total_sequences']
-            total_stats['sequences_with_modifiers'] += analysis.get('sequences_with_modifiers', 0)
-            
-            # Собираем примеры и частоты для каждого типа удобства
-            for seq_len in [2, 3, 4, 5]:
-                for seq_analysis in analysis['sequences_by_length'][seq_len]['details']:
-                    comfort_type = seq_analysis['comfort']
-                    seq_str = seq_analysis['sequence']
-                    
-                    # Собираем частоты
-                    total_stats['sequence_frequencies'][comfort_type][seq_str] += 1
-                    
-                    # Собираем уникальные примеры
-                    if seq_str not in [ex['sequence'] for ex in total_stats['comfort_examples'][comfort_type]]:
-                        if len(total_stats['comfort_examples'][comfort_type]) < 10:
-                            total_stats['comfort_examples'][comfort_type].append(seq_analysis)
-        
+        if finger_analysis:
+            total_stats['finger_analysis'] = self.calculate_finger_load_and_distance()
+        return total_stats
+    
+    def _finalize_comprehensive_stats(self, total_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Считает проценты, общую статистику и топ последовательностей"""
         # Рассчитываем проценты
-        for seq_len in [2, 3, 4, 5]:
+        for seq_len in self.lengths:
             total = total_stats['by_length'][seq_len]['total']
             if total > 0:
                 for comfort_type in ['comfortable', 'partial', 'uncomfortable']:
@@ -569,9 +1111,9 @@ class LayoutAnalyzer:
                     total_stats['by_length'][seq_len][f'{comfort_type}_percent'] = (count / total) * 100
         
         # Рассчитываем общую статистику
-        total_comfortable = sum(total_stats['by_length'][l]['comfortable'] for l in [2, 3, 4, 5])
-        total_partial = sum(total_stats['by_length'][l]['partial'] for l in [2, 3, 4, 5])
-        total_uncomfortable = sum(total_stats['by_length'][l]['uncomfortable'] for l in [2, 3, 4, 5])
+        total_comfortable = sum(total_stats['by_length'][l]['comfortable'] for l in self.lengths)
+        total_partial = sum(total_stats['by_length'][l]['partial'] for l in self.lengths)
+        total_uncomfortable = sum(total_stats['by_length'][l]['uncomfortable'] for l in self.lengths)
         
         total_stats['overall'] = {
             'comfortable': total_comfortable,
@@ -591,10 +1133,691 @@ class LayoutAnalyzer:
                       key=lambda x: x[1], reverse=True)[:20]
             )
         
+        # Для приближенных частот - границы ошибки: истинная частота
+        # последовательности лежит в [частота - ошибка, частота]
+        if self.heavy_hitters is not None:
+            total_stats['heavy_hitters'] = {}
+            for comfort_type in ['comfortable', 'partial', 'uncomfortable']:
+                frequencies = total_stats['sequence_frequencies'][comfort_type]
+                total_stats[f'top_{comfort_type}_sequences_error'] = {
+                    seq_str: frequencies.errors[seq_str] for seq_str in total_stats[f'top_{comfort_type}_sequences']
+                }
+                total_stats['heavy_hitters'][comfort_type] = {
+                    'capacity': frequencies.capacity,
+                    'tracked': len(frequencies.counts),
+                    'total': frequencies.total,
+                    'max_error': frequencies.max_error()
+                }
+        
         del total_stats['sequence_frequencies']
+        total_stats['comfort_examples'] = total_stats['comfort_examples'].examples
+        
+        return total_stats
+    
+    def _batch_stats(self, batch: List[Any], raw: bool = False) -> Dict[str, Any]:
+        """
+        Частичная статистика батча для слияния (_merge_batch_stats).
+        batch - пары (слово, частота); raw - батч слов потока как есть,
+        учитываются слова длиной от 2 символов, как в calculate_stream_analysis.
+        """
+        total_stats = self._empty_comprehensive_stats(0, finger_analysis=False)
+        if raw:
+            words = [word for word in (word.strip() for word in batch) if len(word) >= 2]
+            total_stats['total_words'] = len(words)
+            batch = Counter(words).items()
+        
+        self._add_word_counts(total_stats, batch)
+        return total_stats
+    
+    def _merge_batch_stats(self, total_stats: Dict[str, Any], batch_stats: Dict[str, Any]):
+        """
+        Добавляет частичную статистику батча к общей. Частоты и примеры
+        сливаются в порядке вызовов, поэтому слияние батчей по порядку дает
+        тот же результат (включая порядок топа при равных частотах), что и
+        последовательный проход по всем словам.
+        """
+        for seq_len, counts in batch_stats['by_length'].items():
+            length_stats = total_stats['by_length'][seq_len]
+            for key, count in counts.items():
+                length_stats[key] += count
+        
+        for key in ('total_sequences', 'total_words', 'words_analyzed', 'sequences_with_modifiers'):
+            total_stats[key] += batch_stats[key]
+        
+        for comfort_type, frequencies in batch_stats['sequence_frequencies'].items():
+            total_stats['sequence_frequencies'][comfort_type].update(frequencies)
+        
+        total_stats['comfort_examples'].merge(batch_stats['comfort_examples'])
+    
+    def _parallel_batch_stats(self, batches: Iterable[List[Any]], workers: int, raw: bool = False):
+        """
+        Частичные статистики батчей из пула workers процессов - в порядке
+        батчей. Анализатор передается в каждый процесс один раз; в работе
+        одновременно не больше 2 * workers батчей, так что поток батчей
+        не читается в память целиком.
+        """
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_batch_analyzer, initargs=(self,))
+        pending = deque()
+        try:
+            for batch in batches:
+                pending.append(executor.submit(_analyze_word_batch, batch, raw))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _parallel_enabled(self, workers: int) -> bool:
+        """
+        Параллельный режим возможен только при точном подсчете частот:
+        результат SpaceSavingCounter зависит от порядка добавлений
+        """
+        if workers <= 1:
+            return False
+        if self.heavy_hitters is not None:
+            print("⚠️ С heavy_hitters анализ выполняется последовательно: приближенные частоты зависят от порядка")
+            return False
+        return True
+    
+    def calculate_comprehensive_analysis(self, wordlist: List[str], workers: int = 1) -> Dict[str, Any]:
+        """
+        Комплексный анализ для всего списка слов.
+        Повторы слов сначала сворачиваются в частоты (в порядке первого
+        появления), затем каждое уникальное слово учитывается один раз
+        со своей частотой - см. calculate_weighted_analysis.
+        """
+        return self.calculate_weighted_analysis(Counter(wordlist), workers)
+    
+    def calculate_weighted_analysis(self, word_counts: Dict[str, int], workers: int = 1) -> Dict[str, Any]:
+        """
+        Комплексный анализ частотного списка слов {слово: частота}.
+        Каждое уникальное слово анализируется один раз, а его вклад во все
+        статистики умножается на частоту - результат совпадает с анализом
+        списка, в котором слово повторено столько раз, но без его развертывания.
+        
+        workers > 1 - слова делятся на батчи по PARALLEL_BATCH_WORDS, которые
+        анализируются в пуле процессов и сливаются по порядку: результат
+        совпадает с последовательным.
+        """
+        total_stats = self._empty_comprehensive_stats(sum(word_counts.values()))
+        
+        if self._parallel_enabled(workers):
+            items = list(word_counts.items())
+            batches = [items[start:start + PARALLEL_BATCH_WORDS] for start in range(0, len(items), PARALLEL_BATCH_WORDS)]
+            for batch_stats in tqdm(self._parallel_batch_stats(batches, workers), total=len(batches),
+                                    desc=f"Анализ раскладки {self.layout_name}", unit=" батч"):
+                self._merge_batch_stats(total_stats, batch_stats)
+            return self._finalize_comprehensive_stats(total_stats)
+        
+        if self._array_engine_enabled():
+            items = list(word_counts.items())
+            for start in tqdm(range(0, len(items), ARRAY_BATCH_WORDS), desc=f"Анализ раскладки {self.layout_name}",
+                              unit=" батч"):
+                self._add_word_counts_array(total_stats, items[start:start + ARRAY_BATCH_WORDS])
+        else:
+            self._add_word_counts(total_stats, tqdm(word_counts.items(), desc=f"Анализ раскладки {self.layout_name}"))
         
+        return self._finalize_comprehensive_stats(total_stats)
+    
+    def _converged(self, monitor: Optional[ConvergenceMonitor], total_stats: Dict[str, Any]) -> bool:
+        """Передает накопленные итоги батча в monitor; True - можно прекращать чтение"""
+        if monitor is None:
+            return False
+        monitor.observe(total_stats['total_sequences'], {
+            f'{comfort_type}_percent': sum(total_stats['by_length'][seq_len][comfort_type] for seq_len in self.lengths)
+            for comfort_type in ['comfortable', 'partial', 'uncomfortable']
+        })
+        return monitor.converged()
+    
+    def calculate_stream_analysis(self, word_batches: Iterable[List[str]],
+                                  tolerance: Optional[float] = None,
+                                  confidence: float = 0.95,
+                                  workers: int = 1) -> Dict[str, Any]:
+        """
+        Комплексный анализ потока батчей слов (например, read_words_by_lines)
+        целиком, без сбора слов в список. В памяти держатся только текущий
+        батч, накопленная статистика и кэш слов. Учитываются слова длиной
+        от 2 символов; результат совпадает с calculate_comprehensive_analysis
+        по списку всех таких слов.
+        
+        tolerance - ранняя остановка: поток перестает читаться, как только
+        доверительные интервалы общих процентов удобства уже tolerance
+        процентных пунктов (см. ConvergenceMonitor); итог - в 'early_stop'.
+        
+        workers > 1 - батчи потока анализируются в пуле процессов и сливаются
+        по порядку; результат (и точка ранней остановки) совпадает с
+        последовательным.
+        """
+        total_stats = self._empty_comprehensive_stats(0)
+        monitor = ConvergenceMonitor(tolerance, confidence, scale=100) if tolerance is not None else None
+        
+        if self._parallel_enabled(workers):
+            batch_stats_stream = self._parallel_batch_stats(word_batches, workers, raw=True)
+            try:
+                for batch_stats in batch_stats_stream:
+                    self._merge_batch_stats(total_stats, batch_stats)
+                    if self._converged(monitor, total_stats):
+                        break
+            finally:
+                batch_stats_stream.close()
+        else:
+            for batch in word_batches:
+                words = [word for word in (word.strip() for word in batch) if len(word) >= 2]
+                total_stats['total_words'] += len(words)
+                self._add_word_counts(total_stats, Counter(words).items())
+                
+                if self._converged(monitor, total_stats):
+                    break
+        
+        total_stats = self._finalize_comprehensive_stats(total_stats)
+        if monitor is not None:
+            total_stats['early_stop'] = monitor.summary()
         return total_stats
     
+    def calculate_text_analysis(self, chunks: Iterable[str],
+                                tolerance: Optional[float] = None,
+                                confidence: float = 0.95) -> Dict[str, Any]:
+        """
+        Комплексный анализ сплошного текста (например, книги), читаемого
+        чанками (read_text_by_chunks), за один проход.
+        
+        В отличие от анализа списка слов, окна проходят через границы слов:
+        пробел и знаки препинания считаются обычными нажатиями, если они есть
+        в раскладке (любой ряд пробельных символов - одно нажатие пробела).
+        Символ, которого нет в раскладке, разрывает окна. Хвост предыдущего
+        чанка (не длиннее самого длинного окна) переносится в следующий,
+        поэтому окна на границах чанков не теряются и не считаются дважды:
+        счетчики и частоты не зависят от размера чанков (примеры - первые
+        встреченные в порядке обработки). Повторяющиеся ряды символов
+        раскладки без пробела (обычно слова) анализируются один раз через кэш слов.
+        
+        Дополнительно считается чередование рук между соседними символами
+        внутри слов и через пробел (последняя буква слова - первая буква
+        следующего) - отдельно от того, есть ли пробел в раскладке.
+        
+        tolerance - ранняя остановка по сходимости процентов удобства,
+        как в calculate_stream_analysis (наблюдение - чанк).
+        """
+        total_stats = self._empty_comprehensive_stats(0)
+        monitor = ConvergenceMonitor(tolerance, confidence, scale=100) if tolerance is not None else None
+        alternation = {
+            'within_words': {'total': 0, 'alternations': 0},
+            'across_spaces': {'total': 0, 'alternations': 0}
+        }
+        
+        char_index = self.char_index
+        key_hand = self.encoded.hand
+        keep = self.lengths[-1] - 1
+        # Ряды символов раскладки и хвост ряда, который переносится в следующий чанк
+        key_run = re.compile(self.key_class + '+') if char_index else None
+        key_tail = re.compile(self.key_class + '{1,%d}\\Z' % keep) if char_index else None
+        carry = ''          # Хвост ряда символов раскладки в конце предыдущего чанка
+        previous_char = ' '
+        previous_hand = 0
+        after_space = False
+        
+        for chunk in chunks:
+            text = WHITESPACE_RUN.sub(' ', chunk)
+            if previous_char == ' ' and text.startswith(' '):
+                text = text[1:]
+            if not text:
+                continue
+            
+            # Слово, разрезанное границей чанка, считается один раз
+            words = len(text.split())
+            if previous_char != ' ' and text[0] != ' ':
+                words -= 1
+            total_stats['total_words'] += words
+            total_stats['words_analyzed'] += words
+            previous_char = text[-1]
+            
+            # Чередование рук
+            for char in text:
+                if char == ' ':
+                    after_space = True
+                    continue
+                code = char_index.get(char)
+                hand = key_hand[code] if code is not None else 0
+                if hand and previous_hand:
+                    bucket = alternation['across_spaces' if after_space else 'within_words']
+                    bucket['total'] += 1
+                    bucket['alternations'] += hand != previous_hand
+                previous_hand = hand
+                after_space = False
+            
+            # Окна всех длин по рядам символов раскладки
+            if key_run is None:
+                continue
+            segment = carry + text
+            offset = len(carry)
+            aggregate = self._empty_aggregate()
+            run_counts = Counter()
+            for run in key_run.finditer(segment):
+                start, end = run.span()
+                if end <= offset:
+                    continue
+                run_text = run.group()
+                if start >= offset and ' ' not in run_text:
+                    # Ряд целиком в новом чанке: повторяющиеся ряды (обычно
+                    # слова) считаются один раз через кэш итогов слов.
+                    # Если пробел - клавиша раскладки, ряд с пробелами - целая
+                    # фраза, которая не повторяется, и кэш ею не засоряется
+                    run_counts[run_text] += 1
+                else:
+                    self._add_windows(aggregate, [char_index[char] for char in run_text], run_text,
+                                      max(0, offset - start))
+            self._add_sequence_counts(total_stats, aggregate)
+            for run_text, count in run_counts.items():
+                run_aggregate = self.word_aggregate_cached(run_text)
+                if run_aggregate is not None:
+                    self._add_sequence_counts(total_stats, run_aggregate, count)
+            
+            tail = key_tail.search(segment, max(0, len(segment) - keep))
+            carry = tail.group() if tail else ''
+            
+            if self._converged(monitor, total_stats):
+                break
+        
+        for bucket in alternation.values():
+            bucket['percent'] = (bucket['alternations'] / bucket['total'] * 100) if bucket['total'] > 0 else 0
+        
+        total_stats = self._finalize_comprehensive_stats(total_stats)
+        total_stats['hand_alternation'] = alternation
+        if monitor is not None:
+            total_stats['early_stop'] = monitor.summary()
+        return total_stats
+    
+    def _empty_aggregate(self) -> Dict[str, Any]:
+        """Пустые итоги в формате word_aggregate"""
+        return {
+            'by_length': {seq_len: [0, 0, 0] for seq_len in self.lengths},
+            'total_sequences': 0,
+            'sequences_with_modifiers': 0,
+            'frequencies': {'comfortable': Counter(), 'partial': Counter(), 'uncomfortable': Counter()}
+        }
+    
+    def _add_windows(self, aggregate: Dict[str, Any], codes: List[int], text: str, first_end: int = 0):
+        """Добавляет к итогам aggregate все окна ряда клавиш (см. _window_classes)"""
+        by_length = aggregate['by_length']
+        frequencies = aggregate['frequencies']
+        comfort_slot = {'comfortable': 0, 'partial': 1, 'uncomfortable': 2}
+        for seq_len, sequence, comfort, _, _, has_modifiers, _ in self._window_classes(codes, text, self.lengths,
+                                                                                      first_end):
+            if comfort == 'unknown':
+                continue
+            by_length[seq_len][comfort_slot[comfort]] += 1
+            frequencies[comfort][sequence] += 1
+            aggregate['total_sequences'] += 1
+            if has_modifiers:
+                aggregate['sequences_with_modifiers'] += 1
+    
+    def _build_array_tables(self):
+        """
+        Плотные таблицы numpy для движка 'numpy': номер клавиши по коду
+        символа текста (-1 - символа нет в раскладке), признаки клавиш,
+        направления пар клавиш и класс окна из двух символов
+        (-1 - неизвестно, иначе 0/1/2 - удобное/частично/неудобное)
+        """
+        size = len(self.encoded)
+        chars = [(ord(char), index) for char, index in self.char_index.items() if len(char) == 1]
+        lookup = np.full(max((code for code, _ in chars), default=-1) + 1, -1, dtype=np.int64)
+        for code, index in chars:
+            lookup[code] = index
+        
+        comfort_slot = {'comfortable': 0, 'partial': 1, 'uncomfortable': 2, 'unknown': -1}
+        pair_comfort = np.array([[comfort_slot[self.pair_result[i][j]['comfort']] for j in range(size)]
+                                 for i in range(size)], dtype=np.int64).reshape(size, size)
+        
+        self._array_tables = {
+            'lookup': lookup,
+            'hand_mask': np.array(self.key_hand_mask, dtype=np.int64),
+            'finger': np.array(self.key_finger, dtype=np.int64),
+            'has_modifiers': np.array(self.key_has_modifiers, dtype=bool),
+            'uniform_hand': np.array(self.key_uniform_hand, dtype=bool),
+            'pair_direction': np.array(self.pair_direction, dtype=np.int64).reshape(size, size),
+            'pair_comfort': pair_comfort
+        }
+    
+    def _array_engine_enabled(self) -> bool:
+        """
+        Движок 'numpy' применим: частоты считаются точно (результат
+        SpaceSavingCounter зависит от порядка добавлений) и номера окон
+        (коды клавиш по основанию len(encoded)) помещаются в int64
+        """
+        return (self.engine == 'numpy' and self.heavy_hitters is None
+                and len(self.encoded) ** self.lengths[-1] < 2 ** 63)
+    
+    def _add_word_counts(self, total_stats: Dict[str, Any], word_counts: Iterable[Tuple[str, int]]):
+        """Добавляет к общей статистике пары (слово, частота) выбранным движком"""
+        if self._array_engine_enabled():
+            word_counts = list(word_counts)
+            for start in range(0, len(word_counts), ARRAY_BATCH_WORDS):
+                self._add_word_counts_array(total_stats, word_counts[start:start + ARRAY_BATCH_WORDS])
+            return
+        
+        for word, count in word_counts:
+            aggregate = self.word_aggregate_cached(word)
+            
+            if aggregate is None:
+                continue
+            
+            self._add_word_aggregate(total_stats, aggregate, count)
+    
+    def _add_word_counts_array(self, total_stats: Dict[str, Any], word_counts: List[Tuple[str, int]]):
+        """
+        Движок 'numpy': добавляет к общей статистике батч пар (слово, частота).
+        
+        Символы раскладки всех слов батча собираются в один массив номеров
+        клавиш с номером слова для каждой позиции; признаки клавиш берутся
+        индексацией таблиц, признаки переходов (совпадение клавиши и пальца,
+        направление, смена направления) - сравнением соседних элементов,
+        а их префиксные суммы дают число признаков в любом окне. Окна каждой
+        длины - все начала, у которых конец в том же слове; правила
+        _classify_codes применяются по приоритету через np.select.
+        
+        Частоты и примеры добавляются в порядке первого появления
+        последовательности (слово, длина, начало), как при пословном
+        анализе, поэтому результат совпадает с движком 'python' полностью.
+        """
+        if self._array_tables is None:
+            self._build_array_tables()
+        tables = self._array_tables
+        
+        words = [word.strip() for word, _ in word_counts]
+        weights = np.array([count for _, count in word_counts], dtype=np.int64)
+        points = np.frombuffer(''.join(words).encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        word_ids = np.repeat(np.arange(len(words)), [len(word) for word in words])
+        
+        # Номера клавиш; символы не из раскладки выбрасываются, как в _word_codes
+        lookup = tables['lookup']
+        codes = np.full(points.size, -1, dtype=np.int64)
+        in_table = points < lookup.size
+        codes[in_table] = lookup[points[in_table]]
+        in_layout = codes >= 0
+        codes, word_ids, points = codes[in_layout], word_ids[in_layout], points[in_layout]
+        
+        # Слова, в которых меньше двух символов раскладки, не анализируются
+        analyzed = np.bincount(word_ids, minlength=len(words)) >= 2
+        in_analyzed = analyzed[word_ids]
+        codes, word_ids, points = codes[in_analyzed], word_ids[in_analyzed], points[in_analyzed]
+        total_stats['words_analyzed'] += int(weights[analyzed].sum())
+        
+        count = codes.size
+        if count < 2:
+            return
+        valid_text = points.tobytes().decode('utf-32-le', 'surrogatepass')
+        
+        def prefix(flags):
+            """prefix(flags)[k] - число истинных flags[0..k-1]"""
+            return np.concatenate(([0], np.cumsum(flags, dtype=np.int64)))
+        
+        # Переход k - пара клавиш k -> k+1; в окне [i, j] переходы i..j-1
+        key_mask = tables['hand_mask'][codes]
+        key_finger = tables['finger'][codes]
+        directions = tables['pair_direction'][codes[:-1], codes[1:]]
+        same_code = prefix(codes[:-1] == codes[1:])
+        same_finger = prefix(key_finger[:-1] == key_finger[1:])
+        unknown_direction = prefix(directions == self.DIRECTION_UNKNOWN)
+        direction_changes = prefix(directions[:-1] != directions[1:])
+        modifiers = prefix(tables['has_modifiers'][codes])
+        uniform_hand = tables['uniform_hand'][codes]
+        size = len(self.encoded)
+        
+        # Различные окна каждого типа удобства: (слово, длина, начало, частота)
+        found = {slot: [] for slot in range(3)}
+        by_length = total_stats['by_length']
+        
+        for length in self.lengths:
+            if count < length:
+                continue
+            starts = np.arange(count - length + 1)
+            ends = starts + length - 1
+            inside = word_ids[starts] == word_ids[ends]
+            starts, ends = starts[inside], ends[inside]
+            
+            if length == 2:
+                comfort = tables['pair_comfort'][codes[starts], codes[ends]]
+            else:
+                hands = key_mask[starts]
+                for offset in range(1, length):
+                    hands = hands | key_mask[starts + offset]
+                first_direction = directions[starts]
+                comfort = np.select(
+                    [
+                        (same_code[ends] - same_code[starts] == length - 1) & uniform_hand[starts],
+                        hands == 0,
+                        (hands & (hands - 1)) != 0,
+                        same_finger[ends] - same_finger[starts] == length - 1,
+                        unknown_direction[ends] > unknown_direction[starts],
+                        direction_changes[ends - 1] > direction_changes[starts],
+                        first_direction == self.DIRECTION_OUTSIDE_TO_INSIDE,
+                        first_direction == self.DIRECTION_INSIDE_TO_OUTSIDE
+                    ],
+                    [0, -1, 2, 2, -1, 2, 0, 1],
+                    default=2
+                )
+            
+            known = comfort >= 0
+            starts, ends, comfort = starts[known], ends[known], comfort[known]
+            window_weights = weights[word_ids[starts]]
+            
+            slot_counts = np.bincount(comfort, weights=window_weights, minlength=3).astype(np.int64)
+            length_stats = by_length[length]
+            for slot, comfort_type in enumerate(['comfortable', 'partial', 'uncomfortable']):
+                length_stats[comfort_type] += int(slot_counts[slot])
+            length_stats['total'] += int(slot_counts.sum())
+            total_stats['total_sequences'] += int(slot_counts.sum())
+            with_modifiers = modifiers[ends + 1] > modifiers[starts]
+            total_stats['sequences_with_modifiers'] += int(window_weights[with_modifiers].sum())
+            
+            # Номер окна - его коды клавиш по основанию size
+            window_ids = np.zeros(starts.size, dtype=np.int64)
+            for offset in range(length - 1, -1, -1):
+                window_ids = window_ids * size + codes[starts + offset]
+            
+            for slot in range(3):
+                of_slot = comfort == slot
+                if not of_slot.any():
+                    continue
+                _, first_index, inverse = np.unique(window_ids[of_slot], return_index=True, return_inverse=True)
+                totals = np.bincount(inverse.ravel(), weights=window_weights[of_slot]).astype(np.int64)
+                first_starts = starts[of_slot][first_index]
+                found[slot].append((word_ids[first_starts], np.full(first_starts.size, length), first_starts, totals))
+        
+        examples = total_stats['comfort_examples']
+        for slot, comfort_type in enumerate(['comfortable', 'partial', 'uncomfortable']):
+            if not found[slot]:
+                continue
+            first_words, lengths, first_starts, totals = (np.concatenate(parts) for parts in zip(*found[slot]))
+            order = np.lexsort((first_starts, lengths, first_words))
+            sequences = [valid_text[start:start + length]
+                         for start, length in zip(first_starts[order].tolist(), lengths[order].tolist())]
+            total_stats['sequence_frequencies'][comfort_type].update(dict(zip(sequences, totals[order].tolist())))
+            
+            for seq_str in sequences:
+                if examples.is_full(comfort_type):
+                    break
+                examples.offer(comfort_type, seq_str,
+                               lambda: self.analyze_sequence_comfort_with_modifiers(seq_str))
+    
+    def bootstrap_intervals(self, word_counts: Dict[str, int], resamples: int = BOOTSTRAP_RESAMPLES,
+                            confidence: float = 0.95, stratify: bool = False,
+                            seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Бутстрэп-доверительные интервалы процентов удобства для выборки слов
+        {слово: частота}: выборка resamples раз перевыбирается с возвращением
+        (при stratify - внутри каждой страты длины слова), интервалы -
+        процентили распределения процентов. Итоги слов берутся из кэша,
+        поэтому каждая перевыборка - только сложение готовых счетчиков.
+        Число вхождений каждого слова в перевыборку берется из
+        мультиномиального распределения (numpy), поэтому стоимость
+        перевыборки зависит от числа различных слов, а не от суммы частот.
+        
+        Returns:
+            Dict: confidence, resamples, overall и by_length -
+            {'<тип>_percent': [нижняя граница, верхняя граница]}
+        """
+        if np is None:
+            raise ImportError("Для бутстрэп-интервалов требуется модуль numpy")
+        rng = np.random.default_rng(seed)
+        comfort_types = ['comfortable', 'partial', 'uncomfortable']
+        
+        # Счетчики слова: (удобные, частично, неудобные) по каждой длине
+        strata = defaultdict(lambda: ([], []))
+        for word, count in word_counts.items():
+            aggregate = self.word_aggregate_cached(word)
+            counts = [aggregate['by_length'][seq_len] if aggregate else (0, 0, 0) for seq_len in self.lengths]
+            weights, rows = strata[word_length_stratum(word) if stratify else 0]
+            weights.append(count)
+            rows.append(counts)
+        
+        # Страта: (число вхождений, вероятности слов, счетчики слов [слово, длина, тип])
+        strata = [(sum(weights), np.array(weights, dtype=np.float64) / sum(weights),
+                   np.array(rows, dtype=np.int64).reshape(len(rows), len(self.lengths), 3))
+                  for weights, rows in strata.values() if sum(weights) > 0]
+        
+        samples = {'overall': {comfort_type: [] for comfort_type in comfort_types}}
+        samples.update({seq_len: {comfort_type: [] for comfort_type in comfort_types} for seq_len in self.lengths})
+        for _ in range(resamples):
+            totals = np.zeros((len(self.lengths), 3), dtype=np.int64)
+            for occurrences, probabilities, rows in strata:
+                drawn = rng.multinomial(occurrences, probabilities)
+                totals += np.tensordot(drawn, rows, axes=1)
+            
+            overall = totals.sum(axis=0).tolist()
+            for key, counts in [('overall', overall)] + list(zip(self.lengths, totals.tolist())):
+                total = sum(counts)
+                for comfort_type, count in zip(comfort_types, counts):
+                    samples[key][comfort_type].append(count / total * 100 if total > 0 else 0)
+        
+        def interval(values: List[float]) -> List[float]:
+            if not values:
+                return [0, 0]
+            values = sorted(values)
+            tail = (1 - confidence) / 2
+            low = values[min(len(values) - 1, int(math.floor(tail * len(values))))]
+            high = values[max(0, int(math.ceil((1 - tail) * len(values))) - 1)]
+            return [low, high]
+        
+        def intervals(key) -> Dict[str, List[float]]:
+            return {f'{comfort_type}_percent': interval(samples[key][comfort_type]) for comfort_type in comfort_types}
+        
+        return {
+            'confidence': confidence,
+            'resamples': resamples,
+            'stratified': stratify,
+            'overall': intervals('overall'),
+            'by_length': {seq_len: intervals(seq_len) for seq_len in self.lengths}
+        }
+    
+    def word_aggregate(self, word: str) -> Optional[Dict[str, Any]]:
+        """
+        Итоги analyze_word_sequences для одного слова в компактном виде:
+        счетчики по длинам и частоты последовательностей по типам удобства
+        (в порядке первого появления в слове). Словари результатов для
+        отдельных последовательностей не создаются. Для слов, которые
+        не анализируются, возвращает None.
+        """
+        encoded_word = self._word_codes(word.strip())
+        if encoded_word is None:
+            return None
+        codes, valid_chars = encoded_word
+        
+        aggregate = self._empty_aggregate()
+        self._add_windows(aggregate, codes, valid_chars)
+        aggregate['by_length'] = {seq_len: tuple(counts) for seq_len, counts in aggregate['by_length'].items()}
+        return aggregate
+    
+    def _add_word_aggregate(self, total_stats: Dict[str, Any], aggregate: Dict[str, Any], weight: int = 1):
+        """Добавляет итоги одного слова (с весом weight) к общей статистике"""
+        total_stats['words_analyzed'] += weight
+        self._add_sequence_counts(total_stats, aggregate, weight)
+    
+    def _add_sequence_counts(self, total_stats: Dict[str, Any], aggregate: Dict[str, Any], weight: int = 1):
+        """Добавляет счетчики последовательностей из итогов aggregate (с весом weight)"""
+        # Агрегируем статистику по длинам
+        for seq_len, counts in aggregate['by_length'].items():
+            length_stats = total_stats['by_length'][seq_len]
+            for comfort_type, count in zip(['comfortable', 'partial', 'uncomfortable'], counts):
+                length_stats[comfort_type] += count * weight
+                length_stats['total'] += count * weight
+        
+        total_stats['total_sequences'] += aggregate['total_sequences'] * weight
+        total_stats['sequences_with_modifiers'] += aggregate['sequences_with_modifiers'] * weight
+        
+        # Собираем частоты для каждого типа удобства и уникальные примеры,
+        # пока примеры этого типа не заполнены
+        examples = total_stats['comfort_examples']
+        for comfort_type, frequencies in aggregate['frequencies'].items():
+            if not frequencies:
+                continue
+            if weight == 1:
+                total_stats['sequence_frequencies'][comfort_type].update(frequencies)
+            else:
+                total_stats['sequence_frequencies'][comfort_type].update(
+                    {seq_str: count * weight for seq_str, count in frequencies.items()}
+                )
+            
+            if not examples.is_full(comfort_type):
+                for seq_str in frequencies:
+                    examples.offer(comfort_type, seq_str,
+                                   lambda: self.analyze_sequence_comfort_with_modifiers(seq_str))
+    
+    def calculate_ngram_analysis(self, ngram_counts: Dict[str, int], total_words: int,
+                                 words_analyzed: int,
+                                 store_meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Комплексный анализ по готовым частотам n-грамм корпуса (см. build_ngram_store).
+        Каждая уникальная последовательность оценивается один раз и учитывается
+        со своей частотой, поэтому время анализа зависит от числа различных
+        n-грамм, а не от размера корпуса.
+        
+        В отличие от calculate_comprehensive_analysis, n-граммы берутся по
+        исходным символам слова: последовательности с символами, которых нет
+        в раскладке, пропускаются, а не склеиваются через них. Поэтому
+        результат отличается от пословного анализа, и в 'ngram_store'
+        явно указано, сколько вхождений не учтено: пропущенные
+        последовательности (skipped_occurrences) и отброшенные при создании
+        хранилища редкие n-граммы (min_count, pruned_ngrams,
+        pruned_occurrences из store_meta - метаданных хранилища).
+        """
+        total_stats = self._empty_comprehensive_stats(total_words)
+        total_stats['words_analyzed'] = words_analyzed
+        skipped_occurrences = 0
+        
+        for sequence, count in tqdm(ngram_counts.items(), desc=f"Анализ раскладки {self.layout_name}"):
+            if len(sequence) not in total_stats['by_length']:
+                continue
+            if not all(char in self.position_map for char in sequence):
+                skipped_occurrences += count
+                continue
+            
+            seq_analysis = self.analyze_sequence_comfort_with_modifiers(sequence)
+            comfort_type = seq_analysis['comfort']
+            if comfort_type == 'unknown':
+                continue
+            
+            length_stats = total_stats['by_length'][len(sequence)]
+            length_stats[comfort_type] += count
+            length_stats['total'] += count
+            total_stats['total_sequences'] += count
+            if seq_analysis.get('has_modifiers', False):
+                total_stats['sequences_with_modifiers'] += count
+            
+            total_stats['sequence_frequencies'][comfort_type].update({sequence: count})
+            total_stats['comfort_examples'].offer(comfort_type, sequence, lambda: seq_analysis)
+        
+        store_meta = store_meta or {}
+        total_stats['ngram_store'] = {
+            'skipped_occurrences': skipped_occurrences,
+            'min_count': store_meta.get('min_count'),
+            'pruned_ngrams': store_meta.get('pruned_ngrams'),
+            'pruned_occurrences': store_meta.get('pruned_occurrences')
+        }
+        return self._finalize_comprehensive_stats(total_stats)
+    
     def prepare_plot_data(self, comprehensive_stats: Dict[str, Any]) -> Dict[str, Any]:
         """
         Подготавливает данные в формате для построения графиков
@@ -602,7 +1825,7 @@ class LayoutAnalyzer:
         plot_data = {
             'layout_name': self.layout_name,
             'by_length': {
-                'lengths': ['2 символа', '3 символа', '4 символа', '5 символов'],
+                'lengths': [length_label(length) for length in self.lengths],
                 'comfortable': [],
                 'partial': [],
                 'uncomfortable': [],
@@ -637,7 +1860,7 @@ class LayoutAnalyzer:
         }
         
         # Заполняем данные по длинам
-        for length in [2, 3, 4, 5]:
+        for length in self.lengths:
             data = comprehensive_stats['by_length'][length]
             plot_data['by_length']['comfortable'].append(data['comfortable'])
             plot_data['by_length']['partial'].append(data['partial'])
@@ -647,6 +1870,9 @@ class LayoutAnalyzer:
             plot_data['by_length']['uncomfortable_percent'].append(data.get('uncomfortable_percent', 0))
             plot_data['by_length']['total'].append(data['total'])
         
+        if 'confidence_intervals' in comprehensive_stats:
+            plot_data['confidence_intervals'] = comprehensive_stats['confidence_intervals']
+        
         return plot_data
 
 
@@ -655,18 +1881,136 @@ def load_layout_from_json(file_path: str) -> Dict[str, Any]:
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+# Анализатор раскладки в процессе-воркере параллельного анализа одной раскладки
+_batch_analyzer = None
+
+def _init_batch_analyzer(analyzer: LayoutAnalyzer):
+    """Инициализатор воркера: анализатор передается в процесс один раз"""
+    global _batch_analyzer
+    _batch_analyzer = analyzer
+
+def _analyze_word_batch(batch: List[Any], raw: bool = False) -> Dict[str, Any]:
+    """Частичная статистика батча в воркере (см. LayoutAnalyzer._batch_stats)"""
+    return _batch_analyzer._batch_stats(batch, raw)
+
 def read_words_by_lines(file_path: str, batch_size: int = 1000, 
-                       encoding: str = 'utf-8') -> Generator[List[str], None, None]:
-    """Читает файл построчно, возвращая батчи слов"""
+                       encoding: str = 'utf-8',
+                       line_counter: Optional[Dict[str, int]] = None) -> Generator[List[str], None, None]:
+    """
+    Читает файл построчно, возвращая батчи слов
+    
+    Если передан line_counter, в line_counter['lines'] по ходу чтения
+    накапливается число прочитанных строк (включая пустые), как у
+    count_lines_in_file, - без повторного чтения файла, а в
+    line_counter['bytes'] - сколько байт файла прочитано к выдаче батча
+    (с точностью до буфера чтения).
+    """
     current_batch = []
     
     with open(file_path, 'r', encoding=encoding) as f:
         for line in f:
+            if line_counter is not None:
+                line_counter['lines'] = line_counter.get('lines', 0) + 1
             line = line.strip()
             if line:
                 words = line.split()
                 current_batch.extend(words)
                 
+                if len(current_batch) >= batch_size:
+                    if line_counter is not None:
+                        line_counter['bytes'] = f.buffer.tell()
+                    yield current_batch
+                    current_batch = []
+        
+        if line_counter is not None:
+            line_counter['bytes'] = f.buffer.tell()
+    
+    if current_batch:
+        yield current_batch
+
+def read_text_by_chunks(file_path: str, chunk_size: int = 1024 * 1024,
+                        encoding: str = 'utf-8',
+                        byte_counter: Optional[Dict[str, int]] = None) -> Generator[str, None, None]:
+    """
+    Читает сплошной текст (например, книгу) чанками по chunk_size символов
+    
+    Если передан byte_counter, в byte_counter['bytes'] к выдаче каждого
+    чанка записывается, сколько байт файла прочитано.
+    """
+    with open(file_path, 'r', encoding=encoding) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if byte_counter is not None:
+                byte_counter['bytes'] = f.buffer.tell()
+            yield chunk
+
+def word_length_stratum(word: str) -> int:
+    """Страта слова для стратифицированной выборки - его длина (с ограничением сверху)"""
+    return min(len(word), STRATUM_MAX_LENGTH)
+
+def reservoir_sample(words: Iterable[str], sample_size: int, stratify: bool = False,
+                     seed: Optional[int] = None) -> Tuple[List[str], int]:
+    """
+    Равномерная случайная выборка sample_size слов из потока за один проход
+    (резервуарная выборка), в отличие от первых N слов, которые у списков,
+    отсортированных по частоте, сильно смещены.
+    
+    При stratify резервуар ведется для каждой страты длины слова, а в
+    итоговую выборку из каждой страты берется доля, пропорциональная числу
+    ее слов в потоке (метод наибольших остатков).
+    
+    Returns:
+        Tuple[List[str], int]: (выборка в случайном порядке, число слов в потоке)
+    """
+    rng = random.Random(seed)
+    reservoirs = defaultdict(list)
+    seen = Counter()
+    
+    for word in words:
+        stratum = word_length_stratum(word) if stratify else 0
+        seen[stratum] += 1
+        reservoir = reservoirs[stratum]
+        if len(reservoir) < sample_size:
+            reservoir.append(word)
+        else:
+            index = rng.randrange(seen[stratum])
+            if index < sample_size:
+                reservoir[index] = word
+    
+    total = sum(seen.values())
+    if not stratify or total <= sample_size:
+        sample = [word for stratum in sorted(reservoirs) for word in reservoirs[stratum]]
+    else:
+        quotas = {stratum: sample_size * seen[stratum] / total for stratum in reservoirs}
+        allocated = {stratum: int(quota) for stratum, quota in quotas.items()}
+        remainder = sample_size - sum(allocated.values())
+        for stratum in sorted(quotas, key=lambda h: quotas[h] - allocated[h], reverse=True)[:remainder]:
+            allocated[stratum] += 1
+        sample = [word for stratum in sorted(reservoirs)
+                  for word in rng.sample(reservoirs[stratum], min(allocated[stratum], len(reservoirs[stratum])))]
+    
+    rng.shuffle(sample)
+    return sample, total
+
+def read_weighted_words_by_lines(file_path: str, batch_size: int = 1000,
+                                 encoding: str = 'utf-8',
+                                 line_counter: Optional[Dict[str, int]] = None) -> Generator[List[Tuple[str, int]], None, None]:
+    """
+    Читает частотный список построчно, возвращая батчи пар (слово, частота).
+    line_counter - как в read_words_by_lines (только число строк).
+    """
+    current_batch = []
+    
+    with open(file_path, 'r', encoding=encoding) as f:
+        for line in f:
+            if line_counter is not None:
+                line_counter['lines'] = line_counter.get('lines', 0) + 1
+            parsed = parse_weighted_line(line)
+            if parsed and parsed[1] > 0:
+                current_batch.append(parsed)
+                
                 if len(current_batch) >= batch_size:
                     yield current_batch
                     current_batch = []
@@ -674,6 +2018,23 @@ def read_words_by_lines(file_path: str, batch_size: int = 1000,
     if current_batch:
         yield current_batch
 
+def read_word_counts(file_path: str, weighted: bool = False, encoding: str = 'utf-8') -> Counter:
+    """
+    Частоты слов корпуса {слово: частота}: для обычного списка слов
+    каждое вхождение считается один раз, для частотного - берется частота из строки.
+    """
+    word_counts = Counter()
+    if weighted:
+        for batch in tqdm(read_weighted_words_by_lines(file_path, batch_size=10000, encoding=encoding),
+                          desc="Чтение частотного списка"):
+            for word, count in batch:
+                word_counts[word] += count
+    else:
+        for batch in tqdm(read_words_by_lines(file_path, batch_size=10000, encoding=encoding),
+                          desc="Сбор слов корпуса"):
+            word_counts.update(batch)
+    return word_counts
+
 def count_lines_in_file(file_path: str, encoding: str = 'utf-8') -> int:
     """Считает количество строк в файле"""
     try:
@@ -682,44 +2043,339 @@ def count_lines_in_file(file_path: str, encoding: str = 'utf-8') -> int:
     except:
         return 0
 
+def build_ngram_counts(file_path: str, encoding: str = 'utf-8',
+                       lengths: Tuple[int, ...] = NGRAM_LENGTHS,
+                       weighted: bool = False) -> Tuple[Counter, Dict[str, int]]:
+    """
+    Один проход по корпусу: частоты всех последовательностей заданных длин
+    внутри слов. Слова выделяются так же, как в read_words_by_lines,
+    для частотного списка (weighted) - как в read_weighted_words_by_lines.
+    N-граммы считаются по батчам (повторы слова внутри батча режутся один
+    раз), строки - в том же чтении, поэтому в памяти только частоты n-грамм.
+    
+    Returns:
+        Tuple[Counter, Dict[str, int]]: (частоты n-грамм, total_lines / total_words / words_collected)
+    """
+    line_counter = {'lines': 0}
+    if weighted:
+        batches = read_weighted_words_by_lines(file_path, batch_size=10000, encoding=encoding,
+                                               line_counter=line_counter)
+    else:
+        batches = (Counter(batch).items()
+                   for batch in read_words_by_lines(file_path, batch_size=10000, encoding=encoding,
+                                                    line_counter=line_counter))
+    
+    ngram_counts = Counter()
+    total_words = 0
+    words_collected = 0
+    for batch in tqdm(batches, desc="Подсчет n-грамм", unit=" батч"):
+        for word, count in batch:
+            total_words += count
+            if len(word) >= 2:
+                words_collected += count
+            for seq_len in lengths:
+                for i in range(len(word) - seq_len + 1):
+                    ngram_counts[word[i:i + seq_len]] += count
+    
+    totals = {
+        'total_lines': line_counter['lines'],
+        'total_words': total_words,
+        'words_collected': words_collected
+    }
+    return ngram_counts, totals
+
+
+def save_ngram_store(store_path: str, ngram_counts: Dict[str, int], meta: Dict[str, Any],
+                     min_count: int = 1) -> Dict[str, Any]:
+    """
+    Сохраняет частоты n-грамм в сжатый файл: первая строка - JSON с
+    метаданными, далее строки "n-грамма<TAB>частота" по убыванию частоты.
+    N-граммы, встретившиеся реже min_count раз, отбрасываются; в метаданных
+    остается их число (pruned_ngrams) и суммарная частота (pruned_occurrences).
+    """
+    kept = sorted(((seq, count) for seq, count in ngram_counts.items() if count >= min_count),
+                  key=lambda x: x[1], reverse=True)
+    meta = dict(meta, min_count=min_count, pruned_ngrams=len(ngram_counts) - len(kept),
+                pruned_occurrences=sum(ngram_counts.values()) - sum(count for _, count in kept))
+    
+    with gzip.open(store_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        for seq, count in kept:
+            f.write(f"{seq}\t{count}\n")
+    
+    return {'meta': meta, 'ngrams': dict(kept)}
+
+
+def load_ngram_store(store_path: str) -> Dict[str, Any]:
+    """Загружает хранилище n-грамм, созданное save_ngram_store"""
+    ngrams = {}
+    with gzip.open(store_path, 'rt', encoding='utf-8') as f:
+        meta = json.loads(f.readline())
+        for line in f:
+            seq, count = line.rstrip("\n").rsplit("\t", 1)
+            ngrams[seq] = int(count)
+    
+    return {'meta': meta, 'ngrams': ngrams}
+
+
+def get_ngram_store(file_path: str, store_path: Optional[str] = None, min_count: int = 2,
+                    encoding: str = 'utf-8', weighted: bool = False,
+                    lengths: Tuple[int, ...] = NGRAM_LENGTHS) -> Dict[str, Any]:
+    """
+    Возвращает хранилище n-грамм корпуса, при необходимости создавая его.
+    Хранилище пересоздается, если корпус изменился (размер или время изменения)
+    или оно было построено с другим порогом отсечения. Хранилище с n-граммами
+    большего набора длин подходит и для меньшего.
+    
+    Args:
+        file_path: Путь к корпусу
+        store_path: Путь к хранилищу (по умолчанию <корпус>.ngrams.gz)
+        min_count: Минимальная частота n-граммы, реже - отбрасывается
+        encoding: Кодировка корпуса
+        weighted: Корпус - частотный список "слово частота"
+        lengths: Длины n-грамм
+    """
+    lengths = normalize_lengths(lengths)
+    store_path = store_path or f"{file_path}.ngrams.gz"
+    info = os.stat(file_path)
+    source = {'file_size': info.st_size, 'file_mtime_ns': info.st_mtime_ns, 'weighted': weighted}
+    
+    if os.path.exists(store_path):
+        store = load_ngram_store(store_path)
+        meta = store['meta']
+        if (all(meta.get(key) == value for key, value in source.items()) and meta.get('min_count') == min_count
+                and set(lengths) <= set(meta.get('lengths', NGRAM_LENGTHS))):
+            return store
+    
+    ngram_counts, totals = build_ngram_counts(file_path, encoding=encoding, lengths=lengths, weighted=weighted)
+    return save_ngram_store(store_path, ngram_counts, dict(source, lengths=list(lengths), **totals), min_count)
+
+
 def analyze_layout_comprehensive(layout_config: Dict[str, Any], 
                                layout_name: str,
                                file_path: str,
-                               max_samples: int = 100000) -> Dict[str, Any]:
+                               max_samples: Optional[int] = 100000,
+                               ngram_store: Optional[str] = None,
+                               weighted: bool = False,
+                               lengths: Tuple[int, ...] = NGRAM_LENGTHS,
+                               heavy_hitters: Optional[int] = None,
+                               text_type: str = 'words',
+                               sampling: str = 'first',
+                               seed: Optional[int] = None,
+                               bootstrap: int = 0,
+                               tolerance: Optional[float] = None,
+                               confidence: float = 0.95,
+                               workers: int = 1,
+                               engine: str = 'python') -> Dict[str, Any]:
     """
     Комплексный анализ раскладки
+    
+    sampling - как выбираются max_samples слов: 'first' - первые слова файла,
+    'reservoir' - равномерная случайная выборка за один проход,
+    'stratified' - то же, с пропорциональным представительством длин слов
+    (см. reservoir_sample); seed - зерно генератора для воспроизводимости.
+    bootstrap - число бутстрэп-выборок для доверительных интервалов процентов
+    удобства по выборке (0 - не считать), см. LayoutAnalyzer.bootstrap_intervals.
+    
+    text_type='text' - файл является сплошным текстом: он анализируется
+    целиком за один проход, окна проходят через пробелы и знаки препинания
+    (см. LayoutAnalyzer.calculate_text_analysis); max_samples, ngram_store
+    и weighted при этом не используются.
+    
+    lengths - длины анализируемых последовательностей (например, range(2, 9)).
+    heavy_hitters - бюджет памяти (число ключей) для приближенного подсчета
+    самых частых последовательностей, None - точный подсчет.
+    
+    max_samples - сколько первых слов корпуса анализировать; None - весь
+    корпус потоково, батч за батчем, за одно чтение файла (см.
+    LayoutAnalyzer.calculate_stream_analysis).
+    
+    tolerance - ранняя остановка для потокового анализа (max_samples=None)
+    и сплошного текста: чтение прекращается, когда доверительные интервалы
+    (уровня confidence) общих процентов удобства уже tolerance процентных
+    пунктов. В comprehensive_stats['early_stop'] - интервалы и доля
+    прочитанного корпуса (consumed_fraction). None - читать весь корпус.
+    
+    workers > 1 - слова (выборка, частотный список или поток) анализируются
+    батчами в пуле из workers процессов; результат совпадает с
+    последовательным (см. LayoutAnalyzer.calculate_weighted_analysis).
+    engine - движок классификации окон ('python' или 'numpy', см. COMFORT_ENGINES).
+    
+    Если задан ngram_store (путь к хранилищу n-грамм, "" - путь по умолчанию),
+    анализируется весь корпус по частотам n-грамм из хранилища (см. get_ngram_store),
+    а max_samples не используется.
+    
+    Если weighted, файл - частотный список "слово частота": каждое слово
+    учитывается со своей частотой, список анализируется целиком без max_samples.
     """
-    analyzer = LayoutAnalyzer(layout_config, layout_name)
+    analyzer = LayoutAnalyzer(layout_config, layout_name, lengths=lengths, heavy_hitters=heavy_hitters,
+                              engine=engine)
+    
+    if text_type == 'text':
+        stream = _byte_progress(read_corpus_stream(file_path, text_type), file_path, f"Анализ текста {layout_name}")
+        return _analyze_corpus_stream(analyzer, layout_name, file_path, stream, text_type, tolerance, confidence)
+    
+    if ngram_store is not None:
+        store = get_ngram_store(file_path, ngram_store or None, weighted=weighted, lengths=analyzer.lengths)
+        meta = store['meta']
+        print(f"\n📊 Для раскладки '{layout_name}':")
+        print(f"   • Различных n-грамм в хранилище: {len(store['ngrams']):,}")
+        
+        # Как и при выборке, учитываются слова длиной от 2 символов
+        comprehensive_stats = analyzer.calculate_ngram_analysis(
+            store['ngrams'], meta['words_collected'], meta['words_collected'], meta
+        )
+        return _build_comprehensive_result(analyzer, comprehensive_stats, layout_name, file_path,
+                                           meta['total_lines'], meta['words_collected'])
     
-    # Собираем слова для анализа
-    words_for_analysis = []
-    word_generator = read_words_by_lines(file_path, batch_size=1000, encoding='utf-8')
+    if weighted:
+        word_counts = read_word_counts(file_path, weighted=True)
+        # Как и при выборке, учитываются слова длиной от 2 символов
+        word_counts = {word: count for word, count in word_counts.items() if len(word) >= 2}
+        words_collected = sum(word_counts.values())
+        print(f"\n📊 Для раскладки '{layout_name}':")
+        print(f"   • Уникальных слов: {len(word_counts):,}, всего вхождений: {words_collected:,}")
+        
+        comprehensive_stats = analyzer.calculate_weighted_analysis(word_counts, workers)
+        return _build_comprehensive_result(analyzer, comprehensive_stats, layout_name, file_path,
+                                           count_lines_in_file(file_path), words_collected)
     
-    total_words = count_lines_in_file(file_path, encoding='utf-8')
-    pbar = tqdm(total=min(total_words, max_samples), desc=f"Сбор слов для {layout_name}")
+    if max_samples is None:
+        stream = _byte_progress(read_corpus_stream(file_path), file_path, f"Потоковый анализ {layout_name}")
+        return _analyze_corpus_stream(analyzer, layout_name, file_path, stream, text_type, tolerance, confidence,
+                                      workers)
     
-    try:
-        for batch in word_generator:
-            for word in batch:
-                if len(words_for_analysis) < max_samples:
-                    word = word.strip()
-                    if len(word) >= 2:
-                        words_for_analysis.append(word)
-                        pbar.update(1)
-                
+    if sampling not in ('first', 'reservoir', 'stratified'):
+        raise ValueError(f"Неизвестный способ выборки: {sampling}")
+    
+    if sampling != 'first':
+        words_for_analysis, total_words = _sample_corpus_words(file_path, max_samples, sampling, seed,
+                                                               desc=f"Выборка слов для {layout_name}")
+    else:
+        # Собираем слова для анализа
+        words_for_analysis = []
+        word_generator = read_words_by_lines(file_path, batch_size=1000, encoding='utf-8')
+        
+        total_words = count_lines_in_file(file_path, encoding='utf-8')
+        pbar = tqdm(total=min(total_words, max_samples), desc=f"Сбор слов для {layout_name}")
+        
+        try:
+            for batch in word_generator:
+                for word in batch:
+                    if len(words_for_analysis) < max_samples:
+                        word = word.strip()
+                        if len(word) >= 2:
+                            words_for_analysis.append(word)
+                            pbar.update(1)
+                    
+                    if len(words_for_analysis) >= max_samples:
+                        break
                 if len(words_for_analysis) >= max_samples:
                     break
-            if len(words_for_analysis) >= max_samples:
-                break
-    finally:
-        pbar.close()
+        finally:
+            pbar.close()
     
     print(f"\n📊 Для раскладки '{layout_name}':")
     print(f"   • Собрано слов: {len(words_for_analysis):,}")
     
     # Выполняем комплексный анализ
-    comprehensive_stats = analyzer.calculate_comprehensive_analysis(words_for_analysis)
+    comprehensive_stats = analyzer.calculate_comprehensive_analysis(words_for_analysis, workers)
+    if bootstrap:
+        comprehensive_stats['confidence_intervals'] = analyzer.bootstrap_intervals(
+            Counter(words_for_analysis), bootstrap, stratify=sampling == 'stratified', seed=seed
+        )
+    
+    return _build_comprehensive_result(analyzer, comprehensive_stats, layout_name, file_path,
+                                       total_words, len(words_for_analysis))
+
+def read_corpus_stream(file_path: str, text_type: str = 'words',
+                       encoding: str = 'utf-8') -> Generator[Tuple[Any, Dict[str, int]], None, None]:
+    """
+    Потоковое чтение корпуса: батчи слов (text_type='words') или чанки
+    сплошного текста ('text') вместе с тем, сколько файла прочитано к их
+    выдаче - {'lines': строк, 'bytes': байт}.
+    """
+    counter = {'lines': 0, 'bytes': 0}
+    if text_type == 'text':
+        for chunk in read_text_by_chunks(file_path, encoding=encoding, byte_counter=counter):
+            yield chunk, dict(counter)
+    else:
+        for batch in read_words_by_lines(file_path, batch_size=10000, encoding=encoding, line_counter=counter):
+            yield batch, dict(counter)
+
+def _byte_progress(stream: Iterable[Tuple[Any, Dict[str, int]]], file_path: str,
+                   desc: str) -> Generator[Tuple[Any, Dict[str, int]], None, None]:
+    """Прогресс-бар потока read_corpus_stream по прочитанным байтам файла"""
+    with tqdm(total=os.path.getsize(file_path), desc=desc, unit="B", unit_scale=True) as pbar:
+        for item, read in stream:
+            pbar.update(read['bytes'] - pbar.n)
+            yield item, read
+
+def _analyze_corpus_stream(analyzer: LayoutAnalyzer, layout_name: str, file_path: str,
+                           stream: Iterable[Tuple[Any, Dict[str, int]]], text_type: str = 'words',
+                           tolerance: Optional[float] = None, confidence: float = 0.95,
+                           workers: int = 1) -> Dict[str, Any]:
+    """
+    Анализ раскладки за одно чтение корпуса: stream - пары (батч, прочитано)
+    из read_corpus_stream (см. LayoutAnalyzer.calculate_stream_analysis и
+    calculate_text_analysis). С tolerance в early_stop записывается доля
+    корпуса, прочитанная к остановке.
+    """
+    progress = {'lines': 0, 'bytes': 0}
     
+    def batches():
+        for batch, read in stream:
+            progress.update(read)
+            yield batch
+    
+    if text_type == 'text':
+        comprehensive_stats = analyzer.calculate_text_analysis(batches(), tolerance, confidence)
+    else:
+        comprehensive_stats = analyzer.calculate_stream_analysis(batches(), tolerance, confidence, workers)
+    words_collected = comprehensive_stats['total_words']
+    
+    print(f"\n📊 Для раскладки '{layout_name}':")
+    if text_type == 'text':
+        print(f"   • Проанализировано слов сплошного текста: {words_collected:,}")
+    elif 'early_stop' in comprehensive_stats:
+        print(f"   • Проанализировано слов: {words_collected:,}")
+    else:
+        print(f"   • Проанализировано слов: {words_collected:,} (весь корпус)")
+    _record_consumption(comprehensive_stats, file_path, progress['bytes'])
+    
+    total_lines = words_collected if text_type == 'text' else progress['lines']
+    return _build_comprehensive_result(analyzer, comprehensive_stats, layout_name, file_path,
+                                       total_lines, words_collected)
+
+def _record_consumption(comprehensive_stats: Dict[str, Any], file_path: str, bytes_read: int):
+    """Дописывает в итог ранней остановки, какая доля корпуса прочитана"""
+    early_stop = comprehensive_stats.get('early_stop')
+    if early_stop is None:
+        return
+    file_size = os.path.getsize(file_path)
+    early_stop['consumed_bytes'] = bytes_read
+    early_stop['consumed_fraction'] = min(1.0, bytes_read / file_size) if file_size else 1.0
+    if early_stop['converged']:
+        print(f"   • ⏱️ Ранняя остановка: прочитано {early_stop['consumed_fraction'] * 100:.1f}% корпуса")
+
+def _sample_corpus_words(file_path: str, sample_size: int, sampling: str, seed: Optional[int] = None,
+                         desc: str = "Выборка слов") -> Tuple[List[str], int]:
+    """
+    Случайная выборка слов корпуса длиной от 2 символов за одно чтение файла
+    (см. reservoir_sample). Возвращает (выборка, число строк файла).
+    """
+    line_counter = {'lines': 0}
+    words = (word
+             for batch in tqdm(read_words_by_lines(file_path, batch_size=10000, line_counter=line_counter),
+                               desc=desc, unit=" батч")
+             for word in (word.strip() for word in batch) if len(word) >= 2)
+    sample, _ = reservoir_sample(words, sample_size, stratify=sampling == 'stratified', seed=seed)
+    return sample, line_counter['lines']
+
+def _build_comprehensive_result(analyzer: LayoutAnalyzer, comprehensive_stats: Dict[str, Any],
+                                layout_name: str, file_path: str,
+                                total_words: int, words_analyzed: int) -> Dict[str, Any]:
+    """Формирует итоговый результат комплексного анализа"""
     # Подготавливаем данные для графиков
     plot_data = analyzer.prepare_plot_data(comprehensive_stats)
     
@@ -728,7 +2384,7 @@ def analyze_layout_comprehensive(layout_config: Dict[str, Any],
         'layout_name': layout_name,
         'file_analyzed': os.path.basename(file_path),
         'total_words_in_file': total_words,
-        'words_analyzed': len(words_for_analysis),
+        'words_analyzed': words_analyzed,
         'comprehensive_stats': comprehensive_stats,
         'plot_data': plot_data,
         'goodness_score': comprehensive_stats['finger_analysis']['goodness_score'],
@@ -775,6 +2431,31 @@ def print_analysis_summary(result):
     print(f"  • Частично удобные: {plot_data['overall_stats']['partial']:,} ({plot_data['overall_stats']['partial_percent']:.1f}%)")
     print(f"  • Неудобные: {plot_data['overall_stats']['uncomfortable']:,} ({plot_data['overall_stats']['uncomfortable_percent']:.1f}%)")
     
+    intervals = plot_data.get('confidence_intervals')
+    if intervals:
+        print(f"\n📐 ДОВЕРИТЕЛЬНЫЕ ИНТЕРВАЛЫ ({intervals['confidence'] * 100:.0f}%, бутстрэп по {intervals['resamples']} выборкам):")
+        for comfort_type, comfort_name in [('comfortable', 'Удобные'), ('partial', 'Частично удобные'), ('uncomfortable', 'Неудобные')]:
+            low, high = intervals['overall'][f'{comfort_type}_percent']
+            print(f"  • {comfort_name}: {low:.1f}% - {high:.1f}%")
+    
+    early_stop = result['comprehensive_stats'].get('early_stop')
+    if early_stop:
+        status = "сошлись" if early_stop['converged'] else "не сошлись, прочитан весь корпус"
+        print(f"\n⏱️ РАННЯЯ ОСТАНОВКА (допуск {early_stop['tolerance']} п.п., {early_stop['confidence'] * 100:.0f}%): интервалы {status}")
+        print(f"  • Прочитано: {early_stop.get('consumed_fraction', 1.0) * 100:.1f}% корпуса, батчей: {early_stop['batches']}")
+        for comfort_type, comfort_name in [('comfortable', 'Удобные'), ('partial', 'Частично удобные'), ('uncomfortable', 'Неудобные')]:
+            bounds = early_stop['intervals'].get(f'{comfort_type}_percent')
+            if bounds:
+                print(f"  • {comfort_name}: {bounds[0]:.1f}% - {bounds[1]:.1f}%")
+    
+    ngram_store = result['comprehensive_stats'].get('ngram_store')
+    if ngram_store:
+        print(f"\n🗃️ ХРАНИЛИЩЕ N-ГРАММ (результат отличается от пословного анализа):")
+        print(f"  • Пропущено вхождений с символами вне раскладки: {ngram_store['skipped_occurrences']:,}")
+        if ngram_store['pruned_occurrences'] is not None:
+            print(f"  • Отброшено редких n-грамм (частота < {ngram_store['min_count']}): "
+                  f"{ngram_store['pruned_ngrams']:,}, вхождений: {ngram_store['pruned_occurrences']:,}")
+    
     print(f"\n📏 СТАТИСТИКА ПО ДЛИНАМ ПОСЛЕДОВАТЕЛЬНОСТЕЙ:")
     for i, length_name in enumerate(plot_data['by_length']['lengths']):
         print(f"  • {length_name}:")
@@ -804,7 +2485,7 @@ def print_analysis_summary(result):
                     'same_characters': 'одинаковые символы'
                 }
                 reason = reason_map.get(example.get('reason', ''), example.get('reason', 'неизвестно'))
-                print(f"  • '{example['sequence']}' ({example['length']} символа){mod_info} - {reason}")
+                print(f"  • '{example['sequence']}' ({length_label(example['length'])}){mod_info} - {reason}")
     
     print(f"\n🏆 ТОП-3 САМЫХ ЧАСТЫХ УДОБНЫХ ПОСЛЕДОВАТЕЛЬНОСТЕЙ:")
     top_comfortable = list(plot_data['top_sequences']['comfortable'].items())[:3]
@@ -835,20 +2516,326 @@ def save_analysis_results(result, output_dir: str = "analysis_results"):
     print(f"💾 Результаты сохранены в: {output_file}")
     return output_file
 
+# Корпус, общий для всех раскладок в процессе-воркере analyze_multiple_layouts
+_shared_corpus: Dict[str, Any] = {}
+
+def _init_shared_corpus(corpus: Dict[str, Any]):
+    """Инициализатор воркера: корпус передается в процесс один раз"""
+    global _shared_corpus
+    _shared_corpus = corpus
+
+def _load_shared_corpus(text_file: str, max_samples: Optional[int] = 100000,
+                        ngram_store: Optional[str] = None,
+                        weighted: bool = False,
+                        lengths: Tuple[int, ...] = NGRAM_LENGTHS,
+                        sampling: str = 'first',
+                        seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Читает корпус один раз для сравнения нескольких раскладок по выборке,
+    частотному списку или хранилищу n-грамм: частоты слов (или n-грамм) и
+    итоги, которые analyze_layout_comprehensive получила бы для каждой
+    раскладки по отдельности. Весь корпус и сплошной текст сюда не
+    загружаются, см. _analyze_layouts_streaming.
+    
+    Returns:
+        Dict: mode ('words' / 'ngrams'), counts, total_lines, words_collected, stratified
+        (для хранилища n-грамм - еще meta)
+    """
+    if ngram_store is not None:
+        store = get_ngram_store(text_file, ngram_store or None, weighted=weighted, lengths=lengths)
+        meta = store['meta']
+        return {'mode': 'ngrams', 'counts': store['ngrams'], 'meta': meta,
+                'total_lines': meta['total_lines'], 'words_collected': meta['words_collected']}
+    
+    if weighted:
+        word_counts = read_word_counts(text_file, weighted=True)
+        word_counts = {word: count for word, count in word_counts.items() if len(word) >= 2}
+        total_lines = count_lines_in_file(text_file)
+    elif sampling != 'first':
+        sample, total_lines = _sample_corpus_words(text_file, max_samples, sampling, seed)
+        word_counts = Counter(sample)
+    else:
+        word_counts = Counter()
+        collected = 0
+        for batch in tqdm(read_words_by_lines(text_file, batch_size=1000),
+                          desc="Сбор слов корпуса", unit=" батч"):
+            for word in batch:
+                word = word.strip()
+                if len(word) >= 2:
+                    word_counts[word] += 1
+                    collected += 1
+                    if collected >= max_samples:
+                        break
+            if collected >= max_samples:
+                break
+        total_lines = count_lines_in_file(text_file)
+    
+    return {'mode': 'words', 'counts': word_counts, 'stratified': sampling == 'stratified',
+            'total_lines': total_lines, 'words_collected': sum(word_counts.values())}
+
+def _analyze_shared_corpus(layout_config: Dict[str, Any], layout_name: str,
+                           text_file: str, lengths: Tuple[int, ...] = NGRAM_LENGTHS,
+                           heavy_hitters: Optional[int] = None,
+                           bootstrap: int = 0, seed: Optional[int] = None,
+                           engine: str = 'python') -> Dict[str, Any]:
+    """Анализ одной раскладки по корпусу, загруженному _init_shared_corpus"""
+    corpus = _shared_corpus
+    analyzer = LayoutAnalyzer(layout_config, layout_name, lengths=lengths, heavy_hitters=heavy_hitters,
+                              engine=engine)
+    
+    if corpus['mode'] == 'ngrams':
+        comprehensive_stats = analyzer.calculate_ngram_analysis(
+            corpus['counts'], corpus['words_collected'], corpus['words_collected'], corpus['meta']
+        )
+    else:
+        comprehensive_stats = analyzer.calculate_weighted_analysis(corpus['counts'])
+        if bootstrap:
+            comprehensive_stats['confidence_intervals'] = analyzer.bootstrap_intervals(
+                corpus['counts'], bootstrap, stratify=corpus['stratified'], seed=seed
+            )
+    
+    return _build_comprehensive_result(analyzer, comprehensive_stats, layout_name, text_file,
+                                       corpus['total_lines'], corpus['words_collected'])
+
+def _add_layout_to_comparison(comparison_data: Dict[str, Any], layout_name: str,
+                              result: Dict[str, Any]):
+    """Добавляет результат раскладки в данные для сравнения"""
+    # Сохраняем результаты для сравнения
+    comparison_data['layouts'].append(layout_name)
+    comparison_data['total_words_analyzed'] += result['words_analyzed']
+    
+    # Данные по длинам для сравнения
+    for length in comparison_data['by_length_comparison']:
+        plot_data = result['plot_data']
+        idx = list(plot_data['by_length']['lengths']).index(length_label(length))
+        
+        comparison_data['by_length_comparison'][length]['layouts'].append(layout_name)
+        comparison_data['by_length_comparison'][length]['comfortable'].append(
+            plot_data['by_length']['comfortable_percent'][idx]
+        )
+        comparison_data['by_length_comparison'][length]['partial'].append(
+            plot_data['by_length']['partial_percent'][idx]
+        )
+        comparison_data['by_length_comparison'][length]['uncomfortable'].append(
+            plot_data['by_length']['uncomfortable_percent'][idx]
+        )
+    
+    # Общая удобность
+    comparison_data['overall_comfort']['layouts'].append(layout_name)
+    comparison_data['overall_comfort']['comfortable'].append(
+        result['plot_data']['overall_stats']['comfortable_percent']
+    )
+    comparison_data['overall_comfort']['partial'].append(
+        result['plot_data']['overall_stats']['partial_percent']
+    )
+    comparison_data['overall_comfort']['uncomfortable'].append(
+        result['plot_data']['overall_stats']['uncomfortable_percent']
+    )
+    
+    # Goodness scores
+    comparison_data['goodness_scores'].append({
+        'layout': layout_name,
+        'score': result['goodness_score'],
+        'normalized': result['normalized_score'],
+        'top_two_load': result['comprehensive_stats']['finger_analysis']['top_two_fingers_load'],
+        'max_distance': result['comprehensive_stats']['finger_analysis']['overall_max_distance']
+    })
+    
+    # Статистика по модификаторам
+    modifier_stats = result['comprehensive_stats']['finger_analysis'].get('modifier_stats', {})
+    comparison_data['modifier_stats'].append({
+        'layout': layout_name,
+        'shift_percent': modifier_stats.get('shift_percent', 0),
+        'alt_percent': modifier_stats.get('alt_percent', 0),
+        'sequences_with_modifiers': result['plot_data']['overall_stats'].get('modifiers_percent', 0)
+    })
+
+def _analyze_shared_layouts(layouts: List[Tuple[Dict[str, Any], str]], corpus: Dict[str, Any],
+                            text_file: str, workers: int, lengths: Tuple[int, ...],
+                            heavy_hitters: Optional[int], bootstrap: int,
+                            seed: Optional[int], engine: str = 'python') -> List[Tuple[str, Any, Any]]:
+    """
+    Анализ раскладок по корпусу из _load_shared_corpus в пуле из workers
+    процессов (1 - последовательно в текущем процессе).
+    
+    Returns:
+        List: (имя раскладки, результат, ошибка) в порядке layouts
+    """
+    outcomes = []
+    if workers <= 1:
+        _init_shared_corpus(corpus)
+        for layout_config, layout_name in layouts:
+            try:
+                result = _analyze_shared_corpus(layout_config, layout_name, text_file, lengths, heavy_hitters,
+                                                bootstrap, seed, engine)
+                outcomes.append((layout_name, result, None))
+            except Exception as e:
+                outcomes.append((layout_name, None, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_shared_corpus, initargs=(corpus,)) as executor:
+            futures = [(layout_name, executor.submit(_analyze_shared_corpus, layout_config, layout_name, text_file,
+                                                        lengths, heavy_hitters, bootstrap, seed, engine))
+                       for layout_config, layout_name in layouts]
+            for layout_name, future in futures:
+                try:
+                    outcomes.append((layout_name, future.result(), None))
+                except Exception as e:
+                    outcomes.append((layout_name, None, e))
+    return outcomes
+
+def _put_until_done(batches: Any, item: Any, done: Any, process: Any):
+    """Кладет item в очередь воркера, пока тот не закончил анализ (ранняя остановка, ошибка)"""
+    while not done.is_set() and process.is_alive():
+        try:
+            batches.put(item, timeout=0.1)
+            return
+        except Full:
+            continue
+
+def _stream_layout_worker(index: int, layout_config: Dict[str, Any], layout_name: str, text_file: str,
+                          batches: Any, done: Any, results: Any, options: Dict[str, Any]):
+    """
+    Процесс потокового сравнения раскладок: анализирует раскладку по
+    батчам из очереди batches (None - конец корпуса). Закончив (в том числе
+    досрочно или с ошибкой), ставит done, чтобы читатель больше не ждал
+    этот воркер, и кладет (index, результат, ошибка) в results.
+    """
+    def stream():
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            yield item
+    
+    try:
+        analyzer = LayoutAnalyzer(layout_config, layout_name, lengths=options['lengths'],
+                                  heavy_hitters=options['heavy_hitters'], engine=options['engine'])
+        result = _analyze_corpus_stream(analyzer, layout_name, text_file, stream(), options['text_type'],
+                                        options['tolerance'], options['confidence'])
+        outcome = (index, result, None)
+    except Exception as e:
+        outcome = (index, None, e)
+    finally:
+        done.set()
+    results.put(outcome)
+
+def _analyze_layouts_streaming(layouts: List[Tuple[Dict[str, Any], str]], text_file: str,
+                               workers: int, options: Dict[str, Any]) -> List[Tuple[str, Any, Any]]:
+    """
+    Потоковое сравнение раскладок (весь корпус или сплошной текст): один
+    читатель раздает батчи корпуса процессам раскладок через очереди не
+    длиннее SHARED_STREAM_QUEUE, поэтому память не зависит от размера корпуса.
+    Раскладка, сошедшаяся раньше (tolerance), больше не получает батчей;
+    чтение прекращается, когда сошлись все. Одновременно анализируются до
+    workers раскладок: если раскладок больше, корпус читается по разу на
+    группу. workers <= 1 - каждая раскладка в текущем процессе своим чтением.
+    
+    Returns:
+        List: (имя раскладки, результат, ошибка) в порядке layouts
+    """
+    outcomes = []
+    if workers <= 1:
+        for layout_config, layout_name in layouts:
+            try:
+                analyzer = LayoutAnalyzer(layout_config, layout_name, lengths=options['lengths'],
+                                          heavy_hitters=options['heavy_hitters'], engine=options['engine'])
+                stream = _byte_progress(read_corpus_stream(text_file, options['text_type']), text_file,
+                                        f"Потоковый анализ {layout_name}")
+                result = _analyze_corpus_stream(analyzer, layout_name, text_file, stream, options['text_type'],
+                                                options['tolerance'], options['confidence'])
+                outcomes.append((layout_name, result, None))
+            except Exception as e:
+                outcomes.append((layout_name, None, e))
+        return outcomes
+    
+    context = multiprocessing.get_context('spawn')
+    for start in range(0, len(layouts), workers):
+        group = layouts[start:start + workers]
+        results = context.Queue()
+        channels = []
+        for index, (layout_config, layout_name) in enumerate(group):
+            batches = context.Queue(maxsize=SHARED_STREAM_QUEUE)
+            done = context.Event()
+            process = context.Process(target=_stream_layout_worker,
+                                      args=(index, layout_config, layout_name, text_file,
+                                            batches, done, results, options))
+            process.start()
+            channels.append((batches, done, process))
+        
+        try:
+            for item in _byte_progress(read_corpus_stream(text_file, options['text_type']), text_file,
+                                       f"Чтение корпуса для {len(group)} раскладок"):
+                active = [channel for channel in channels if not channel[1].is_set() and channel[2].is_alive()]
+                if not active:
+                    break
+                for batches, done, process in active:
+                    _put_until_done(batches, item, done, process)
+        finally:
+            for batches, done, process in channels:
+                _put_until_done(batches, None, done, process)
+        
+        # Результаты собираются, пока их могут прислать живые процессы
+        collected = {}
+        while len(collected) < len(group):
+            try:
+                index, result, error = results.get(timeout=1)
+                collected[index] = (result, error)
+            except Empty:
+                if not any(process.is_alive() for _, _, process in channels):
+                    break
+        
+        for batches, done, process in channels:
+            # Недочитанные батчи сошедшихся воркеров не должны держать выход
+            batches.cancel_join_thread()
+            process.join()
+        for index, (_, layout_name) in enumerate(group):
+            lost = RuntimeError(f"Процесс анализа {layout_name} завершился без результата")
+            result, error = collected.get(index, (None, lost))
+            outcomes.append((layout_name, result, error))
+    
+    return outcomes
+
 def analyze_multiple_layouts(layout_files: List[Tuple[str, str]], 
                            text_file: str,
-                           max_samples_per_layout: int = 100000) -> Dict[str, Any]:
+                           max_samples_per_layout: Optional[int] = 100000,
+                           ngram_store: Optional[str] = None,
+                           weighted: bool = False,
+                           workers: Optional[int] = None,
+                           lengths: Tuple[int, ...] = NGRAM_LENGTHS,
+                           heavy_hitters: Optional[int] = None,
+                           sampling: str = 'first',
+                           seed: Optional[int] = None,
+                           bootstrap: int = 0,
+                           text_type: str = 'words',
+                           tolerance: Optional[float] = None,
+                           confidence: float = 0.95,
+                           engine: str = 'python') -> Dict[str, Any]:
     """
-    Анализирует несколько раскладок и сравнивает результаты
+    Анализирует несколько раскладок и сравнивает результаты.
+    Выборка, частотный список или хранилище n-грамм читаются один раз
+    (см. _load_shared_corpus), затем раскладки анализируются в пуле из workers
+    процессов (None - по числу ядер, 1 - последовательно в текущем процессе);
+    результаты идут в порядке layout_files.
+    С ngram_store корпус читается один раз при построении хранилища n-грамм,
+    weighted - файл является частотным списком "слово частота",
+    max_samples_per_layout=None или text_type='text' - весь корпус (сплошной
+    текст) анализируется потоково: батчи одного чтения раздаются процессам
+    раскладок (см. _analyze_layouts_streaming); tolerance / confidence -
+    ранняя остановка этого анализа, как в analyze_layout_comprehensive,
+    lengths - длины анализируемых последовательностей, heavy_hitters - бюджет
+    памяти на приближенный подсчет частых последовательностей (см. SpaceSavingCounter),
+    sampling / seed / bootstrap - способ выборки слов и доверительные интервалы,
+    как в analyze_layout_comprehensive; все раскладки анализируются на одной выборке.
+    engine - движок классификации окон для каждой раскладки (см. COMFORT_ENGINES).
     """
+    lengths = normalize_lengths(lengths)
     all_results = {}
     comparison_data = {
         'layouts': [],
         'by_length_comparison': {
-            2: {'layouts': [], 'comfortable': [], 'partial': [], 'uncomfortable': []},
-            3: {'layouts': [], 'comfortable': [], 'partial': [], 'uncomfortable': []},
-            4: {'layouts': [], 'comfortable': [], 'partial': [], 'uncomfortable': []},
-            5: {'layouts': [], 'comfortable': [], 'partial': [], 'uncomfortable': []}
+            length: {'layouts': [], 'comfortable': [], 'partial': [], 'uncomfortable': []}
+            for length in lengths
         },
         'goodness_scores': [],
         'overall_comfort': {'layouts': [], 'comfortable': [], 'partial': [], 'uncomfortable': []},
@@ -857,85 +2844,52 @@ def analyze_multiple_layouts(layout_files: List[Tuple[str, str]],
         'total_words_analyzed': 0
     }
     
+    layouts = []
     for layout_file, layout_name in layout_files:
+        try:
+            layouts.append((load_layout_from_json(layout_file), layout_name))
+        except Exception as e:
+            print(f"❌ Ошибка при загрузке раскладки {layout_name}: {str(e)}")
+    
+    if workers is None:
+        workers = min(len(layouts), os.cpu_count() or 1)
+    
+    streaming = text_type == 'text' or (max_samples_per_layout is None and ngram_store is None and not weighted)
+    if streaming:
+        options = {'text_type': text_type, 'lengths': lengths, 'heavy_hitters': heavy_hitters,
+                   'tolerance': tolerance, 'confidence': confidence, 'engine': engine}
+        outcomes = _analyze_layouts_streaming(layouts, text_file, workers, options)
+    else:
+        # Корпус читается один раз, раскладки анализируются параллельно
+        corpus = _load_shared_corpus(text_file, max_samples_per_layout, ngram_store, weighted, lengths,
+                                     sampling, seed)
+        print(f"\n📚 Корпус прочитан: {corpus['words_collected']:,} слов, "
+              f"{len(corpus['counts']):,} различных {'n-грамм' if corpus['mode'] == 'ngrams' else 'слов'}")
+        outcomes = _analyze_shared_layouts(layouts, corpus, text_file, workers, lengths, heavy_hitters,
+                                           bootstrap, seed, engine)
+    
+    # Результаты собираются в порядке раскладок
+    for layout_name, result, error in outcomes:
         print(f"\n{'='*60}")
-        print(f"НАЧИНАЕМ АНАЛИЗ РАСКЛАДКИ: {layout_name}")
+        print(f"РЕЗУЛЬТАТЫ РАСКЛАДКИ: {layout_name}")
         print(f"{'='*60}")
         
-        try:
-            layout_config = load_layout_from_json(layout_file)
-            result = analyze_layout_comprehensive(
-                layout_config, 
-                layout_name, 
-                text_file,
-                max_samples_per_layout
-            )
-            
-            all_results[layout_name] = result
-            
-            # Сохраняем результаты для сравнения
-            comparison_data['layouts'].append(layout_name)
-            comparison_data['total_words_analyzed'] += result['words_analyzed']
-            
-            # Данные по длинам для сравнения
-            for length in [2, 3, 4, 5]:
-                plot_data = result['plot_data']
-                idx = list(plot_data['by_length']['lengths']).index(f'{length} символа' if length != 5 else '5 символов')
-                
-                comparison_data['by_length_comparison'][length]['layouts'].append(layout_name)
-                comparison_data['by_length_comparison'][length]['comfortable'].append(
-                    plot_data['by_length']['comfortable_percent'][idx]
-                )
-                comparison_data['by_length_comparison'][length]['partial'].append(
-                    plot_data['by_length']['partial_percent'][idx]
-                )
-                comparison_data['by_length_comparison'][length]['uncomfortable'].append(
-                    plot_data['by_length']['uncomfortable_percent'][idx]
-                )
-            
-            # Общая удобность
-            comparison_data['overall_comfort']['layouts'].append(layout_name)
-            comparison_data['overall_comfort']['comfortable'].append(
-                result['plot_data']['overall_stats']['comfortable_percent']
-            )
-            comparison_data['overall_comfort']['partial'].append(
-                result['plot_data']['overall_stats']['partial_percent']
-            )
-            comparison_data['overall_comfort']['uncomfortable'].append(
-                result['plot_data']['overall_stats']['uncomfortable_percent']
-            )
-            
-            # Goodness scores
-            comparison_data['goodness_scores'].append({
-                'layout': layout_name,
-                'score': result['goodness_score'],
-                'normalized': result['normalized_score'],
-                'top_two_load': result['comprehensive_stats']['finger_analysis']['top_two_fingers_load'],
-                'max_distance': result['comprehensive_stats']['finger_analysis']['overall_max_distance']
-            })
-            
-            # Статистика по модификаторам
-            modifier_stats = result['comprehensive_stats']['finger_analysis'].get('modifier_stats', {})
-            comparison_data['modifier_stats'].append({
-                'layout': layout_name,
-                'shift_percent': modifier_stats.get('shift_percent', 0),
-                'alt_percent': modifier_stats.get('alt_percent', 0),
-                'sequences_with_modifiers': result['plot_data']['overall_stats'].get('modifiers_percent', 0)
-            })
-            
-            # Выводим сводку
-            print_analysis_summary(result)
-            
-            # Сохраняем результаты
-            save_analysis_results(result)
-            
-        except Exception as e:
-            print(f"❌ Ошибка при анализе раскладки {layout_name}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        if error is not None:
+            print(f"❌ Ошибка при анализе раскладки {layout_name}: {str(error)}")
+            traceback.print_exception(error)
             continue
+        
+        all_results[layout_name] = result
+        _add_layout_to_comparison(comparison_data, layout_name, result)
+        
+        # Выводим сводку
+        print_analysis_summary(result)
+        
+        # Сохраняем результаты
+        save_analysis_results(result)
     
-    # Сохраняем данные для сравнения
+    # Сохраняем данные для сравнения (папки может не быть, если ни одна раскладка не проанализирована)
+    os.makedirs("analysis_results", exist_ok=True)
     comparison_file = os.path.join("analysis_results", "layout_comparison.json")
     with open(comparison_file, 'w', encoding='utf-8') as f:
         json.dump(comparison_data, f, ensure_ascii=False, indent=2)
@@ -998,7 +2952,7 @@ if __name__ == "__main__":
         results = analyze_multiple_layouts(
             valid_layouts,
             TEXT_FILE,
-            max_samples_per_layout=500000  
+            max_samples_per_layout=None  # Весь корпус, потоково
         )
         
         print("\n🎯 АНАЛИЗ ВСЕХ РАСКЛАДОК ЗАВЕРШЕН!")
\ No newline at end of file
@@ -1,10 +1,18 @@
-from typing import Dict, List, Tuple, Set, Any, Generator
+from typing import Dict, List, Tuple, Set, Any, Generator, Optional
 import json
 from collections import defaultdict, Counter
 import math
 import os
+import random
+import re
 from tqdm import tqdm
 
+# Размер чанка сплошного текста: анализ чанка держит в памяти все его пары
+TEXT_CHUNK_SIZE = 64 * 1024
+
+# Ряд пробельных символов сплошного текста - одно нажатие пробела
+WHITESPACE_RUN = re.compile(r'\s+')
+
 class LayoutAnalyzer:
     def __init__(self, layout_config: Dict[str, Any]):
         """
@@ -38,9 +46,12 @@ class LayoutAnalyzer:
         else:
             return f"{hand}m"
     
-    def analyze_word_sequences(self, word: str) -> Dict[str, Any]:
+    def analyze_word_sequences(self, word: str, carried: int = 0) -> Dict[str, Any]:
         """
         Анализирует последовательности в слове (совместимость со старым форматом)
+        
+        carried - сколько первых символов уже проанализировано в прошлом
+        фрагменте сплошного текста: окна целиком из них не считаются повторно
         """
         if len(word) < 2:
             return {
@@ -59,7 +70,7 @@ class LayoutAnalyzer:
         same_finger_sequences = 0
         
         # Анализируем все последовательности длиной 2
-        for i in range(len(word) - 1):
+        for i in range(max(0, carried - 1), len(word) - 1):
             seq = word[i:i+2]
             char1, char2 = seq[0], seq[1]
             
@@ -92,7 +103,7 @@ class LayoutAnalyzer:
                 same_finger_sequences += 1
         
         # Анализируем направление (для последовательностей из 3+ символов)
-        for i in range(len(word) - 2):
+        for i in range(max(0, carried - 2), len(word) - 2):
             seq = word[i:i+3]
             if all(c in self.position_map for c in seq):
                 direction_change = self._check_direction_change(seq)
@@ -704,6 +715,42 @@ def read_words_by_lines(file_path: str, batch_size: int = 1000,
     if current_batch:
         yield current_batch
 
+def read_text_fragments(file_path: str, chunk_size: int = TEXT_CHUNK_SIZE,
+                        encoding: str = 'utf-8') -> Generator[Tuple[str, int, List[str], int], None, None]:
+    """
+    Читает сплошной текст чанками для анализа через границы слов и чанков.
+    Ряды пробельных символов сжимаются в один пробел (одно нажатие).
+    
+    Возвращает (фрагмент, перенесено, слова, байт): фрагмент начинается с
+    двух последних символов прошлого (перенесено - их число), чтобы окна на
+    стыке чанков не терялись и не считались дважды; слова - законченные
+    слова чанка, слово на стыке отдается целиком со следующим чанком.
+    """
+    carry = ''
+    pending = ''
+    
+    with open(file_path, 'r', encoding=encoding) as f:
+        position = 0
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            read_bytes = f.buffer.tell() - position
+            position += read_bytes
+            
+            chunk = WHITESPACE_RUN.sub(' ', chunk)
+            if carry.endswith(' ') and chunk.startswith(' '):
+                chunk = chunk[1:]
+            fragment = carry + chunk
+            words = (pending + chunk).split()
+            pending = words.pop() if words and not fragment.endswith(' ') else ''
+            
+            yield fragment, len(carry), words, read_bytes
+            carry = fragment[-2:]
+    
+    if pending:
+        yield '', 0, [pending], 0
+
 def count_lines_in_file(file_path: str, encoding: str = 'utf-8') -> int:
     """Считает количество строк в файле"""
     try:
@@ -717,18 +764,45 @@ def analyze_layout_comfort_from_file(layout_config: Dict[str, Any],
                                    file_type: str = 'words',
                                    batch_size: int = 1000,
                                    encoding: str = 'utf-8',
-                                   max_samples_for_plots: int = 10000) -> Dict[str, Any]:
+                                   max_samples_for_plots: int = 10000,
+                                   plot_sampling: str = 'first',
+                                   seed: Optional[int] = None) -> Dict[str, Any]:
     """
     Анализирует удобность раскладки из файла с ВСЕГДА доступными данными для графиков
+    
+    plot_sampling - как выбираются слова для графиков: 'first' - первые
+    max_samples_for_plots слов, 'reservoir' - равномерная случайная выборка
+    по всему файлу за тот же проход (резервуарная выборка, зерно seed)
+    
+    file_type='text' - файл является сплошным текстом: он анализируется
+    за один проход чанками (см. read_text_fragments), пары и тройки символов
+    проходят через пробелы, знаки препинания и стыки чанков; пробел и знаки
+    учитываются как нажатия, если они есть в раскладке. Графики строятся
+    по выборке слов текста.
     """
     analyzer = LayoutAnalyzer(layout_config)
     
-    if file_type == 'words':
-        total_words = count_lines_in_file(file_path, encoding)
-        
+    if file_type in ('words', 'text'):
         # Собираем слова для анализа графиков
         plot_words = []
-        word_generator = read_words_by_lines(file_path, batch_size, encoding)
+        rng = random.Random(seed)
+        seen_words = 0
+        
+        # Батчи: (слова, фрагменты для анализа с числом перенесенных символов, прогресс)
+        if file_type == 'words':
+            total_words = count_lines_in_file(file_path, encoding)
+            batches = ((batch, [(word, 0) for word in batch], len(batch))
+                       for batch in read_words_by_lines(file_path, batch_size, encoding))
+            if total_words:
+                pbar = tqdm(total=total_words, desc="Анализ удобности")
+            else:
+                pbar = tqdm(desc="Анализ удобности")
+        else:
+            fragments = read_text_fragments(file_path, TEXT_CHUNK_SIZE, encoding)
+            batches = ((words, [(fragment, carried)], read_bytes)
+                       for fragment, carried, words, read_bytes in fragments)
+            pbar = tqdm(total=os.path.getsize(file_path), desc="Анализ удобности текста",
+                        unit="B", unit_scale=True)
         
         # Промежуточные переменные для статистики
         total_sequences = 0
@@ -740,13 +814,8 @@ def analyze_layout_comfort_from_file(layout_config: Dict[str, Any],
         total_characters = 0
         sequence_types = Counter()
         
-        if total_words:
-            pbar = tqdm(total=total_words, desc="Анализ удобности")
-        else:
-            pbar = tqdm(desc="Анализ удобности")
-        
         try:
-            for batch in word_generator:
+            for batch, fragments, progress in batches:
                 batch_sequences = 0
                 batch_hand_changes = 0
                 batch_direction_changes = 0
@@ -756,18 +825,24 @@ def analyze_layout_comfort_from_file(layout_config: Dict[str, Any],
                 
                 for word in batch:
                     # Собираем слова для графиков (до максимального количества)
+                    seen_words += 1
                     if len(plot_words) < max_samples_for_plots:
                         plot_words.append(word)
-                    
+                    elif plot_sampling == 'reservoir':
+                        index = rng.randrange(seen_words)
+                        if index < max_samples_for_plots:
+                            plot_words[index] = word
+                
+                for fragment, carried in fragments:
                     # Анализируем последовательности
-                    analysis = analyzer.analyze_word_sequences(word)
+                    analysis = analyzer.analyze_word_sequences(fragment, carried)
                     
                     batch_sequences += analysis['total_sequences']
                     batch_hand_changes += analysis['hand_changes']
                     batch_direction_changes += analysis['direction_changes']
                     batch_same_hand += analysis['same_hand_sequences']
                     batch_same_finger += analysis['same_finger_sequences']
-                    batch_chars += len(word)
+                    batch_chars += len(fragment) - carried
                     
                     for seq_analysis in analysis['sequence_analysis']:
                         sequence_types[seq_analysis['type']] += 1
@@ -780,7 +855,7 @@ def analyze_layout_comfort_from_file(layout_config: Dict[str, Any],
                 total_characters += batch_chars
                 processed_words += len(batch)
                 
-                pbar.update(len(batch))
+                pbar.update(progress)
                 pbar.set_postfix({
                     'слов': processed_words,
                     'пар_символов': total_sequences
@@ -834,6 +909,9 @@ def analyze_layout_comfort_from_file(layout_config: Dict[str, Any],
             'sequence_type_distribution': dict(sequence_types)
         }
         
+        if file_type == 'text':
+            result['text_type'] = 'continuous'
+        
         # ВСЕГДА добавляем данные для графиков
         if plot_words:
             comprehensive_stats = analyzer.calculate_comprehensive_comfort(plot_words)
@@ -856,7 +934,7 @@ def analyze_layout_comfort_from_file(layout_config: Dict[str, Any],
         return result
     
     else:
-        raise ValueError("Поддерживается только file_type='words'")
+        raise ValueError(f"Неизвестный тип файла '{file_type}'. Поддерживаются: words, text")
 
 def create_empty_plot_data() -> Dict[str, Any]:
     """Создает пустую структуру данных для графиков"""
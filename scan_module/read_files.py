@@ -1,5 +1,22 @@
+import codecs
+import hashlib
+import io
+import mmap
 import os
-from typing import Generator, List
+import re
+from collections import Counter
+from typing import Generator, List, Dict, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # без numpy подсчет по байтам идет через Counter
+    np = None
+
+
+# Однобайтовые пробельные символы (для str.split() они тоже пробельные).
+# В UTF-8 такой байт никогда не встречается внутри многобайтового символа,
+# поэтому граница по нему одновременно граница символа и слова.
+_WHITESPACE_BYTES = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f ]')
 
 
 def get_file_size_mb(filename: str) -> float:
@@ -15,12 +32,9 @@ def get_words_from_file(filename: str) -> list:
     """
     Считывает построчно из файла слова и преобразует
     их в список для удобной обработки.
-    ВНИМАНИЕ: Используйте только для небольших файлов!
+    Загружает весь файл в память; для анализа файлов используйте
+    потоковые функции или MappedCorpus.
     """
-    file_size = get_file_size_mb(filename)
-    if file_size > 50:  # Предупреждение для файлов больше 50MB
-        raise ValueError(f"Файл слишком большой ({file_size:.1f}MB). Используйте get_words_from_file_stream()")
-    
     all_words_from_file = []
     try:
         with open(filename, "r", encoding='utf-8') as file:
@@ -76,6 +90,42 @@ def get_words_from_file_stream(filename: str, batch_size: int = 1000) -> Generat
                 yield batch
 
 
+def parse_weighted_line(line: str) -> Optional[Tuple[str, int]]:
+    """
+    Разбирает строку частотного списка: "слово частота" или "частота слово"
+    (через пробел или табуляцию). Строка без частоты считается одним
+    вхождением слова. Для пустой строки возвращает None.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    
+    parts = line.rsplit(None, 1)
+    if len(parts) == 2 and parts[1].isdigit():
+        return parts[0], int(parts[1])
+    
+    parts = line.split(None, 1)
+    if len(parts) == 2 and parts[0].isdigit():
+        return parts[1], int(parts[0])
+    
+    return line, 1
+
+
+def get_weighted_words_from_file_stream(filename: str, batch_size: int = 1000) -> Generator[List[Tuple[str, int]], None, None]:
+    """
+    Генератор батчей пар (слово, частота) из частотного списка слов
+    (см. parse_weighted_line). Слова с нулевой частотой пропускаются.
+    """
+    for batch in get_words_from_file_stream(filename, batch_size):
+        weighted_batch = []
+        for line in batch:
+            word, count = parse_weighted_line(line)
+            if count > 0:
+                weighted_batch.append((word, count))
+        if weighted_batch:
+            yield weighted_batch
+
+
 def count_lines_in_file(filename: str) -> int:
     """Подсчитывает количество непустых строк в файле"""
     try:
@@ -89,12 +139,9 @@ def count_lines_in_file(filename: str) -> int:
 def get_text_from_file(filename: str) -> str:
     """
     Считывает весь текст из файла как единую строку.
-    ВНИМАНИЕ: Используйте только для небольших файлов!
+    Загружает весь файл в память; для анализа файлов используйте
+    потоковые функции или MappedCorpus.
     """
-    file_size = get_file_size_mb(filename)
-    if file_size > 50:
-        raise ValueError(f"Файл слишком большой ({file_size:.1f}MB). Используйте get_text_from_file_stream()")
-    
     try:
         with open(filename, "r", encoding='utf-8') as file:
             return file.read()
@@ -139,3 +186,293 @@ def count_characters_in_file(filename: str) -> int:
     except UnicodeDecodeError:
         with open(filename, "r", encoding='latin-1') as file:
             return sum(len(chunk) for chunk in iter(lambda: file.read(8192), ''))
+
+
+def _find_range_boundary(file, offset: int, file_size: int, by_lines: bool) -> int:
+    """
+    Ищет ближайшую к offset границу диапазона: начало следующей строки
+    (by_lines=True) или первый однобайтовый пробельный символ.
+    """
+    file.seek(offset)
+    position = offset
+    while position < file_size:
+        block = file.read(65536)
+        if not block:
+            break
+        if by_lines:
+            index = block.find(b'\n')
+            if index >= 0:
+                return position + index + 1
+        else:
+            match = _WHITESPACE_BYTES.search(block)
+            if match:
+                boundary = position + match.start()
+                if block[match.start():match.start() + 1] == b'\n' and boundary > 0:
+                    # Не разрываем пару \r\n: иначе она превратится в два перевода строки
+                    file.seek(boundary - 1)
+                    if file.read(1) == b'\r':
+                        boundary -= 1
+                return boundary
+        position += len(block)
+    return file_size
+
+
+def choose_chunk_size(file_size: int, parts: int = 1) -> int:
+    """
+    Подбирает размер чанка для потоковой обработки: около 64 чанков
+    на диапазон, но не меньше 64 KB и не больше 8 MB.
+    """
+    return min(max(file_size // (max(parts, 1) * 64), 64 * 1024), 8 * 1024 * 1024)
+
+
+def split_file_into_ranges(filename: str, parts: int, by_lines: bool = True) -> List[Tuple[int, int]]:
+    """
+    Делит файл на байтовые диапазоны [start, end) примерно равного размера.
+    Границы выравниваются по началу строки (by_lines=True) или по пробельному
+    символу, поэтому ни строка, ни слово, ни UTF-8 символ не разрезаются.
+    """
+    if not os.path.exists(filename):
+        raise FileNotFoundError(f"Файл не найден: {filename}")
+    
+    file_size = os.path.getsize(filename)
+    if parts <= 1 or file_size == 0:
+        return [(0, file_size)]
+    
+    step = max(file_size // parts, 1)
+    boundaries = [0]
+    with open(filename, "rb") as file:
+        for i in range(1, parts):
+            offset = max(i * step, boundaries[-1])
+            boundary = _find_range_boundary(file, offset, file_size, by_lines)
+            if boundary >= file_size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(file_size)
+    
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+# Однобайтовые кодировки, для которых символы можно считать прямо по байтам
+_SINGLE_BYTE_ENCODINGS = {
+    'ascii', 'iso8859-1', 'iso8859-5', 'cp1251', 'cp1252', 'cp866', 'koi8-r', 'koi8-u', 'mac-cyrillic'
+}
+
+
+class MappedCorpus:
+    """
+    Корпус, отображенный в память через mmap.
+    
+    Выдает большие срезы memoryview без копирования данных; декодирование
+    выполняется только в месте использования. Для однобайтовых кодировок
+    гистограмму символов и количество слов можно получить прямо по байтам,
+    вообще не создавая строк. При передаче в другой процесс объект
+    сериализуется как путь к файлу и заново отображается в воркере,
+    поэтому данные корпуса не копируются через каналы.
+    """
+    
+    def __init__(self, filename: str, encoding: str = 'utf-8'):
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"Файл не найден: {filename}")
+        
+        self.filename = filename
+        self.encoding = encoding
+        self.single_byte = codecs.lookup(encoding).name in _SINGLE_BYTE_ENCODINGS
+        self._file = open(filename, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap не умеет отображать пустые файлы
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self._view = memoryview(self._map)
+    
+    def close(self):
+        """Освобождает отображение и закрывает файл"""
+        self._view.release()
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                # Выданные срезы еще используются: отображение освободится вместе с ними
+                pass
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def __getstate__(self):
+        return {'filename': self.filename, 'encoding': self.encoding}
+    
+    def __setstate__(self, state):
+        self.__init__(state['filename'], state['encoding'])
+    
+    def _align(self, position: int) -> int:
+        """Сдвигает позицию назад к началу UTF-8 символа"""
+        if self.single_byte:
+            return position
+        while position > 0 and 0x80 <= self._map[position] < 0xC0:
+            position -= 1
+        return position
+    
+    def slices(self, start: int = 0, end: int = None,
+               slice_size: int = 8 * 1024 * 1024) -> Generator[memoryview, None, None]:
+        """
+        Генератор срезов memoryview по диапазону [start, end).
+        Срезы не разрезают UTF-8 символы и могут декодироваться независимо.
+        Срезы ссылаются на отображение файла, не копируя данные.
+        """
+        end = self.size if end is None else min(end, self.size)
+        position = start
+        while position < end:
+            cut = min(position + slice_size, end)
+            if cut < end:
+                aligned = self._align(cut)
+                cut = aligned if aligned > position else cut
+            yield self._view[position:cut]
+            position = cut
+    
+    def iter_text(self, start: int = 0, end: int = None,
+                  slice_size: int = 8 * 1024 * 1024) -> Generator[str, None, None]:
+        """
+        Декодирует диапазон срезами. Переводы строк нормализуются так же,
+        как при открытии файла в текстовом режиме.
+        """
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(self.encoding)(), translate=True)
+        for view in self.slices(start, end, slice_size):
+            text = decoder.decode(view)
+            if text:
+                yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+    
+    def iter_word_batches(self, start: int = 0, end: int = None, batch_size: int = 5000,
+                          slice_size: int = 8 * 1024 * 1024) -> Generator[List[str], None, None]:
+        """Генератор батчей слов (одно слово на строку), как в get_words_from_file_stream"""
+        batch = []
+        pending = ''
+        for text in self.iter_text(start, end, slice_size):
+            lines = (pending + text).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                word = line.strip()
+                if word:
+                    batch.append(word)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        
+        word = pending.strip()
+        if word:
+            batch.append(word)
+        if batch:
+            yield batch
+    
+    def char_histogram(self, start: int = 0, end: int = None,
+                       slice_size: int = 8 * 1024 * 1024) -> Dict[str, int]:
+        """
+        Гистограмма символов диапазона, посчитанная прямо по байтам.
+        Доступна только для однобайтовых кодировок. Пары \\r\\n и одиночные \\r
+        учитываются как один \\n, как при чтении в текстовом режиме.
+        """
+        if not self.single_byte:
+            raise ValueError(f"Подсчет по байтам недоступен для кодировки {self.encoding}")
+        
+        byte_counts = [0] * 256
+        crlf_pairs = 0
+        previous = None
+        for view in self.slices(start, end, slice_size):
+            if np is not None:
+                codes = np.frombuffer(view, dtype=np.uint8)
+                counts = np.bincount(codes, minlength=256).tolist()
+                crlf_pairs += int(np.count_nonzero((codes[:-1] == 13) & (codes[1:] == 10)))
+            else:
+                data = bytes(view)
+                counts = [0] * 256
+                for code, count in Counter(data).items():
+                    counts[code] = count
+                crlf_pairs += data.count(b'\r\n')
+            if previous == 13 and len(view) and view[0] == 10:
+                crlf_pairs += 1
+            previous = view[-1] if len(view) else previous
+            for code in range(256):
+                byte_counts[code] += counts[code]
+        
+        histogram = {}
+        for code, count in enumerate(byte_counts):
+            if count:
+                char = bytes([code]).decode(self.encoding, errors='replace')
+                histogram[char] = histogram.get(char, 0) + count
+        
+        if '\r' in histogram:
+            histogram['\n'] = histogram.get('\n', 0) + histogram.pop('\r') - crlf_pairs
+            if not histogram['\n']:
+                del histogram['\n']
+        
+        return histogram
+    
+    def count_words(self, start: int = 0, end: int = None, slice_size: int = 8 * 1024 * 1024) -> int:
+        """
+        Считает слова в диапазоне так же, как str.split(). Для однобайтовых
+        кодировок при наличии numpy считает прямо по байтам.
+        """
+        words = 0
+        in_word = False
+        if self.single_byte and np is not None:
+            is_space = np.array([bytes([code]).decode(self.encoding, errors='replace').isspace()
+                                 for code in range(256)])
+            for view in self.slices(start, end, slice_size):
+                spaces = is_space[np.frombuffer(view, dtype=np.uint8)]
+                if not spaces.size:
+                    continue
+                words += int(np.count_nonzero(spaces[:-1] & ~spaces[1:]))
+                if not spaces[0] and not in_word:
+                    words += 1
+                in_word = not spaces[-1]
+            return words
+        
+        for text in self.iter_text(start, end, slice_size):
+            chunk_words = len(text.split())
+            if chunk_words and in_word and not text[0].isspace():
+                chunk_words -= 1
+            in_word = not text[-1].isspace()
+            words += chunk_words
+        return words
+
+
+def get_words_from_file_range(filename: str, start: int, end: int, batch_size: int = 5000,
+                              encoding: str = 'utf-8') -> Generator[List[str], None, None]:
+    """
+    Генератор батчей слов из байтового диапазона файла (см. split_file_into_ranges).
+    Слова выделяются так же, как в get_words_from_file_stream.
+    """
+    with MappedCorpus(filename, encoding) as corpus:
+        yield from corpus.iter_word_batches(start, end, batch_size)
+
+
+def get_text_from_file_range(filename: str, start: int, end: int, chunk_size: int = 8 * 1024 * 1024,
+                             encoding: str = 'utf-8') -> Generator[str, None, None]:
+    """
+    Генератор чанков текста из байтового диапазона файла (см. split_file_into_ranges).
+    """
+    with MappedCorpus(filename, encoding) as corpus:
+        yield from corpus.iter_text(start, end, chunk_size)
+
+
+def corpus_fingerprint(filename: str, sample_size: int = 1024 * 1024) -> str:
+    """
+    Отпечаток корпуса для кэша гистограмм: путь, размер, время изменения
+    и хэш содержимого. Хэшируются только начало, середина и конец файла
+    (по sample_size байт), чтобы отпечаток большого корпуса считался быстро.
+    """
+    info = os.stat(filename)
+    content_hash = hashlib.sha1()
+    with open(filename, 'rb') as file:
+        for offset in sorted({0, max(info.st_size // 2 - sample_size // 2, 0), max(info.st_size - sample_size, 0)}):
+            file.seek(offset)
+            content_hash.update(file.read(sample_size))
+    
+    source = repr((os.path.abspath(filename), info.st_size, info.st_mtime_ns, content_hash.hexdigest()))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
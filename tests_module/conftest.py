@@ -36,6 +36,13 @@ def sample_rules_old():
     """
     return {"a": 1, "b": 2, "c": 3, "h": 1, "e": 2, "l": 1, "o": 3, "w": 2, "r": 1, "d": 1}
 
+@pytest.fixture
+def sample_rules_new():
+    """
+    Правила с пальцами (новый формат)
+    """
+    return {"h": [1, "ly"], "e": [2, "ls"], "l": [1, "py"], "o": [3, "pm"], "w": [2, "ly"], "r": 1, "d": [1, "ps"]}
+
 @pytest.fixture
 def sample_text():
     """
@@ -128,4 +135,41 @@ def text_generator(sample_text):
     """
     def generator():
         yield sample_text
-    return generator
\ No newline at end of file
+    return generator
+
+@pytest.fixture
+def sample_layout_config():
+    """
+    Небольшая раскладка в формате JSON-файлов example_layouts:
+    буквы обеих рук, символ с Shift, символ с Alt, пробел как клавиша
+    и клавиша пальца без порядка (неизвестное направление)
+    """
+    keys = {
+        "q": ("left", "L1", 1, 1, []), "a": ("left", "L1", 2, 1, []),
+        "w": ("left", "L2", 1, 2, []), "s": ("left", "L2", 2, 2, []),
+        "e": ("left", "L3", 1, 3, []), "d": ("left", "L3", 2, 3, []),
+        "r": ("left", "L4", 1, 4, []), "f": ("left", "L4", 2, 4, []),
+        "t": ("left", "L4", 1, 5, []), "!": ("left", "L1", 0, 1, ["shift"]),
+        "y": ("right", "R1", 1, 6, []), "j": ("right", "R1", 2, 6, []),
+        "u": ("right", "R1", 1, 7, []), "i": ("right", "R2", 1, 8, []),
+        "k": ("right", "R2", 2, 8, []), "o": ("right", "R3", 1, 9, []),
+        "l": ("right", "R3", 2, 9, []), "p": ("right", "R4", 1, 10, []),
+        "ö": ("right", "R3", 1, 9, ["alt"]), "å": ("left", "L1", 2, 1, ["alt"]),
+        "h": ("right", "thumb", 3, 6, []), " ": ("right", "thumb", 4, 6, []),
+    }
+    return {
+        "layout": {
+            char: {"hand": hand, "finger": finger, "row": row, "column": column, "modifiers": modifiers}
+            for char, (hand, finger, row, column, modifiers) in keys.items()
+        }
+    }
+
+@pytest.fixture
+def sample_layout_words():
+    """
+    Слова для анализа удобства раскладки sample_layout_config:
+    повторы, символы вне раскладки, модификаторы и одинаковые буквы
+    """
+    return ["hello", "world", "quiet", "yolk", "poll", "feed", "deaf", "kill", "hello",
+            "jolly", "sweet", "tree", "Xray", "!wow!", "köln", "åsa", "lll", "a", "ok",
+            "top", "riot", "pillow", "street", "yellow", "world", "quiz", "fold", "shop"]
@@ -2,6 +2,7 @@ import pytest
 from database import take_lk_from_db, save_layout_to_db, take_all_data_from_lk, take_lk_names_from_lk
 from database import save_analysis_result, get_analysis_history, get_analysis_statistics
 from database import get_finger_statistics, get_aggregated_finger_statistics
+from database import take_corpus_histogram, save_corpus_histogram
 from db_init import init_tables, make_mok_data, migrate_database
 
 class TestDatabaseSimple:
@@ -260,4 +261,23 @@ class TestDatabaseSimple:
         Тестирует обновление схемы до актуальной версии.
         """
         result = migrate_database()
-        assert result is None
\ No newline at end of file
+        assert result is None
+    
+    def test_corpus_histogram_cache_return_type(self, tmp_path):
+        """
+        Проверяет сохранение и чтение гистограммы корпуса из кэша.
+        Убеждается, что повторное сохранение заменяет запись.
+        Тестирует отсутствие записи для неизвестного отпечатка и
+        создание таблиц кэша в новой базе без init_tables.
+        """
+        db_path = str(tmp_path / "cache.db")
+        assert take_corpus_histogram("unknown_fingerprint", db_path=db_path) is None
+        
+        save_corpus_histogram("test_fingerprint", "test_file.txt", "words", {"a": 3, "b": 1}, 2, db_path=db_path)
+        record_id = save_corpus_histogram("test_fingerprint", "test_file.txt", "words", {"a": 5}, 4, db_path=db_path)
+        assert isinstance(record_id, int)
+        
+        result = take_corpus_histogram("test_fingerprint", "words", db_path=db_path)
+        assert isinstance(result, tuple)
+        assert result == ({"a": 5}, 4)
+        assert take_corpus_histogram("test_fingerprint", "text", db_path=db_path) is None
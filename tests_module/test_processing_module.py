@@ -1,5 +1,8 @@
 import pytest
 from calculate_data import make_processing, validate_rules, make_text_processing, make_processing_stream, make_text_processing_stream
+from calculate_data import CompiledRules, ProcessingStats, make_multi_layout_processing_stream, make_file_processing, list_checkpoints
+from calculate_data import make_weighted_processing_stream
+from collections import Counter
 
 class TestCalculateData:
     
@@ -121,4 +124,681 @@ class TestCalculateData:
         assert isinstance(result, dict)
         assert 'text_type' in result
         assert 'total_words' in result
-        assert 'total_characters' in result
\ No newline at end of file
+        assert 'total_characters' in result
+
+
+class TestCompiledRules:
+    
+    def test_compiled_rules_input_types(self, sample_rules_new):
+        """
+        Тестирует компиляцию правил разных форматов.
+        Проверяет отображение символа в пару (штраф, индекс пальца).
+        Убеждается в отбраковке некорректных типов.
+        """
+        compiled = CompiledRules(sample_rules_new)
+        penalty, finger = compiled.table["h"]
+        assert penalty == 1
+        assert compiled.fingers[finger] == "ly"
+        assert compiled.table["r"] == (1, -1)
+        
+        with pytest.raises(TypeError):
+            CompiledRules("not_dict")
+    
+    def test_compiled_rules_shared_between_engines(self, sample_word_list, sample_rules_new):
+        """
+        Проверяет, что скомпилированные правила дают тот же результат,
+        что и исходный словарь, и могут переиспользоваться.
+        """
+        compiled = CompiledRules(sample_rules_new)
+        expected = make_processing(sample_word_list, sample_rules_new, save_to_db=False)
+        result = make_processing(sample_word_list, compiled, save_to_db=False)
+        assert result == expected
+        assert result['finger_statistics']['ly'] == 2
+        assert result['unknown_characters'] == {"t", "s"}
+        
+        stats = ProcessingStats(compiled)
+        compiled.score_text("hello", stats)
+        assert stats.total_characters == 5
+        assert stats.mistakes == 8
+
+    def test_histogram_engine_matches_python(self, text_generator, word_generator, sample_rules_new):
+        """
+        Проверяет, что гистограммный движок дает тот же результат,
+        что и посимвольный, для текста и для списков слов.
+        Убеждается в отбраковке неизвестного движка.
+        """
+        expected = make_text_processing_stream(text_generator(), sample_rules_new, save_to_db=False)
+        result = make_text_processing_stream(text_generator(), sample_rules_new, save_to_db=False, engine='histogram')
+        assert result == expected
+        
+        expected = make_processing_stream(word_generator(), sample_rules_new, save_to_db=False)
+        result = make_processing_stream(word_generator(), sample_rules_new, save_to_db=False, engine='histogram')
+        assert result == expected
+        
+        with pytest.raises(ValueError):
+            make_processing_stream(word_generator(), sample_rules_new, save_to_db=False, engine='unknown')
+
+    def test_multi_layout_processing_stream(self, word_generator, text_generator, sample_rules_old, sample_rules_new):
+        """
+        Проверяет, что оценка нескольких раскладок за один проход
+        совпадает с раздельной оценкой каждой раскладки.
+        """
+        layouts = {"old": sample_rules_old, "new": sample_rules_new}
+        
+        results = make_multi_layout_processing_stream(word_generator(), layouts, save_to_db=False)
+        assert set(results) == {"old", "new"}
+        for name, rules in layouts.items():
+            expected = make_processing_stream(word_generator(), rules, layout_name=name, save_to_db=False)
+            assert results[name] == expected
+        
+        results = make_multi_layout_processing_stream(text_generator(), layouts, text_type='text', save_to_db=False)
+        expected = make_text_processing_stream(text_generator(), sample_rules_new, layout_name="new", save_to_db=False)
+        assert results["new"] == expected
+
+    def test_multi_layout_text_counts_split_words_once(self, sample_rules_new):
+        """
+        Проверяет, что слово, разрезанное границей чанков сплошного текста,
+        считается один раз, как в make_text_processing_stream.
+        """
+        chunks = ["hello wo", "rld te", "st"]
+        results = make_multi_layout_processing_stream(iter(chunks), {"new": sample_rules_new}, text_type='text', save_to_db=False)
+        expected = make_text_processing_stream(iter(chunks), sample_rules_new, save_to_db=False)
+        assert results["new"]['total_words'] == expected['total_words'] == 3
+
+    def test_numpy_engine_matches_python(self, sample_text, sample_rules_new):
+        """
+        Проверяет, что векторный движок numpy возвращает тот же словарь
+        результатов, что и посимвольный, включая неизвестные символы.
+        """
+        pytest.importorskip("numpy")
+        chunks = [sample_text, "Привет, world!"]
+        expected = make_text_processing_stream(iter(chunks), sample_rules_new, save_to_db=False)
+        result = make_text_processing_stream(iter(chunks), sample_rules_new, save_to_db=False, engine='numpy')
+        assert result == expected
+        assert "П" in result['unknown_characters']
+
+    def test_processing_parallel_matches_stream(self, temp_file, sample_rules_new):
+        """
+        Проверяет, что многопроцессная обработка по байтовым диапазонам
+        дает тот же результат, что и последовательная потоковая.
+        """
+        from read_files import get_words_from_file_stream, get_text_from_file_stream
+        
+        expected = make_processing_stream(get_words_from_file_stream(temp_file), sample_rules_new, save_to_db=False)
+        result = make_file_processing(temp_file, sample_rules_new, save_to_db=False, workers=2)
+        assert result == expected
+        
+        expected = make_text_processing_stream(get_text_from_file_stream(temp_file, chunk_size=3), sample_rules_new, save_to_db=False)
+        result = make_file_processing(temp_file, sample_rules_new, text_type='text', save_to_db=False, workers=2)
+        assert result == expected
+
+    def test_make_processing_without_size_limits(self, sample_word_list, sample_rules_old):
+        """
+        Проверяет, что обработка списка слов и текста не обрезается
+        прежними лимитами (10000 слов / 100000 символов).
+        """
+        words = sample_word_list * 5000
+        result = make_processing(words, sample_rules_old, save_to_db=False)
+        assert result['total_words'] == len(words)
+        
+        text = "hello world " * 20000
+        result = make_text_processing(text, sample_rules_old, save_to_db=False)
+        assert result['total_characters'] == len(text)
+        assert result['total_words'] == 40000
+
+    def test_file_processing_resume_from_checkpoint(self, temp_file, sample_rules_new, tmp_path, monkeypatch):
+        """
+        Проверяет, что прерванный анализ сохраняет контрольную точку
+        и после продолжения дает тот же результат, что и полный проход.
+        """
+        import calculate_data
+        
+        db_path = str(tmp_path / "checkpoints.db")
+        expected = make_file_processing(temp_file, sample_rules_new, save_to_db=False, workers=1)
+        
+        save_range = calculate_data._save_checkpoint_range
+        
+        def interrupt_after_first_range(*args):
+            save_range(*args)
+            raise KeyboardInterrupt
+        
+        monkeypatch.setattr(calculate_data, "_save_checkpoint_range", interrupt_after_first_range)
+        with pytest.raises(KeyboardInterrupt):
+            make_file_processing(temp_file, sample_rules_new, save_to_db=False, workers=1, checkpoint_db=db_path)
+        monkeypatch.undo()
+        
+        checkpoints = list_checkpoints(db_path)
+        assert len(checkpoints) == 1
+        assert 0 < checkpoints[0]['done_bytes'] < checkpoints[0]['total_bytes']
+        
+        result = make_file_processing(temp_file, sample_rules_new, save_to_db=False, workers=1, checkpoint_db=db_path)
+        assert result == expected
+        assert list_checkpoints(db_path) == []
+
+    def test_list_checkpoints_drops_changed_files(self, temp_file, sample_rules_new, tmp_path, monkeypatch):
+        """
+        Проверяет, что контрольная точка файла, измененного после прерывания,
+        не показывается в списке и удаляется из базы.
+        """
+        import calculate_data
+        import sqlite3
+        
+        db_path = str(tmp_path / "checkpoints.db")
+        
+        def interrupt(*args):
+            raise KeyboardInterrupt
+        
+        monkeypatch.setattr(calculate_data, "_save_checkpoint_range", interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            make_file_processing(temp_file, sample_rules_new, save_to_db=False, workers=1, checkpoint_db=db_path)
+        monkeypatch.undo()
+        assert len(list_checkpoints(db_path)) == 1
+        
+        with open(temp_file, 'a') as f:
+            f.write("more\n")
+        
+        assert list_checkpoints(db_path) == []
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM processing_checkpoints").fetchone()[0] == 0
+        conn.close()
+
+    def test_file_processing_uses_corpus_cache(self, temp_file, sample_rules_new, tmp_path, monkeypatch):
+        """
+        Проверяет, что повторный анализ того же корпуса берется из кэша
+        гистограмм без чтения файла и совпадает с обычным результатом,
+        а кэш пишется в переданную базу (таблицы создаются при необходимости).
+        """
+        import calculate_data
+        from database_module.database import take_corpus_histogram
+        from scan_module.read_files import corpus_fingerprint
+        cache_db = str(tmp_path / "cache.db")
+        
+        for text_type in ('words', 'text'):
+            expected = make_file_processing(temp_file, sample_rules_new, text_type=text_type, save_to_db=False, workers=1)
+            result = make_file_processing(temp_file, sample_rules_new, text_type=text_type, save_to_db=False,
+                                          workers=1, use_cache=True, cache_db=cache_db)
+            assert result == expected
+            assert take_corpus_histogram(corpus_fingerprint(temp_file), text_type, db_path=cache_db) is not None
+            
+            with monkeypatch.context() as patch:
+                patch.setattr(calculate_data, "_score_ranges", None)
+                result = make_file_processing(temp_file, sample_rules_new, text_type=text_type, save_to_db=False,
+                                              use_cache=True, cache_db=cache_db)
+            assert result == expected
+
+    def test_weighted_processing_matches_expanded_words(self, sample_rules_new, tmp_path):
+        """
+        Проверяет, что частотный список дает тот же результат,
+        что и список слов, в котором каждое слово повторено по частоте.
+        """
+        weighted = [("hello", 3), ("world", 2), ("test", 1)]
+        expanded = [word for word, count in weighted for _ in range(count)]
+        expected = make_processing(expanded, sample_rules_new, save_to_db=False)
+        
+        result = make_weighted_processing_stream(iter([weighted]), sample_rules_new, save_to_db=False)
+        assert result == expected
+        
+        weighted_file = tmp_path / "weighted.txt"
+        weighted_file.write_text("hello 3\n2 world\ntest\n", encoding='utf-8')
+        result = make_file_processing(str(weighted_file), sample_rules_new, text_type='weighted', save_to_db=False, workers=1)
+        assert result == expected
+
+    def test_text_processing_stream_early_stop(self, sample_text, sample_rules_new):
+        """
+        Проверяет раннюю остановку: на одинаковых чанках интервал среднего
+        штрафа сходится сразу после минимального числа чанков, а без допуска
+        поток читается целиком и результат не меняется.
+        """
+        from calculate_data import CONVERGENCE_MIN_BATCHES
+        chunks = [sample_text] * (CONVERGENCE_MIN_BATCHES * 5)
+        total_chars = len(sample_text) * len(chunks)
+        
+        result = make_text_processing_stream(iter(chunks), sample_rules_new, total_chars, save_to_db=False, tolerance=1e-6)
+        early_stop = result['early_stop']
+        assert early_stop['converged']
+        assert early_stop['batches'] == CONVERGENCE_MIN_BATCHES
+        assert early_stop['consumed_fraction'] == pytest.approx(0.2)
+        low, high = early_stop['intervals']['avg_errors_per_char']
+        assert low <= result['avg_errors_per_char'] <= high
+        
+        expected = make_text_processing_stream(iter(chunks[:CONVERGENCE_MIN_BATCHES]), sample_rules_new, save_to_db=False)
+        assert {key: value for key, value in result.items() if key != 'early_stop'} == expected
+
+
+class TestLayoutAnalyzer:
+
+    def test_example_reservoir_keeps_unique_examples(self, sample_layout_config, sample_layout_words):
+        """
+        Проверяет, что резервуар примеров не повторяет последовательности,
+        ограничен размером, а слияние по порядку совпадает с одним проходом
+        """
+        from new_processing import ExampleReservoir, LayoutAnalyzer, EXAMPLES_PER_TYPE
+        offers = [('comfortable', seq) for seq in ("ab", "bc", "ab", "cd", "de")] + [('partial', "ab")]
+        
+        reservoir = ExampleReservoir(size=3)
+        accepted = [reservoir.offer(comfort_type, seq, lambda seq=seq: {'sequence': seq}) for comfort_type, seq in offers]
+        
+        assert accepted == [True, True, False, True, False, True]
+        assert [example['sequence'] for example in reservoir.examples['comfortable']] == ["ab", "bc", "cd"]
+        assert reservoir.is_full('comfortable') and not reservoir.is_full()
+        
+        # Слияние резервуаров по порядку батчей совпадает с одним проходом
+        first, second = ExampleReservoir(size=3), ExampleReservoir(size=3)
+        for part_reservoir, part in ((first, offers[:2]), (second, offers[2:])):
+            for comfort_type, seq in part:
+                part_reservoir.offer(comfort_type, seq, lambda seq=seq: {'sequence': seq})
+        first.merge(second)
+        assert first.examples == reservoir.examples
+        
+        stats = LayoutAnalyzer(sample_layout_config, "sample").calculate_comprehensive_analysis(sample_layout_words)
+        for examples in stats['comfort_examples'].values():
+            sequences = [example['sequence'] for example in examples]
+            assert len(sequences) == len(set(sequences)) <= EXAMPLES_PER_TYPE
+
+    def test_multiple_layouts_parallel_matches_serial(self, sample_layout_config, sample_layout_words,
+                                                      tmp_path, monkeypatch):
+        """Проверяет, что сравнение раскладок в пуле процессов совпадает с последовательным"""
+        import json
+        from new_processing import analyze_multiple_layouts
+        monkeypatch.chdir(tmp_path)
+        mirrored = {"layout": {char: dict(key, hand="right" if key["hand"] == "left" else "left")
+                               for char, key in sample_layout_config["layout"].items()}}
+        layout_files = []
+        for name, layout_config in (("sample", sample_layout_config), ("mirrored", mirrored)):
+            layout_file = tmp_path / f"{name}.json"
+            layout_file.write_text(json.dumps(layout_config, ensure_ascii=False), encoding="utf-8")
+            layout_files.append((str(layout_file), name))
+        text_file = tmp_path / "words.txt"
+        text_file.write_text("\n".join(sample_layout_words * 3) + "\n", encoding="utf-8")
+        
+        serial = analyze_multiple_layouts(layout_files, str(text_file), workers=1)
+        parallel = analyze_multiple_layouts(layout_files, str(text_file), workers=2)
+        
+        assert serial['comparison_data']['layouts'] == ["sample", "mirrored"]
+        assert serial['comparison_data']['total_words_analyzed'] > 0
+        assert parallel['comparison_data'] == serial['comparison_data']
+
+    def test_multiple_layouts_streaming(self, sample_layout_config, sample_layout_words, tmp_path, monkeypatch):
+        """
+        Проверяет потоковое сравнение раскладок (весь корпус и сплошной текст):
+        процессы, получающие батчи одного чтения, дают то же, что анализ каждой
+        раскладки отдельно, а tolerance доходит до каждой раскладки.
+        """
+        import json
+        from new_processing import analyze_multiple_layouts, analyze_layout_comprehensive
+        monkeypatch.chdir(tmp_path)
+        layout_file = tmp_path / "sample.json"
+        layout_file.write_text(json.dumps(sample_layout_config, ensure_ascii=False), encoding="utf-8")
+        layout_files = [(str(layout_file), "first"), (str(layout_file), "second")]
+        text_file = tmp_path / "words.txt"
+        text_file.write_text("\n".join(sample_layout_words * 3) + "\n", encoding="utf-8")
+        
+        for options in ({'max_samples_per_layout': None}, {'text_type': 'text', 'tolerance': 100}):
+            serial = analyze_multiple_layouts(layout_files, str(text_file), workers=1, **options)
+            parallel = analyze_multiple_layouts(layout_files, str(text_file), workers=2, **options)
+            assert parallel['comparison_data'] == serial['comparison_data']
+            
+            single = analyze_layout_comprehensive(sample_layout_config, "first", str(text_file),
+                                                  max_samples=None, text_type=options.get('text_type', 'words'),
+                                                  tolerance=options.get('tolerance'))
+            for layout_name, result in parallel['individual_results'].items():
+                assert result['plot_data'] == dict(single['plot_data'], layout_name=layout_name)
+                assert result['words_analyzed'] == single['words_analyzed']
+                assert ('early_stop' in result['comprehensive_stats']) == ('tolerance' in options)
+        
+        early_stop = parallel['individual_results']['second']['comprehensive_stats']['early_stop']
+        assert early_stop['tolerance'] == 100 and early_stop['consumed_fraction'] == 1.0
+
+    def test_multiple_layouts_engine(self, sample_layout_config, sample_layout_words, tmp_path, monkeypatch):
+        """Проверяет, что движок доходит до анализа каждой раскладки и при выборке, и в потоке"""
+        pytest.importorskip("numpy")
+        import json
+        from new_processing import analyze_multiple_layouts
+        monkeypatch.chdir(tmp_path)
+        layout_file = tmp_path / "sample.json"
+        layout_file.write_text(json.dumps(sample_layout_config, ensure_ascii=False), encoding="utf-8")
+        layout_files = [(str(layout_file), "sample")]
+        text_file = tmp_path / "words.txt"
+        text_file.write_text("\n".join(sample_layout_words * 3) + "\n", encoding="utf-8")
+        
+        for options in ({'workers': 1}, {'workers': 2, 'max_samples_per_layout': None}):
+            python = analyze_multiple_layouts(layout_files, str(text_file), engine='python', **options)
+            array = analyze_multiple_layouts(layout_files, str(text_file), engine='numpy', **options)
+            assert array['comparison_data'] == python['comparison_data']
+            unknown = analyze_multiple_layouts(layout_files, str(text_file), engine='unknown', **options)
+            assert unknown['individual_results'] == {}
+
+    def test_custom_lengths_labels(self, sample_layout_config, sample_layout_words):
+        """Проверяет, что нестандартные длины последовательностей дают те же ключи by_length и подписи графиков"""
+        from new_processing import LayoutAnalyzer, normalize_lengths, length_label
+        assert normalize_lengths([6, 3, 3]) == (3, 6)
+        assert [length_label(length) for length in (2, 5, 11, 21, 22)] == \
+            ['2 символа', '5 символов', '11 символов', '21 символ', '22 символа']
+        with pytest.raises(ValueError):
+            normalize_lengths([1, 3])
+        with pytest.raises(ValueError):
+            normalize_lengths([])
+        
+        analyzer = LayoutAnalyzer(sample_layout_config, "sample", lengths=(6, 3))
+        stats = analyzer.calculate_comprehensive_analysis(sample_layout_words)
+        plot_data = analyzer.prepare_plot_data(stats)
+        
+        assert analyzer.lengths == (3, 6)
+        assert list(stats['by_length']) == [3, 6]
+        assert stats['by_length'][6]['total'] > 0
+        assert plot_data['by_length']['lengths'] == ['3 символа', '6 символов']
+        assert plot_data['by_length']['total'] == [stats['by_length'][3]['total'], stats['by_length'][6]['total']]
+        assert all(len(seq) in (3, 6) for comfort_type in ('comfortable', 'partial', 'uncomfortable')
+                   for seq in stats[f'top_{comfort_type}_sequences'])
+
+    def test_space_saving_exact_within_capacity(self, sample_layout_config, sample_layout_words):
+        """
+        Проверяет, что Space-Saving считает точно, пока различных ключей не
+        больше емкости, а анализ с heavy_hitters дает те же частые последовательности
+        """
+        from new_processing import LayoutAnalyzer, SpaceSavingCounter
+        frequencies = Counter({"ab": 5, "bc": 3, "cd": 7, "de": 1})
+        counter = SpaceSavingCounter(len(frequencies))
+        counter.update(dict(frequencies))
+        counter.update({"cd": 2, "ab": 1})
+        frequencies.update({"cd": 2, "ab": 1})
+        
+        assert dict(counter.items()) == dict(frequencies)
+        assert set(counter.errors.values()) == {0}
+        assert counter.max_error() == 0
+        assert counter.total == sum(frequencies.values())
+        
+        exact = LayoutAnalyzer(sample_layout_config, "sample").calculate_comprehensive_analysis(sample_layout_words)
+        approximate = LayoutAnalyzer(sample_layout_config, "sample",
+                                     heavy_hitters=10000).calculate_comprehensive_analysis(sample_layout_words)
+        for comfort_type in ('comfortable', 'partial', 'uncomfortable'):
+            assert approximate[f'top_{comfort_type}_sequences'] == exact[f'top_{comfort_type}_sequences']
+            assert set(approximate[f'top_{comfort_type}_sequences_error'].values()) <= {0}
+        assert approximate['by_length'] == exact['by_length']
+
+    def test_ngram_store_round_trip_and_rebuild(self, tmp_path, monkeypatch):
+        """
+        Проверяет, что хранилище n-грамм читается так же, как было записано,
+        повторно не строится для неизмененного корпуса и пересоздается после
+        изменения времени модификации корпуса
+        """
+        import os
+        import new_processing
+        from new_processing import get_ngram_store, load_ngram_store
+        corpus = tmp_path / "words.txt"
+        corpus.write_text("abc\nabc\nbcd\nxy\n", encoding="utf-8")
+        store_path = str(tmp_path / "words.ngrams.gz")
+        
+        store = get_ngram_store(str(corpus), store_path=store_path, min_count=2, lengths=(2, 3))
+        assert store['ngrams'] == {"ab": 2, "bc": 3, "abc": 2}
+        assert store['meta']['min_count'] == 2 and store['meta']['pruned_ngrams'] == 3
+        assert store['meta']['lengths'] == [2, 3] and store['meta']['total_words'] == 4
+        assert store['meta']['pruned_occurrences'] == 3 and store['meta']['total_lines'] == 4
+        assert load_ngram_store(store_path) == store
+        
+        build_ngram_counts = new_processing.build_ngram_counts
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("хранилище не должно пересоздаваться")
+        
+        monkeypatch.setattr(new_processing, "build_ngram_counts", fail)
+        assert get_ngram_store(str(corpus), store_path=store_path, min_count=2, lengths=(2,)) == store
+        
+        # Тот же размер файла, другое содержимое и время изменения
+        corpus.write_text("xyz\nxyz\nyzw\nab\n", encoding="utf-8")
+        mtime = os.stat(corpus).st_mtime_ns + 10 ** 9
+        os.utime(corpus, ns=(mtime, mtime))
+        monkeypatch.setattr(new_processing, "build_ngram_counts", build_ngram_counts)
+        
+        rebuilt = get_ngram_store(str(corpus), store_path=store_path, min_count=2, lengths=(2, 3))
+        assert rebuilt['ngrams'] == {"xy": 2, "yz": 3, "xyz": 2}
+        assert rebuilt['meta']['file_mtime_ns'] == mtime
+        assert load_ngram_store(store_path) == rebuilt
+
+
+    def test_stream_analysis_early_stop(self, sample_layout_config, sample_layout_words):
+        """
+        Проверяет раннюю остановку потока: при широком допуске чтение
+        прекращается после CONVERGENCE_MIN_BATCHES батчей, результат совпадает
+        с анализом этих батчей, а при узком допуске читается весь поток
+        """
+        from new_processing import LayoutAnalyzer, ConvergenceMonitor, CONVERGENCE_MIN_BATCHES
+        with pytest.raises(ValueError):
+            ConvergenceMonitor(0)
+        batches = [sample_layout_words[i % 11:i % 11 + 12] for i in range(40)]
+        
+        stopped = LayoutAnalyzer(sample_layout_config, "sample").calculate_stream_analysis(iter(batches), tolerance=100)
+        expected = LayoutAnalyzer(sample_layout_config, "sample").calculate_stream_analysis(
+            iter(batches[:CONVERGENCE_MIN_BATCHES]))
+        early_stop = stopped.pop('early_stop')
+        
+        assert early_stop['converged'] and early_stop['batches'] == CONVERGENCE_MIN_BATCHES
+        assert stopped == expected
+        for comfort_type in ('comfortable', 'partial', 'uncomfortable'):
+            low, high = early_stop['intervals'][f'{comfort_type}_percent']
+            assert low <= expected['overall'][f'{comfort_type}_percent'] <= high
+        
+        full = LayoutAnalyzer(sample_layout_config, "sample").calculate_stream_analysis(iter(batches), tolerance=1e-9)
+        assert not full['early_stop']['converged'] and full['early_stop']['batches'] == len(batches)
+        assert full['total_words'] == sum(len([word for word in batch if len(word) >= 2]) for batch in batches)
+
+    def test_parallel_analysis_matches_serial(self, sample_layout_config, monkeypatch):
+        """
+        Проверяет, что частотный и потоковый анализ в пуле процессов совпадают
+        с последовательными, включая точку ранней остановки потока
+        """
+        from itertools import product
+        import new_processing
+        from new_processing import LayoutAnalyzer
+        monkeypatch.setattr(new_processing, "PARALLEL_BATCH_WORDS", 200)
+        words = ["".join(letters) for letters in product("asdfjkl", repeat=3)]
+        word_counts = {word: index % 7 + 1 for index, word in enumerate(words)}
+        batches = [words[i:i + 40] for i in range(0, len(words), 15)]
+        
+        def analyze(method, *args, **kwargs):
+            return [getattr(LayoutAnalyzer(sample_layout_config, "sample"), method)(*args, workers=workers, **kwargs)
+                    for workers in (1, 2)]
+        
+        serial, parallel = analyze('calculate_weighted_analysis', word_counts)
+        assert serial['total_sequences'] > 0
+        assert parallel == serial
+        
+        serial, parallel = analyze('calculate_stream_analysis', batches)
+        assert parallel == serial
+        
+        serial, parallel = analyze('calculate_stream_analysis', batches, tolerance=100)
+        assert serial['early_stop']['batches'] < len(batches)
+        assert parallel == serial
+
+    def test_heavy_hitters_force_serial_analysis(self, sample_layout_config, sample_layout_words, monkeypatch):
+        """Проверяет, что с heavy_hitters анализ при workers > 1 выполняется последовательно"""
+        from new_processing import LayoutAnalyzer
+        serial = LayoutAnalyzer(sample_layout_config, "sample", heavy_hitters=5).calculate_comprehensive_analysis(
+            sample_layout_words)
+        
+        def fail(self, *args, **kwargs):
+            raise AssertionError("с heavy_hitters пул процессов не используется")
+        
+        monkeypatch.setattr(LayoutAnalyzer, "_parallel_batch_stats", fail)
+        analyzer = LayoutAnalyzer(sample_layout_config, "sample", heavy_hitters=5)
+        
+        assert not analyzer._parallel_enabled(2)
+        assert analyzer.calculate_comprehensive_analysis(sample_layout_words, workers=2) == serial
+        assert analyzer.calculate_stream_analysis([sample_layout_words], workers=2) == \
+            LayoutAnalyzer(sample_layout_config, "sample", heavy_hitters=5).calculate_stream_analysis([sample_layout_words])
+
+    def test_array_engine_matches_python(self, sample_layout_config, sample_layout_words, monkeypatch):
+        """
+        Проверяет, что движок numpy дает те же счетчики, частоты
+        последовательностей и итоговую статистику, что и пословный движок,
+        в том числе при делении слов на несколько батчей
+        """
+        pytest.importorskip("numpy")
+        import new_processing
+        from new_processing import LayoutAnalyzer
+        monkeypatch.setattr(new_processing, "ARRAY_BATCH_WORDS", 5)
+        word_counts = {word: index % 4 + 1 for index, word in enumerate(dict.fromkeys(sample_layout_words))}
+        python_analyzer = LayoutAnalyzer(sample_layout_config, "sample", engine='python')
+        numpy_analyzer = LayoutAnalyzer(sample_layout_config, "sample", engine='numpy')
+        assert numpy_analyzer._array_engine_enabled() and not python_analyzer._array_engine_enabled()
+        
+        # sequence_frequencies удаляются при финализации - сравниваем накопленную статистику
+        raw = []
+        for analyzer in (python_analyzer, numpy_analyzer):
+            total_stats = analyzer._empty_comprehensive_stats(sum(word_counts.values()))
+            analyzer._add_word_counts(total_stats, word_counts.items())
+            raw.append(total_stats)
+        assert raw[0]['total_sequences'] > 0
+        assert raw[1]['sequence_frequencies'] == raw[0]['sequence_frequencies']
+        assert raw[1]['by_length'] == raw[0]['by_length']
+        assert raw[1]['total_sequences'] == raw[0]['total_sequences']
+        
+        expected = python_analyzer.calculate_weighted_analysis(word_counts)
+        result = numpy_analyzer.calculate_weighted_analysis(word_counts)
+        for comfort_type in ('comfortable', 'partial', 'uncomfortable'):
+            assert result[f'top_{comfort_type}_sequences'] == expected[f'top_{comfort_type}_sequences']
+        assert result == expected
+    def test_text_analysis_does_not_depend_on_chunk_size(self, sample_layout_config):
+        """
+        Проверяет, что анализ сплошного текста дает те же счетчики, слова
+        и чередование рук при чтении одним чанком и чанками по 7 символов,
+        а ряды с пробелом (пробел - клавиша раскладки) не попадают в кэш слов.
+        """
+        from new_processing import LayoutAnalyzer
+        text = "hello world, quiet yolk.  poll  feed\ndeaf kill; jolly sweet tree!\tköln åsa lll ok top riot " * 3
+        
+        whole = LayoutAnalyzer(sample_layout_config, "sample").calculate_text_analysis([text])
+        chunked_analyzer = LayoutAnalyzer(sample_layout_config, "sample")
+        chunked = chunked_analyzer.calculate_text_analysis(text[i:i + 7] for i in range(0, len(text), 7))
+        
+        assert whole['total_sequences'] > 0
+        assert chunked['by_length'] == whole['by_length']
+        assert chunked['total_words'] == whole['total_words'] == len(text.split())
+        assert chunked['hand_alternation'] == whole['hand_alternation']
+        
+        analyzer = LayoutAnalyzer(sample_layout_config, "sample")
+        analyzer.calculate_text_analysis(["hello world, quiet yolk. poll feed"])
+        assert analyzer.word_aggregate_cached.cache_info().currsize == 0
+
+    def test_ngram_analysis_reports_uncounted_occurrences(self, sample_layout_config):
+        """
+        Проверяет, что анализ по хранилищу n-грамм сообщает, сколько вхождений
+        пропущено из-за символов вне раскладки и отброшено при создании хранилища
+        """
+        from new_processing import LayoutAnalyzer
+        meta = {'min_count': 2, 'pruned_ngrams': 4, 'pruned_occurrences': 5}
+        stats = LayoutAnalyzer(sample_layout_config, "sample").calculate_ngram_analysis(
+            {"Xr": 2, "ra": 3, "Xra": 1, "ray": 4}, 10, 10, meta)
+        
+        assert stats['total_sequences'] == 7
+        assert stats['ngram_store'] == dict(meta, skipped_occurrences=3)
+
+
+class TestSampling:
+
+    def test_reservoir_sample_size_and_seed(self):
+        """Проверяет размер резервуарной выборки, число слов потока и повторяемость при одном зерне"""
+        from new_processing import reservoir_sample
+        words = [f"w{i}" for i in range(1000)]
+        
+        sample, total = reservoir_sample(iter(words), 50, seed=7)
+        assert total == 1000
+        assert len(sample) == len(set(sample)) == 50
+        assert set(sample) <= set(words)
+        assert reservoir_sample(iter(words), 50, seed=7)[0] == sample
+        
+        short, total = reservoir_sample(iter(words[:10]), 50, seed=7)
+        assert total == 10 and sorted(short) == sorted(words[:10])
+
+    def test_reservoir_sample_stratified_proportions(self):
+        """Проверяет, что стратифицированная выборка берет из каждой страты длины долю по числу ее слов"""
+        from new_processing import reservoir_sample, word_length_stratum
+        words = ["ab"] * 50 + ["abcdef"] * 30 + ["abcdefghijklmn"] * 20
+        
+        sample, total = reservoir_sample(iter(words), 10, stratify=True, seed=3)
+        strata = Counter(word_length_stratum(word) for word in sample)
+        
+        assert total == 100
+        assert strata == {word_length_stratum("ab"): 5, word_length_stratum("abcdef"): 3,
+                          word_length_stratum("abcdefghijklmn"): 2}
+
+    def test_sample_corpus_words(self, tmp_path):
+        """Проверяет выборку слов корпуса: только слова от 2 символов, число строк файла и повторяемость"""
+        from new_processing import _sample_corpus_words
+        file_path = tmp_path / "words.txt"
+        words = [f"слово{i}" for i in range(300)] + ["я"] * 20
+        file_path.write_text("\n".join(words) + "\n", encoding="utf-8")
+        
+        sample, lines = _sample_corpus_words(str(file_path), 40, 'reservoir', seed=11)
+        
+        assert lines == 320
+        assert len(sample) == 40
+        assert all(len(word) >= 2 for word in sample)
+        assert _sample_corpus_words(str(file_path), 40, 'reservoir', seed=11)[0] == sample
+        assert len(_sample_corpus_words(str(file_path), 40, 'stratified', seed=11)[0]) == 40
+
+    def test_bootstrap_intervals_contain_point(self, sample_layout_config, sample_layout_words):
+        """Проверяет, что бутстрэп-интервалы содержат точечную оценку и повторяются при одном зерне"""
+        from new_processing import LayoutAnalyzer
+        word_counts = Counter({word: index % 5 + 1 for index, word in enumerate(sample_layout_words)})
+        analyzer = LayoutAnalyzer(sample_layout_config, "sample")
+        stats = analyzer.calculate_weighted_analysis(dict(word_counts))
+        
+        for stratify in (False, True):
+            intervals = analyzer.bootstrap_intervals(word_counts, resamples=200, stratify=stratify, seed=5)
+            assert intervals == analyzer.bootstrap_intervals(word_counts, resamples=200, stratify=stratify, seed=5)
+            for comfort_type in ('comfortable', 'partial', 'uncomfortable'):
+                low, high = intervals['overall'][f'{comfort_type}_percent']
+                assert low <= stats['overall'][f'{comfort_type}_percent'] <= high
+            for seq_len, length_intervals in intervals['by_length'].items():
+                low, high = length_intervals['comfortable_percent']
+                assert low <= stats['by_length'][seq_len]['comfortable_percent'] <= high
+
+    def test_sec_seq_reservoir_plot_sampling(self, sample_layout_config, tmp_path):
+        """Проверяет, что резервуарная выборка слов для графиков sec_seq имеет заданный размер и повторяется при одном зерне"""
+        from sec_seq import analyze_layout_comfort_from_file
+        layout_config = {"layout": {char: [key["hand"], key["row"], key["column"]]
+                                    for char, key in sample_layout_config["layout"].items() if char != " "}}
+        file_path = tmp_path / "words.txt"
+        file_path.write_text("\n".join(["hello", "world", "quiet", "yolk", "poll", "feed", "deaf", "kill"] * 25) + "\n",
+                             encoding="utf-8")
+        
+        result = analyze_layout_comfort_from_file(layout_config, str(file_path), max_samples_for_plots=30,
+                                                  plot_sampling='reservoir', seed=2)
+        again = analyze_layout_comfort_from_file(layout_config, str(file_path), max_samples_for_plots=30,
+                                                 plot_sampling='reservoir', seed=2)
+        
+        assert result['plot_data']['sample_info']['sample_size'] == 30
+        assert result['plot_data']['sample_info']['total_words'] == 200
+        assert result['comprehensive_stats'] == again['comprehensive_stats']
+
+    def test_sec_seq_text_file(self, sample_layout_config, tmp_path, monkeypatch):
+        """
+        Проверяет сплошной текст в sec_seq: пары проходят через пробел, ряды
+        пробелов - одно нажатие, а деление на чанки не меняет результат
+        """
+        import sec_seq
+        layout_config = {"layout": {char: [key["hand"], key["row"], key["column"]]
+                                    for char, key in sample_layout_config["layout"].items()}}
+        text = "hello world quiet\n\n  yolk poll, feed deaf kill " * 20
+        file_path = tmp_path / "text.txt"
+        file_path.write_text(text, encoding="utf-8")
+        
+        result = sec_seq.analyze_layout_comfort_from_file(layout_config, str(file_path), file_type='text')
+        monkeypatch.setattr(sec_seq, "TEXT_CHUNK_SIZE", 7)
+        chunked = sec_seq.analyze_layout_comfort_from_file(layout_config, str(file_path), file_type='text')
+        
+        analyzer = sec_seq.LayoutAnalyzer(layout_config)
+        expected = analyzer.analyze_word_sequences(" ".join(text.split()) + " ")
+        assert result['text_type'] == 'continuous'
+        assert result['total_sequences'] == expected['total_sequences']
+        assert result['total_sequences'] > sum(analyzer.analyze_word_sequences(word)['total_sequences']
+                                               for word in text.split())
+        assert result['sequence_statistics']['direction_changes'] == expected['direction_changes']
+        assert result['total_words'] == len(text.split())
+        for key in ('total_sequences', 'total_words', 'total_characters', 'sequence_statistics',
+                    'sequence_type_distribution', 'comprehensive_stats'):
+            assert chunked[key] == result[key]
+        
+        with pytest.raises(ValueError):
+            sec_seq.analyze_layout_comfort_from_file(layout_config, str(file_path), file_type='csv')
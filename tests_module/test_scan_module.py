@@ -1,6 +1,8 @@
 import pytest
 from read_files import get_file_size_mb, get_words_from_file, count_lines_in_file, get_text_from_file, count_characters_in_file
 from read_files import get_words_from_file_stream, get_text_from_file_stream
+from read_files import split_file_into_ranges, get_words_from_file_range, get_text_from_file_range, MappedCorpus
+from read_files import parse_weighted_line, get_weighted_words_from_file_stream
 from read_layout import read_kl, save_layout_to_file, validate_layout
 
 class TestReadFiles:
@@ -165,6 +167,63 @@ class TestReadFiles:
         assert isinstance(chunk, str)
         assert len(chunk) <= 10
     
+    def test_split_file_into_ranges_return_type(self, temp_file):
+        """
+        Проверяет, что диапазоны покрывают файл без пропусков
+        и что границы выровнены по строкам.
+        """
+        import os
+        ranges = split_file_into_ranges(temp_file, 3)
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == os.path.getsize(temp_file)
+        assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+        
+        words = [word for start, end in ranges for batch in get_words_from_file_range(temp_file, start, end) for word in batch]
+        assert words == get_words_from_file(temp_file)
+        
+        text = ''.join(chunk for start, end in split_file_into_ranges(temp_file, 4, by_lines=False)
+                       for chunk in get_text_from_file_range(temp_file, start, end))
+        assert text == get_text_from_file(temp_file)
+    
+    def test_mapped_corpus_return_type(self, temp_file):
+        """
+        Проверяет чтение через mmap: срезы memoryview, декодирование текста,
+        батчи слов и подсчет символов и слов прямо по байтам.
+        """
+        from collections import Counter
+        text = get_text_from_file(temp_file)
+        
+        with MappedCorpus(temp_file) as corpus:
+            assert all(isinstance(view, memoryview) for view in corpus.slices(slice_size=4))
+            assert ''.join(corpus.iter_text(slice_size=4)) == text
+            assert [word for batch in corpus.iter_word_batches(batch_size=2) for word in batch] == get_words_from_file(temp_file)
+        
+        with MappedCorpus(temp_file, encoding='latin-1') as corpus:
+            assert corpus.char_histogram() == Counter(text)
+            assert corpus.count_words() == len(text.split())
+    
+    def test_parse_weighted_line_return_type(self):
+        """
+        Проверяет разбор строки частотного списка в обоих порядках полей.
+        Убеждается, что строка без частоты считается одним вхождением.
+        """
+        assert parse_weighted_line("hello\t42\n") == ("hello", 42)
+        assert parse_weighted_line("42 hello") == ("hello", 42)
+        assert parse_weighted_line("hello") == ("hello", 1)
+        assert parse_weighted_line("  \n") is None
+    
+    def test_get_weighted_words_from_file_stream_return_type(self, tmp_path):
+        """
+        Проверяет, что генератор возвращает батчи пар (слово, частота)
+        и пропускает слова с нулевой частотой.
+        """
+        weighted_file = tmp_path / "weighted.txt"
+        weighted_file.write_text("hello 3\nworld\t0\n5 test\n", encoding='utf-8')
+        
+        batches = list(get_weighted_words_from_file_stream(str(weighted_file), batch_size=1))
+        assert all(isinstance(batch, list) for batch in batches)
+        assert [pair for batch in batches for pair in batch] == [("hello", 3), ("test", 5)]
+    
     def test_read_kl_input_types(self, test_layout_file):
         """
         Тестирует чтение раскладок из разных форматов.